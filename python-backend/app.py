@@ -50,8 +50,10 @@ def index():
         'endpoints': {
             'health': '/health',
             'process': '/api/process',
+            'process_status': '/api/process/<job_id>',
             'query': '/api/query',
-            'dataset_info': '/api/dataset/<dataset_id>/info'
+            'dataset_info': '/api/dataset/<dataset_id>/info',
+            'cache_stats': '/api/cache/stats'
         }
     }
 
@@ -0,0 +1,124 @@
+"""
+Benchmark for chunk text encodings
+Compares the verbose ("col: val | ...") and compact (header once, delimited
+rows) encodings on estimated tokens per chunk and rendering time. With
+--server, the same file is also processed into one dataset per encoding on a
+running backend and /api/query latency is measured against each.
+
+Usage (from python-backend/):
+    python benchmarks/bench_chunk_encoding.py [--rows 50000]
+    python benchmarks/bench_chunk_encoding.py --server http://localhost:5000 \
+        --file-url <signed url> --file-name data.csv [--queries 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.data_processor import DataProcessor, CHUNK_ENCODINGS
+from bench_chunk_text import make_retail_frame, timed
+
+QUESTIONS = [
+    'What are the top 5 products by total revenue?',
+    'Which store location has the most returns?',
+    'What is the average rating for Electronics?',
+    'How many units were sold in Chicago?',
+    'Which category has the highest average unit price?'
+]
+
+
+def make_frame_with_notes(rows, seed=0):
+    """Retail frame plus a free-text column that the compact encoding prunes"""
+    rng = np.random.default_rng(seed)
+    df = make_retail_frame(rows, seed)
+    phrases = ['customer asked about warranty', 'delivered late', 'gift wrapped', 'price matched with competitor']
+    df['Notes'] = [
+        ' and '.join(rng.choice(phrases, 6)) + f" (ticket {i})"
+        for i in range(rows)
+    ]
+    return df
+
+
+def compare_offline(rows):
+    processor = DataProcessor()
+
+    for label, df in [('retail', make_retail_frame(rows)), ('retail+notes', make_frame_with_notes(rows))]:
+        print(f"{label}: rows={rows} columns={len(df.columns)}")
+        baseline = None
+        for encoding in CHUNK_ENCODINGS:
+            chunks, seconds = timed(lambda: processor.chunk_dataframe(df, encoding=encoding))
+            stats = processor.chunk_stats(chunks)
+            rows_per_chunk = rows / stats['chunk_count']
+            baseline = baseline or stats['total_tokens']
+            print(
+                f"  {encoding:8s}: {stats['chunk_count']:6d} chunks  {rows_per_chunk:7.1f} rows/chunk  "
+                f"{stats['avg_tokens_per_chunk']:7.1f} tokens/chunk  {stats['total_tokens']:10,d} tokens "
+                f"({stats['total_tokens'] / baseline:5.2f}x)  {seconds:6.3f}s"
+            )
+
+
+def process(server, dataset_id, file_url, file_name, encoding):
+    response = requests.post(f"{server}/api/process", json={
+        'datasetId': dataset_id,
+        'fileUrl': file_url,
+        'fileName': file_name,
+        'encoding': encoding,
+        'incremental': False
+    })
+    response.raise_for_status()
+    status_url = f"{server}{response.json()['statusUrl']}"
+
+    while True:
+        job = requests.get(status_url).json()
+        if job['status'] == 'completed':
+            return job['result']
+        if job['status'] == 'failed':
+            raise SystemExit(f"Processing {dataset_id} failed: {job['error']}")
+        time.sleep(2)
+
+
+def compare_end_to_end(server, file_url, file_name, queries):
+    for encoding in CHUNK_ENCODINGS:
+        dataset_id = f"bench-encoding-{encoding}"
+        result = process(server, dataset_id, file_url, file_name, encoding)
+
+        latencies = []
+        for question in QUESTIONS[:queries]:
+            _, seconds = timed(lambda: requests.post(f"{server}/api/query", json={
+                'datasetId': dataset_id,
+                'query': question
+            }).raise_for_status())
+            latencies.append(seconds)
+
+        print(
+            f"{encoding:8s}: {result['chunksCreated']:6d} chunks  {result['avgTokensPerChunk']:7.1f} tokens/chunk  "
+            f"query p50 {statistics.median(latencies):6.2f}s  max {max(latencies):6.2f}s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--server', help='Backend base URL for the end-to-end comparison')
+    parser.add_argument('--file-url', help='Signed URL of the file to process (with --server)')
+    parser.add_argument('--file-name', default='data.csv')
+    parser.add_argument('--queries', type=int, default=len(QUESTIONS))
+    args = parser.parse_args()
+
+    compare_offline(args.rows)
+
+    if args.server:
+        if not args.file_url:
+            parser.error('--file-url is required with --server')
+        compare_end_to_end(args.server.rstrip('/'), args.file_url, args.file_name, args.queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Microbenchmark for chunk text rendering
+Compares the original iterrows-based dataframe_to_text with the columnar
+renderer used by DataProcessor.chunk_dataframe, and checks the output is
+byte-identical.
+
+Usage (from python-backend/):
+    python benchmarks/bench_chunk_text.py [--rows 200000] [--chunk-size 100]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.data_processor import DataProcessor
+
+
+def make_retail_frame(rows, seed=0):
+    """Synthetic frame shaped like complex_retail_data.csv"""
+    rng = np.random.default_rng(seed)
+    categories = ['Electronics', 'Clothing', 'Home & Kitchen', 'Sports', 'Books']
+    products = ['Laptop Pro X1', 'Denim Jacket', 'Smart Coffee Maker', 'Yoga Mat', 'Mystery Novel']
+    stores = ['New York', 'Los Angeles', 'Chicago', 'Houston', 'Phoenix']
+
+    units = rng.integers(1, 20, rows)
+    price = rng.integers(500, 150000, rows) / 100
+
+    df = pd.DataFrame({
+        'TransactionID': [f"T{1000 + i}" for i in range(rows)],
+        'Date': pd.date_range('2024-01-01', periods=rows, freq='min').strftime('%Y-%m-%d'),
+        'Category': rng.choice(categories, rows),
+        'Product': rng.choice(products, rows),
+        'StoreLocation': rng.choice(stores, rows),
+        'UnitsSold': units,
+        'UnitPrice': price,
+        'TotalRevenue': units * price,
+        'Rating': rng.integers(10, 50, rows) / 10,
+        'ReturnStatus': rng.choice(['Keep', 'Returned'], rows)
+    })
+
+    # A few missing values so NaN formatting is exercised
+    df.loc[df.sample(frac=0.01, random_state=seed).index, 'Rating'] = np.nan
+    return df
+
+
+def legacy_dataframe_to_text(df, start_row=0):
+    """The original per-row implementation, kept as the reference"""
+    text_parts = [f"Data rows {start_row} to {start_row + len(df) - 1}:"]
+    text_parts.append(f"Columns: {', '.join(df.columns)}")
+    text_parts.append("")
+
+    for idx, row in df.iterrows():
+        row_text = " | ".join([f"{col}: {val}" for col, val in row.items()])
+        text_parts.append(row_text)
+
+    return "\n".join(text_parts)
+
+
+def legacy_chunk_texts(df, chunk_size):
+    return [
+        legacy_dataframe_to_text(df.iloc[i:i+chunk_size], start_row=i)
+        for i in range(0, len(df), chunk_size)
+    ]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=100)
+    args = parser.parse_args()
+
+    processor = DataProcessor()
+    df = make_retail_frame(args.rows)
+
+    legacy, legacy_seconds = timed(lambda: legacy_chunk_texts(df, args.chunk_size))
+    chunks, columnar_seconds = timed(lambda: processor.chunk_dataframe(df, chunk_size=args.chunk_size))
+    columnar = [chunk['text'] for chunk in chunks]
+
+    if legacy != columnar:
+        raise SystemExit("Output mismatch between legacy and columnar renderers")
+
+    print(f"rows={args.rows} chunk_size={args.chunk_size} chunks={len(chunks)} (outputs identical)")
+    print(f"iterrows : {legacy_seconds:8.3f}s  {args.rows / legacy_seconds:12,.0f} rows/sec")
+    print(f"columnar : {columnar_seconds:8.3f}s  {args.rows / columnar_seconds:12,.0f} rows/sec")
+    print(f"speedup  : {legacy_seconds / columnar_seconds:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -11,6 +12,31 @@ GCP_LOCATION = os.getenv('GCP_LOCATION', 'us-central1')
 
 # ChromaDB Configuration
 CHROMADB_PERSIST_DIR = os.getenv('CHROMADB_PERSIST_DIR', './chromadb_data')
+CHROMADB_CACHE_TTL_SECONDS = int(os.getenv('CHROMADB_CACHE_TTL_SECONDS', 30))  # Collection handle/count cache lifetime per worker
+
+# Keyword Index Configuration (BM25 over chunk texts for hybrid retrieval)
+KEYWORD_INDEX_ENABLED = os.getenv('KEYWORD_INDEX_ENABLED', 'True') == 'True'
+KEYWORD_INDEX_DIR = os.getenv('KEYWORD_INDEX_DIR', './keyword_index')
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', 20))  # Results taken from each ranking before fusion
+HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', 60))  # Reciprocal rank fusion damping constant
+KEYWORD_PHRASE_MAX_DF = float(os.getenv('KEYWORD_PHRASE_MAX_DF', 0.05))  # Largest share of row chunks an identifier or phrase may occur in to skip vector search
+KEYWORD_PHRASE_MARGIN = float(os.getenv('KEYWORD_PHRASE_MARGIN', 1.5))  # BM25 lead its chunks need over chunks without it
+
+# Dataset Store Configuration (columnar copies of processed datasets)
+DATASET_STORE_DIR = os.getenv('DATASET_STORE_DIR', './dataset_store')
+DATASET_STORE_COMPRESSION = os.getenv('DATASET_STORE_COMPRESSION', 'zstd')
+
+# Shared Dataset Cache Configuration (memory-mapped Arrow files shared by all workers)
+SHARED_CACHE_DIR = os.getenv('SHARED_CACHE_DIR', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+    'data_analyst_dataset_cache'
+))
+SHARED_CACHE_MAX_MB = int(os.getenv('SHARED_CACHE_MAX_MB', 2048))  # Global budget across workers
+
+# DuckDB Configuration (in-process SQL over stored datasets)
+DUCKDB_THREADS = int(os.getenv('DUCKDB_THREADS', 4))
+DUCKDB_MEMORY_LIMIT = os.getenv('DUCKDB_MEMORY_LIMIT', '1GB')
+DUCKDB_MAX_ROWS = int(os.getenv('DUCKDB_MAX_ROWS', 1000))  # Rows returned per query
 
 # Flask Configuration
 FLASK_ENV = os.getenv('FLASK_ENV', 'development')
@@ -21,6 +47,51 @@ PORT = int(os.getenv('PORT', 5000))
 GEMINI_MODEL = 'gemini-2.0-flash-exp'
 EMBEDDING_MODEL = 'text-embedding-004'
 
+# Embedding Backend Configuration ('vertex' calls EMBEDDING_MODEL; 'hashing' embeds locally on the CPU, offline)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'vertex')
+EMBEDDING_DIMENSION = int(os.getenv('EMBEDDING_DIMENSION', 768))  # Vector size (the model's output size for 'vertex')
+
+# Embedding Request Configuration (text-embedding-004 accepts up to 250 inputs / 20k tokens per request)
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 250))  # Max texts per request
+EMBEDDING_BATCH_TOKENS = int(os.getenv('EMBEDDING_BATCH_TOKENS', 20000))  # Max estimated tokens per request
+EMBEDDING_MAX_INPUT_TOKENS = int(os.getenv('EMBEDDING_MAX_INPUT_TOKENS', 2048))  # Model limit for a single text
+EMBEDDING_CONCURRENCY = int(os.getenv('EMBEDDING_CONCURRENCY', 4))  # Parallel embedding requests
+EMBEDDING_MAX_RETRIES = int(os.getenv('EMBEDDING_MAX_RETRIES', 4))  # Retries per batch on transient errors
+EMBEDDING_RETRY_BACKOFF_SECONDS = float(os.getenv('EMBEDDING_RETRY_BACKOFF_SECONDS', 1.0))  # Initial backoff, doubled per retry
+
+# Embedding Cache Configuration
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True') == 'True'
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', './embedding_cache/embeddings.sqlite3')
+EMBEDDING_CACHE_MAX_MB = int(os.getenv('EMBEDDING_CACHE_MAX_MB', 1024))  # LRU eviction above this size
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 1024))  # Question embeddings kept in memory per worker
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv('QUERY_EMBEDDING_CACHE_TTL_SECONDS', 3600))
+
+# Answer Cache Configuration (answers reused for near-identical questions)
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', 1000))  # Answers kept in memory per worker (0 disables)
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv('ANSWER_CACHE_TTL_SECONDS', 3600))
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.97))  # Minimum question cosine similarity for a hit
+
+# Batch Query Configuration (/api/query/batch)
+QUERY_BATCH_MAX_QUESTIONS = int(os.getenv('QUERY_BATCH_MAX_QUESTIONS', 50))  # Questions accepted per request
+QUERY_BATCH_CONCURRENCY = int(os.getenv('QUERY_BATCH_CONCURRENCY', 4))  # Parallel Gemini calls per worker
+
 # Processing Configuration
-MAX_CHUNK_SIZE = 1000  # Maximum rows per chunk for embedding
+MAX_CHUNK_SIZE = int(os.getenv('MAX_CHUNK_SIZE', 1000))  # Maximum rows per chunk for embedding
+CHUNK_TARGET_TOKENS = int(os.getenv('CHUNK_TARGET_TOKENS', 1500))  # Estimated tokens each chunk is filled to
+CHUNK_ENCODING = os.getenv('CHUNK_ENCODING', 'verbose')  # 'verbose' (col: val per row) or 'compact' (header once)
+COMPACT_MAX_COLUMN_CHARS = int(os.getenv('COMPACT_MAX_COLUMN_CHARS', 120))  # Compact encoding drops text columns wider than this on average
+SUMMARY_MAX_GROUPS = int(os.getenv('SUMMARY_MAX_GROUPS', 50))  # Text columns with at most this many values get group-by summaries
+SUMMARY_TOP_K = int(os.getenv('SUMMARY_TOP_K', 2))  # Summary documents retrieved per query, alongside row chunks
+CONTEXT_MAX_CHUNKS = int(os.getenv('CONTEXT_MAX_CHUNKS', 8))  # Most row chunks considered for a prompt
+CONTEXT_DISTANCE_RATIO = float(os.getenv('CONTEXT_DISTANCE_RATIO', 1.2))  # Chunks farther than this multiple of the best distance are left out
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 4000))  # Estimated tokens of retrieved context per prompt
+RETRIEVAL_CONCURRENCY = int(os.getenv('RETRIEVAL_CONCURRENCY', 8))  # Parallel collection searches when a question targets several datasets
+ZONE_MAP_MAX_VALUES = int(os.getenv('ZONE_MAP_MAX_VALUES', 16))  # Text values listed per chunk for predicate filtering
 MAX_FILE_SIZE_MB = 50  # Maximum file size in MB
+OPTIMIZE_DTYPES = os.getenv('OPTIMIZE_DTYPES', 'True') == 'True'  # Compact dtypes when loading files
+CATEGORY_MAX_RATIO = float(os.getenv('CATEGORY_MAX_RATIO', 0.5))  # Max unique/rows ratio for categorical text columns
+STREAMING_THRESHOLD_MB = int(os.getenv('STREAMING_THRESHOLD_MB', 50))  # CSVs above this size are streamed
+STREAMING_BATCH_ROWS = int(os.getenv('STREAMING_BATCH_ROWS', 10000))  # Rows parsed per streamed batch
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', 2))  # Background ingestion worker threads
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', 3600))  # How long finished job status is kept
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', './job_store/jobs.sqlite3')  # Job records shared by the worker processes on a host
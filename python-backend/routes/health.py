@@ -3,6 +3,8 @@ Health check route
 """
 
 from flask import Blueprint, jsonify
+from services import embedding_cache, query_embedding_cache, answer_cache, keyword_index, shared_dataset_cache
+from services.chromadb_service import collection_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,3 +19,25 @@ def health_check():
         'status': 'healthy',
         'service': 'Data Analyst AI Service'
     }), 200
+
+
+@health_bp.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the service caches"""
+    try:
+        return jsonify({
+            'success': True,
+            'embeddingCache': embedding_cache.get_stats() if embedding_cache else None,
+            'queryEmbeddingCache': query_embedding_cache.get_stats(),
+            'answerCache': answer_cache.get_stats(),
+            'keywordIndex': keyword_index.get_stats() if keyword_index else None,
+            'sharedDatasetCache': shared_dataset_cache.get_stats(),
+            'collectionCache': collection_cache.get_stats()
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting cache stats: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -3,8 +3,23 @@ Dataset processing route
 Handles file upload processing and embedding generation
 """
 
+from collections import Counter
 from flask import Blueprint, request, jsonify
-from services import VertexAIService, ChromaDBService, DataProcessor
+from services import (
+    VertexAIService,
+    ChromaDBService,
+    DataProcessor,
+    context_manager,
+    job_queue,
+    dataset_store,
+    shared_dataset_cache,
+    answer_cache,
+    keyword_index
+)
+from services.data_processor import STREAMABLE_EXCEL_EXTENSIONS, CHUNK_ENCODINGS
+from services.zone_maps import column_info
+from services.embedding_backend import collection_signature
+import config
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,23 +35,34 @@ data_processor = DataProcessor()
 @process_bp.route('/api/process', methods=['POST'])
 def process_dataset():
     """
-    Process uploaded dataset: read file, generate embeddings, store in ChromaDB
+    Queue an uploaded dataset for processing: read file, generate embeddings,
+    store in ChromaDB. The pipeline runs on a background worker; poll
+    GET /api/process/<jobId> for its status.
     
     Request JSON:
         {
             "datasetId": "uuid",
             "fileUrl": "signed_url",
-            "fileName": "file.csv"
+            "fileName": "file.csv",
+            "incremental": true,  (optional, default true)
+            "encoding": "compact"  (optional, "verbose" or "compact", default config.CHUNK_ENCODING)
         }
     
+    When the dataset was processed before, only chunks whose rows changed are
+    re-embedded and chunks that no longer exist are deleted. Pass
+    "incremental": false to rebuild the collection from scratch.
+    
     Returns:
-        JSON with processing status and metadata
+        JSON with the job id and its current status
     """
     try:
         data = request.get_json()
         dataset_id = data.get('datasetId')
         file_url = data.get('fileUrl')
         file_name = data.get('fileName')
+        user_id = data.get('userId', 'default_user')
+        incremental = data.get('incremental', True)
+        encoding = data.get('encoding', config.CHUNK_ENCODING)
         
         logger.info(f"Processing dataset: {dataset_id}, file: {file_name}")
         
@@ -47,69 +73,412 @@ def process_dataset():
                 'error': 'Missing required fields: datasetId, fileUrl, fileName'
             }), 400
         
-        # Step 1: Read the file
-        df = data_processor.read_file(file_url, file_name)
-        
-        # Step 2: Profile the data
-        profile = data_processor.profile_data(df)
-        
-        # Step 3: Create ChromaDB collection
-        collection = chromadb.create_collection(dataset_id)
-        
-        # Step 4: Chunk the dataframe
-        chunks = data_processor.chunk_dataframe(df, chunk_size=100)
-        
-        # Step 5: Generate embeddings for chunks
-        chunk_texts = [chunk['text'] for chunk in chunks]
-        embeddings = vertex_ai.generate_embeddings(chunk_texts)
-        
-        # Step 6: Store in ChromaDB
-        metadatas = [
-            {
-                'start_row': chunk['start_row'],
-                'end_row': chunk['end_row'],
-                'row_count': chunk['row_count']
-            }
-            for chunk in chunks
-        ]
-        
-        ids = [f"{dataset_id}_chunk_{i}" for i in range(len(chunks))]
+        if encoding not in CHUNK_ENCODINGS:
+            return jsonify({
+                'success': False,
+                'error': f"Invalid encoding: {encoding}. Expected one of {', '.join(CHUNK_ENCODINGS)}"
+            }), 400
         
-        chromadb.add_documents(
-            collection=collection,
-            documents=chunk_texts,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            ids=ids
+        # Duplicate submissions for the same dataset return the existing job
+        job, created = job_queue.submit(
+            dataset_id,
+            {'fileUrl': file_url, 'fileName': file_name, 'userId': user_id, 'incremental': incremental, 'encoding': encoding},
+            _run_pipeline,
+            dataset_id, file_url, file_name, user_id, incremental, encoding
         )
         
-        # Step 7: Register with Context Manager
-        from services import context_manager
-        user_id = data.get('userId', 'default_user')  # Get from request
-        context_manager.register_csv_file(
-            user_id=user_id,
-            dataset_id=dataset_id,
-            filename=file_name,
-            metadata={
-                'rowCount': profile['row_count'],
-                'columnCount': profile['column_count'],
-                'columns': profile['columns']
-            }
-        )
+        return jsonify({
+            'success': True,
+            'message': 'Dataset queued for processing' if created else 'Dataset already submitted',
+            'jobId': job.id,
+            'status': job.status,
+            'statusUrl': f"/api/process/{job.id}"
+        }), 202
         
-        logger.info(f"Dataset processed successfully: {dataset_id}")
+    except Exception as e:
+        logger.error(f"Error processing dataset: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@process_bp.route('/api/process/<job_id>', methods=['GET'])
+def get_process_status(job_id):
+    """
+    Get the status of a dataset processing job
+    
+    Returns:
+        JSON with status, current stage, progress counters, per-stage timings
+        and, once completed, the processing result
+    """
+    try:
+        job = job_queue.get_job(job_id)
+        
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': f'Job not found: {job_id}'
+            }), 404
         
         return jsonify({
             'success': True,
-            'message': 'Dataset processed successfully',
-            'rowCount': profile['row_count'],
-            'columnCount': profile['column_count'],
-            'chunksCreated': len(chunks)
+            **job.to_dict()
         }), 200
         
     except Exception as e:
-        logger.error(f"Error processing dataset: {str(e)}")
+        logger.error(f"Error getting job status: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
+
+
+def _run_pipeline(job, dataset_id, file_url, file_name, user_id, incremental=True, encoding=None):
+    """
+    Ingestion pipeline executed by the job queue worker
+    
+    Returns:
+        dict: Processing result (row/column/chunk counts)
+    """
+    # Step 1: Pick the ingestion path - large CSVs and .xlsx/.xlsm
+    # workbooks (every sheet) are streamed in batches
+    job.set_stage('downloading')
+    file_size = data_processor.get_file_size(file_url)
+    streaming = file_name.endswith(STREAMABLE_EXCEL_EXTENSIONS) or (
+        file_name.endswith('.csv') and
+        file_size > config.STREAMING_THRESHOLD_MB * 1024 * 1024
+    )
+    job.update_progress(fileSizeBytes=file_size, streamed=streaming)
+    
+    # Step 2: Create ChromaDB collection and load what it already holds
+    if not incremental:
+        chromadb.delete_collection(dataset_id)
+        if keyword_index:
+            keyword_index.delete_dataset(dataset_id)
+    else:
+        # Vectors from another embedding backend cannot be reused or mixed
+        existing = chromadb.get_collection(dataset_id)
+        if existing is not None and collection_signature(existing.metadata) != vertex_ai.embedding_backend.signature():
+            logger.info(f"Re-embedding dataset {dataset_id}: collection was built by another embedding backend")
+            chromadb.delete_collection(dataset_id)
+    collection = chromadb.create_collection(dataset_id, embedding=vertex_ai.embedding_backend.signature())
+    sync = _new_sync_state(chromadb.get_document_metadatas(collection))
+    
+    # Chunks stored before zone maps existed get them without re-embedding
+    previous = dataset_store.get_manifest(dataset_id)
+    sync['refresh_metadata'] = incremental and previous is not None and 'zoneMaps' not in previous
+    
+    # Steps 3-6: Read, profile, chunk, embed and store; the parsed rows are
+    # also kept as a columnar copy for exact computation at query time
+    writer = dataset_store.create_writer(dataset_id)
+    try:
+        if streaming:
+            profile, chunk_count = _ingest_streaming(job, collection, dataset_id, file_url, file_name, sync, writer, encoding)
+        else:
+            profile, chunk_count = _ingest_in_memory(job, collection, dataset_id, file_url, file_name, sync, writer, encoding)
+        
+        job.set_stage('persisting')
+        sketches = [table['sketch'] for table in profile['tables'].values()] if 'tables' in profile else [profile['sketch']]
+        manifest = writer.commit(file_name, stats=profile['summary_stats'], zone_maps=column_info(sketches))
+    except Exception:
+        writer.abort()
+        raise
+    
+    # Free shared-memory copies of the previous version
+    shared_dataset_cache.invalidate(dataset_id)
+    
+    # Aggregates over all rows, stored next to the row chunks for retrieval
+    job.set_stage('summarizing')
+    summary_sync = _new_sync_state(sync['existing'])
+    summary_ids = _store_summaries(job, collection, dataset_id, profile, summary_sync)
+    
+    # Remove chunks and summaries the new version of the file no longer has
+    job.set_stage('storing')
+    current_ids = sync['current'] | set(summary_ids)
+    stale_ids = [doc_id for doc_id in sync['existing'] if doc_id not in current_ids]
+    chromadb.delete_documents(collection, stale_ids)
+    if keyword_index:
+        keyword_index.delete_documents(dataset_id, stale_ids)
+    sync['deleted'] = len(stale_ids)
+    
+    # Answers cached while the collection was being rebuilt may be stale
+    answer_cache.invalidate(dataset_id)
+    
+    # Step 7: Register with Context Manager
+    job.set_stage('registering')
+    context_manager.register_csv_file(
+        user_id=user_id,
+        dataset_id=dataset_id,
+        filename=file_name,
+        metadata={
+            'rowCount': profile['row_count'],
+            'columnCount': profile['column_count'],
+            'columns': profile['columns']
+        }
+    )
+    
+    logger.info(f"Dataset processed successfully: {dataset_id}")
+    
+    result = {
+        'rowCount': profile['row_count'],
+        'columnCount': profile['column_count'],
+        'chunksCreated': chunk_count,
+        'avgTokensPerChunk': profile['avg_tokens_per_chunk'],
+        'encoding': encoding or config.CHUNK_ENCODING,
+        'chunksAdded': sync['added'],
+        'chunksUpdated': sync['updated'],
+        'chunksUnchanged': sync['unchanged'],
+        'chunksMoved': sync['moved'],
+        'chunksDeleted': sync['deleted'],
+        'summariesCreated': len(summary_ids),
+        'summariesUpdated': summary_sync['added'] + summary_sync['updated'],
+        'datasetVersion': manifest['version'],
+        'memory': {
+            'bytesBefore': profile['memory']['bytes_before'],
+            'bytesAfter': profile['memory']['bytes_after'],
+            'reductionRatio': profile['memory']['reduction_ratio']
+        },
+        'streamed': streaming
+    }
+    
+    if 'tables' in profile:
+        result['sheets'] = [
+            {'name': name, 'rowCount': table['row_count'], 'columnCount': table['column_count']}
+            for name, table in profile['tables'].items()
+        ]
+    
+    return result
+
+
+def _ingest_in_memory(job, collection, dataset_id, file_url, file_name, sync, writer, encoding=None):
+    """
+    Load the whole file into a DataFrame, then chunk, embed and store it
+    
+    Returns:
+        tuple: (profile dict, number of chunks stored)
+    """
+    df = data_processor.read_file(file_url, file_name)
+    
+    job.set_stage('profiling')
+    profile = data_processor.profile_data(df)
+    job.update_progress(rowsProcessed=profile['row_count'])
+    
+    job.set_stage('chunking')
+    chunks = data_processor.chunk_dataframe(df, encoding=encoding)
+    profile.update(data_processor.chunk_stats(chunks))
+    job.update_progress(chunksTotal=len(chunks))
+    
+    _store_chunks(job, collection, dataset_id, chunks, sync)
+    job.update_progress(chunksStored=len(chunks))
+    
+    job.set_stage('persisting')
+    writer.write(df)
+    
+    return profile, len(chunks)
+
+
+def _ingest_streaming(job, collection, dataset_id, file_url, file_name, sync, writer, encoding=None):
+    """
+    Stream the file in row batches; each batch is chunked, embedded and
+    stored before the next one is read, so memory is bounded by batch size.
+    Workbook sheets are profiled and stored as separate tables; row numbers
+    restart at 0 for each sheet.
+    
+    Returns:
+        tuple: (profile dict, number of chunks stored)
+    """
+    profiles = {}
+    row_offsets = {}
+    chunk_count = 0
+    total_tokens = 0
+    rows_processed = 0
+    
+    for table_name, batch_df in data_processor.read_file_batches(file_url, file_name):
+        job.set_stage('profiling')
+        profiles[table_name] = data_processor.merge_profiles(profiles.get(table_name), data_processor.profile_data(batch_df))
+        
+        job.set_stage('chunking')
+        row_offset = row_offsets.get(table_name, 0)
+        chunks = data_processor.chunk_dataframe(batch_df, row_offset=row_offset, table_name=table_name, encoding=encoding)
+        _store_chunks(job, collection, dataset_id, chunks, sync)
+        
+        job.set_stage('persisting')
+        writer.write(batch_df, table=table_name)
+        
+        chunk_count += len(chunks)
+        total_tokens += data_processor.chunk_stats(chunks)['total_tokens']
+        row_offsets[table_name] = row_offset + len(batch_df)
+        rows_processed += len(batch_df)
+        job.update_progress(rowsProcessed=rows_processed, chunksStored=chunk_count)
+        
+        # Time spent waiting on the next batch counts as download time
+        job.set_stage('downloading')
+        
+        logger.info(f"Streamed batch stored for {dataset_id}: {rows_processed} rows, {chunk_count} chunks so far")
+    
+    if not profiles:
+        raise ValueError(f"File contains no rows: {file_name}")
+    
+    profile = data_processor.combine_table_profiles(profiles)
+    profile.update({
+        'chunk_count': chunk_count,
+        'total_tokens': total_tokens,
+        'avg_tokens_per_chunk': round(total_tokens / chunk_count, 1) if chunk_count else 0
+    })
+    
+    return profile, chunk_count
+
+
+def _new_sync_state(existing):
+    """Track how a run's chunks compare with what the collection already holds"""
+    return {
+        'existing': existing,
+        'current': set(),
+        'occurrences': Counter(),
+        'added': 0,
+        'updated': 0,
+        'unchanged': 0,
+        'moved': 0,
+        'deleted': 0
+    }
+
+
+def _chunk_id(dataset_id, chunk_hash, occurrence=1):
+    # Chunks are identified by content; identical chunks are numbered
+    suffix = f"_{occurrence}" if occurrence > 1 else ""
+    return f"{dataset_id}_chunk_{chunk_hash}{suffix}"
+
+
+def _summary_id(dataset_id, key):
+    return f"{dataset_id}_{key}"
+
+
+def _store_chunks(job, collection, dataset_id, chunks, sync):
+    """
+    Embed and upsert the chunks whose content changed since the last run
+    
+    Chunk ids come from the content hash, so a chunk the collection already
+    holds is matched wherever it now sits in the file: re-processing an
+    updated file only embeds the new or edited chunks, and chunks moved by
+    inserted or deleted rows keep their embeddings.
+    
+    Args:
+        job: Job whose stage is updated
+        collection: ChromaDB collection
+        dataset_id: Dataset identifier
+        chunks: Chunks produced by DataProcessor.chunk_dataframe
+        sync: Sync state from _new_sync_state, updated in place
+    """
+    documents = []
+    for chunk in chunks:
+        metadata = {
+            'start_row': chunk['start_row'],
+            'end_row': chunk['end_row'],
+            'row_count': chunk['row_count'],
+            'token_count': chunk['token_count'],
+            'encoding': chunk['encoding'],
+            'chunk_hash': chunk['chunk_hash']
+        }
+        # ChromaDB metadata values cannot be None, so CSV chunks omit the sheet
+        if chunk['table'] is not None:
+            metadata['sheet'] = chunk['table']
+        metadata.update(chunk['zone_map'])
+        
+        sync['occurrences'][chunk['chunk_hash']] += 1
+        doc_id = _chunk_id(dataset_id, chunk['chunk_hash'], sync['occurrences'][chunk['chunk_hash']])
+        sync['current'].add(doc_id)
+        documents.append((doc_id, chunk['text'], metadata))
+    
+    _upsert_changed(job, collection, dataset_id, documents, sync)
+
+
+def _store_summaries(job, collection, dataset_id, profile, sync):
+    """
+    Build the dataset's summary documents and upsert the ones that changed
+    
+    Returns:
+        list: Ids of all current summary documents
+    """
+    documents = [
+        (_summary_id(dataset_id, document['key']), document['text'], document['metadata'])
+        for document in data_processor.build_summary_documents(profile)
+    ]
+    
+    _upsert_changed(job, collection, dataset_id, documents, sync)
+    return [doc_id for doc_id, _, _ in documents]
+
+
+def _upsert_changed(job, collection, dataset_id, documents, sync):
+    """
+    Embed and upsert documents whose chunk_hash differs from the stored one
+    
+    Documents with the same hash at a new position (start_row) get their
+    new text and metadata with the stored embedding, without re-embedding.
+    
+    Every document is (re)written to the keyword index, which is cheap and
+    keeps it complete for datasets embedded before the index existed.
+    
+    Args:
+        job: Job whose stage is updated
+        collection: ChromaDB collection
+        dataset_id: Dataset identifier
+        documents: List of (id, text, metadata) with metadata['chunk_hash']
+        sync: Sync state from _new_sync_state, updated in place
+    """
+    if keyword_index:
+        keyword_index.upsert_documents(dataset_id, documents)
+    
+    changed = []
+    moved = []
+    refreshed = []
+    for doc_id, text, metadata in documents:
+        existing = sync['existing'].get(doc_id)
+        if existing is None:
+            sync['added'] += 1
+        elif existing.get('chunk_hash') != metadata['chunk_hash']:
+            sync['updated'] += 1
+        elif existing.get('start_row') != metadata.get('start_row'):
+            sync['moved'] += 1
+            moved.append((doc_id, text, metadata))
+            continue
+        else:
+            sync['unchanged'] += 1
+            if sync.get('refresh_metadata'):
+                refreshed.append((doc_id, metadata))
+            continue
+        
+        changed.append((doc_id, text, metadata))
+    
+    if moved:
+        # The text differs only in its row numbers; keep the stored vectors
+        chromadb.upsert_documents(
+            collection=collection,
+            documents=[text for _, text, _ in moved],
+            embeddings=chromadb.get_embeddings(collection, [doc_id for doc_id, _, _ in moved]),
+            metadatas=[metadata for _, _, metadata in moved],
+            ids=[doc_id for doc_id, _, _ in moved]
+        )
+    
+    if refreshed:
+        chromadb.update_metadatas(
+            collection=collection,
+            metadatas=[metadata for _, metadata in refreshed],
+            ids=[doc_id for doc_id, _ in refreshed]
+        )
+    
+    if not changed:
+        return
+    
+    job.set_stage('embedding')
+    texts = [text for _, text, _ in changed]
+    embeddings = vertex_ai.generate_embeddings(texts)
+    
+    job.set_stage('storing')
+    chromadb.upsert_documents(
+        collection=collection,
+        documents=texts,
+        embeddings=embeddings,
+        metadatas=[metadata for _, _, metadata in changed],
+        ids=[doc_id for doc_id, _, _ in changed]
+    )
@@ -3,8 +3,18 @@ Query route
 Handles natural language queries with semantic search
 """
 
+import json
+import time
 from flask import Blueprint, request, jsonify
-from services import VertexAIService, ChromaDBService, DataProcessor
+from services import VertexAIService, ChromaDBService, DataProcessor, dataset_store, answer_cache
+from services.data_processor import SUMMARY_TYPE
+from services.keyword_index import keyword_index, reciprocal_rank_fusion
+from services.zone_maps import extract_predicates, predicates_to_where, matches
+from services.embedding_backend import EmbeddingMismatchError, collection_signature
+from services.vertex_ai_service import extract_chart_config, estimate_tokens
+from services.context_builder import adaptive_cutoff, assemble_context
+from routes.sse import stream_events
+import config
 import logging
 
 logger = logging.getLogger(__name__)
@@ -47,49 +57,169 @@ def query_dataset():
                 'error': 'Missing required fields: datasetId, query'
             }), 400
         
-        # Step 1: Get the collection
-        collection = chromadb.create_collection(dataset_id)
+        # Step 1: Get the collection (never created here for unknown ids)
+        collection, error = _queryable_collection(dataset_id)
+        if error:
+            return error
         
-        # Check if collection has data
-        doc_count = chromadb.get_collection_count(collection)
-        if doc_count == 0:
+        # Steps 2-5: Retrieve context and generate the answer
+        manifest = dataset_store.get_manifest(dataset_id)
+        answers, _ = _answer_questions(collection, dataset_id, manifest, [query], user_id)
+        answer = answers[0]
+        
+        if not answer['success']:
+            return jsonify(answer), 500
+        
+        logger.info(f"Query processed successfully for dataset: {dataset_id}")
+        return jsonify(answer), 200
+        
+    except Exception as e:
+        logger.error(f"Error processing query: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@query_bp.route('/api/query/stream', methods=['POST'])
+def query_dataset_stream():
+    """
+    Streaming variant of /api/query (server-sent events)
+    
+    Request JSON: same as /api/query
+    
+    Events:
+        progress: {"stage": "retrieval", "retrieval", "predicates", "chunksRetrieved", "summariesRetrieved"}
+        token: {"text"} - answer fragments as Gemini produces them
+        done: the /api/query response, plus "chart" (parsed chart JSON or null)
+        error: {"success": false, "error"}
+    """
+    try:
+        data = request.get_json()
+        dataset_id = data.get('datasetId')
+        query = data.get('query')
+        user_id = data.get('userId')
+        
+        logger.info(f"Streaming query request for dataset: {dataset_id}")
+        
+        # Validate inputs
+        if not all([dataset_id, query]):
             return jsonify({
                 'success': False,
-                'error': 'Dataset not processed yet or no data found'
-            }), 404
+                'error': 'Missing required fields: datasetId, query'
+            }), 400
         
-        # Step 2: Generate query embedding
-        query_embeddings = vertex_ai.generate_embeddings([query])
-        query_embedding = query_embeddings[0]
+        collection, error = _queryable_collection(dataset_id)
+        if error:
+            return error
         
-        # Step 3: Perform semantic search
-        search_results = chromadb.semantic_search(
-            collection=collection,
-            query_embedding=query_embedding,
-            top_k=5
-        )
+        def produce(emit):
+            started = time.perf_counter()
+            manifest = dataset_store.get_manifest(dataset_id)
+            cache_scope = answer_cache.scope(user_id, {dataset_id: manifest['version'] if manifest else None})
+            item = _retrieve(collection, dataset_id, manifest, [query], cache_scope)[0]
+            
+            if item['answer'] is None:
+                emit('progress', {
+                    'stage': 'retrieval',
+                    'retrieval': item['retrieval'],
+                    'predicates': item['predicates'],
+                    'chunksRetrieved': len(item['search']['documents']),
+                    'summariesRetrieved': len(item['summaries']['documents'])
+                })
+                _generate_answer(item, started, on_token=lambda text: emit('token', {'text': text}))
+                _cache_answer(item, cache_scope)
+            else:
+                emit('token', {'text': item['answer']['response']})
+            
+            answer = item['answer']
+            if not answer['success']:
+                emit('error', answer)
+                return
+            
+            emit('done', {**answer, 'chart': extract_chart_config(answer['response'])})
         
-        # Step 4: Build context from search results
-        context_parts = []
-        for i, doc in enumerate(search_results['documents']):
-            metadata = search_results['metadatas'][i]
-            context_parts.append(f"Data chunk (rows {metadata['start_row']}-{metadata['end_row']}):\n{doc}")
+        return stream_events(produce)
         
-        context = "\n\n".join(context_parts)
+    except Exception as e:
+        logger.error(f"Error processing streaming query: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@query_bp.route('/api/query/batch', methods=['POST'])
+def query_dataset_batch():
+    """
+    Answer several questions about one dataset in a single request
+    
+    The questions share one embedding call and one multi-vector search per
+    retrieval step; answers are generated concurrently.
+    
+    Request JSON:
+        {
+            "datasetId": "uuid",
+            "questions": ["What are the top 5 products?", "..."],
+            "userId": "user_id"
+        }
+    
+    Returns:
+        JSON with one result per question, in request order, each with its
+        timings
+    """
+    try:
+        started = time.perf_counter()
+        data = request.get_json()
+        dataset_id = data.get('datasetId')
+        questions = data.get('questions')
+        user_id = data.get('userId')
         
-        # Step 5: Generate AI response
-        response_text = vertex_ai.generate_response(query, context)
+        logger.info(f"Batch query request for dataset: {dataset_id}")
         
-        logger.info(f"Query processed successfully for dataset: {dataset_id}")
+        # Validate inputs
+        if not dataset_id or not isinstance(questions, list) or not questions:
+            return jsonify({
+                'success': False,
+                'error': 'Missing required fields: datasetId, questions'
+            }), 400
+        
+        if not all(isinstance(question, str) and question.strip() for question in questions):
+            return jsonify({
+                'success': False,
+                'error': 'Every question must be a non-empty string'
+            }), 400
+        
+        if len(questions) > config.QUERY_BATCH_MAX_QUESTIONS:
+            return jsonify({
+                'success': False,
+                'error': f"At most {config.QUERY_BATCH_MAX_QUESTIONS} questions per batch"
+            }), 400
+        
+        collection, error = _queryable_collection(dataset_id)
+        if error:
+            return error
+        
+        manifest = dataset_store.get_manifest(dataset_id)
+        answers, timings = _answer_questions(collection, dataset_id, manifest, questions, user_id)
+        
+        logger.info(f"Batch of {len(questions)} queries processed for dataset: {dataset_id}")
         
         return jsonify({
             'success': True,
-            'response': response_text,
-            'chunksUsed': len(search_results['documents'])
+            'datasetId': dataset_id,
+            'results': [
+                {'question': question, **answer, 'timings': question_timings}
+                for question, answer, question_timings in zip(questions, answers, timings['questions'])
+            ],
+            'timings': {
+                'retrievalMs': timings['retrievalMs'],
+                'totalMs': _elapsed_ms(started)
+            }
         }), 200
-        
+    
     except Exception as e:
-        logger.error(f"Error processing query: {str(e)}")
+        logger.error(f"Error processing batch query: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -105,14 +235,21 @@ def get_dataset_info(dataset_id):
         JSON with dataset information
     """
     try:
-        collection = chromadb.create_collection(dataset_id)
-        doc_count = chromadb.get_collection_count(collection)
+        collection = chromadb.get_collection(dataset_id)
+        doc_count = chromadb.get_collection_count(collection) if collection else 0
+        manifest = dataset_store.get_manifest(dataset_id)
         
         return jsonify({
             'success': True,
             'datasetId': dataset_id,
             'documentCount': doc_count,
-            'processed': doc_count > 0
+            'processed': doc_count > 0,
+            'version': manifest['version'] if manifest else None,
+            'schema': manifest['schema'] if manifest else None,
+            'storedRowCount': manifest['rowCount'] if manifest else None,
+            'tables': sorted(manifest.get('tables', {})) if manifest else None,
+            'columnStats': manifest.get('stats') if manifest else None,
+            'embedding': collection_signature(collection.metadata) if collection else None
         }), 200
         
     except Exception as e:
@@ -121,3 +258,244 @@ def get_dataset_info(dataset_id):
             'success': False,
             'error': str(e)
         }), 500
+
+
+def _queryable_collection(dataset_id):
+    """
+    Get a dataset's collection if it can be queried
+    
+    Returns:
+        tuple: (collection, None), or (None, error response) when the
+        dataset has no data or was embedded by another backend
+    """
+    collection = chromadb.get_collection(dataset_id)
+    
+    # Check if collection has data
+    doc_count = chromadb.get_collection_count(collection) if collection else 0
+    if doc_count == 0:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Dataset not processed yet or no data found'
+        }), 404)
+    
+    # Question vectors are only comparable with vectors from the same backend
+    try:
+        vertex_ai.embedding_backend.check_collection(collection)
+    except EmbeddingMismatchError as e:
+        return None, (jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409)
+    
+    return collection, None
+
+
+def _answer_questions(collection, dataset_id, manifest, questions, user_id):
+    """
+    Answer questions about one dataset, sharing the work between them
+    
+    Question embeddings are generated in one call, each retrieval step is
+    one multi-vector ChromaDB query (per distinct predicate filter), and
+    Gemini calls run concurrently on the shared generation pool.
+    
+    Returns:
+        tuple: (answers, timings) - the response payload of each question,
+        in order ('success' False with an 'error' if its generation failed),
+        and {'retrievalMs', 'questions': [{'generationMs', 'elapsedMs'}]}
+    """
+    started = time.perf_counter()
+    cache_scope = answer_cache.scope(user_id, {dataset_id: manifest['version'] if manifest else None})
+    items = _retrieve(collection, dataset_id, manifest, questions, cache_scope)
+    retrieval_ms = _elapsed_ms(started)
+    
+    # Generate the remaining answers, concurrently when there are several
+    pending = [item for item in items if item['answer'] is None]
+    if len(pending) == 1:
+        _generate_answer(pending[0], started)
+    else:
+        futures = [vertex_ai.generation_executor.submit(_generate_answer, item, started) for item in pending]
+        for future in futures:
+            future.result()
+    
+    for item in pending:
+        _cache_answer(item, cache_scope)
+    
+    return [item['answer'] for item in items], {
+        'retrievalMs': retrieval_ms,
+        'questions': [
+            {'generationMs': item.get('generation_ms', 0.0), 'elapsedMs': item.get('elapsed_ms', retrieval_ms)}
+            for item in items
+        ]
+    }
+
+
+def _retrieve(collection, dataset_id, manifest, questions, cache_scope):
+    """
+    Retrieve the context of each question, or its cached answer
+    
+    Returns:
+        list: Per-question state dicts; 'answer' is set for answer cache
+        hits, 'search' and 'summaries' hold the retrieved context otherwise
+    """
+    has_keyword_index = keyword_index is not None and keyword_index.has_dataset(dataset_id)
+    
+    items = []
+    for question in questions:
+        # Predicates in the question (dates, categories, numeric bounds)
+        # prune chunks whose zone maps cannot match
+        predicates = extract_predicates(question, manifest.get('zoneMaps')) if manifest else []
+        keyword_terms, specific_terms, candidates = keyword_index.query_terms(question) if has_keyword_index else ([], [], [])
+        if candidates:
+            specific_terms += keyword_index.selective_terms(dataset_id, candidates, keyword_terms)
+        item = {'question': question, 'predicates': predicates, 'keyword_terms': keyword_terms, 'embedding': None, 'answer': None}
+        
+        # Exact-token lookups (ids, quoted text, rare product names) are
+        # answered from the keyword index alone, without an embedding call
+        keyword_results = None
+        if specific_terms:
+            keyword_results = _filter_results(
+                keyword_index.search(dataset_id, specific_terms, top_k=config.HYBRID_CANDIDATES), predicates, top_k=config.CONTEXT_MAX_CHUNKS
+            )
+        
+        if keyword_results and keyword_results['ids']:
+            keyword_index.record_query(keyword_only=True)
+            item['retrieval'] = 'keyword'
+            item['search'] = keyword_results
+            item['summaries'] = keyword_index.search(dataset_id, specific_terms, top_k=config.SUMMARY_TOP_K, summaries=True)
+        else:
+            item['retrieval'] = 'hybrid' if has_keyword_index else 'vector'
+        items.append(item)
+    
+    # Reuse answers to near-identical questions about this version of the dataset
+    vector_items = [item for item in items if item['retrieval'] != 'keyword']
+    embeddings = vertex_ai.generate_query_embeddings([item['question'] for item in vector_items])
+    for item, embedding in zip(vector_items, embeddings):
+        item['embedding'] = embedding
+        cached, similarity = answer_cache.get(cache_scope, embedding)
+        if cached:
+            logger.info(f"Query served from answer cache for dataset: {dataset_id}")
+            item['answer'] = {**cached, 'cached': True, 'cacheSimilarity': similarity}
+    
+    _vector_search(collection, dataset_id, [item for item in vector_items if item['answer'] is None], has_keyword_index)
+    return items
+
+
+def _vector_search(collection, dataset_id, items, has_keyword_index):
+    """
+    Retrieve context for questions by embedding similarity
+    
+    Fetches a few dataset summaries (exact aggregates over all rows) plus
+    the closest row chunks for every question, fused with the best keyword
+    matches when the dataset is indexed.
+    """
+    if not items:
+        return
+    
+    embeddings = [item['embedding'] for item in items]
+    top_k = config.HYBRID_CANDIDATES if has_keyword_index else config.CONTEXT_MAX_CHUNKS
+    
+    summaries = [{'documents': []} for _ in items]
+    if config.SUMMARY_TOP_K > 0:
+        summaries = chromadb.semantic_search_many(
+            collection=collection,
+            query_embeddings=embeddings,
+            top_k=config.SUMMARY_TOP_K,
+            where={'type': SUMMARY_TYPE}
+        )
+    
+    # Questions with the same predicate filter share one query
+    row_filter = {'type': {'$ne': SUMMARY_TYPE}}
+    groups = {}
+    for i, item in enumerate(items):
+        predicate_filters = predicates_to_where(item['predicates'])
+        where = {'$and': [row_filter] + predicate_filters} if predicate_filters else row_filter
+        groups.setdefault(json.dumps(where, sort_keys=True), (where, []))[1].append(i)
+    
+    searches = [None] * len(items)
+    for where, indices in groups.values():
+        results = chromadb.semantic_search_many(
+            collection=collection,
+            query_embeddings=[embeddings[i] for i in indices],
+            top_k=top_k,
+            where=where
+        )
+        for i, result in zip(indices, results):
+            searches[i] = result
+    
+    # Predicates read from the question can be wrong; never return nothing because of them
+    empty = [i for i, item in enumerate(items) if item['predicates'] and not searches[i]['ids']]
+    if empty:
+        results = chromadb.semantic_search_many(
+            collection=collection,
+            query_embeddings=[embeddings[i] for i in empty],
+            top_k=top_k,
+            where=row_filter
+        )
+        for i, result in zip(empty, results):
+            items[i]['predicates'] = []
+            searches[i] = result
+    
+    for item, search_results, summary_results in zip(items, searches, summaries):
+        # The number of chunks follows from how close they are to the question;
+        # fusion with keyword matches decides which chunks fill those places
+        search_results = adaptive_cutoff(search_results)
+        if has_keyword_index:
+            keyword_index.record_query(keyword_only=False)
+            search_results = reciprocal_rank_fusion([
+                _filter_results(keyword_index.search(dataset_id, item['keyword_terms'], top_k=config.HYBRID_CANDIDATES), item['predicates']),
+                search_results
+            ], top_k=len(search_results['ids']))
+        item['search'] = search_results
+        item['summaries'] = summary_results
+
+
+def _generate_answer(item, started, on_token=None):
+    """Build a question's context and generate its answer (errors are recorded on the item)"""
+    # Build context from search results, within the token budget
+    context, context_stats = assemble_context(item['question'], item['summaries']['documents'], item['search'])
+    
+    generation_started = time.perf_counter()
+    try:
+        response_text = vertex_ai.generate_response(item['question'], context, on_token)
+        item['answer'] = {
+            'success': True,
+            'response': response_text,
+            **context_stats,
+            'tokensSent': estimate_tokens(vertex_ai.build_prompt(item['question'], context)),
+            'retrieval': item['retrieval'],
+            'predicates': item['predicates']
+        }
+    except Exception as e:
+        logger.error(f"Error generating answer: {str(e)}")
+        item['answer'] = {'success': False, 'error': str(e)}
+    
+    item['generation_ms'] = _elapsed_ms(generation_started)
+    item['elapsed_ms'] = _elapsed_ms(started)
+
+
+def _cache_answer(item, cache_scope):
+    """Cache a newly generated answer and mark it as not served from the cache"""
+    if not item['answer']['success']:
+        return
+    if item['embedding'] is not None:
+        answer_cache.put(cache_scope, item['embedding'], item['answer'])
+    item['answer'] = {**item['answer'], 'cached': False}
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def _filter_results(results, predicates, top_k=None):
+    """
+    Keep the results whose zone maps satisfy the predicates
+    
+    Falls back to the unfiltered results if none do, since predicates read
+    from the question can be wrong.
+    """
+    keep = [i for i, metadata in enumerate(results['metadatas']) if matches(metadata, predicates)]
+    if predicates and not keep:
+        keep = list(range(len(results['ids'])))
+    keep = keep[:top_k] if top_k else keep
+    
+    return {key: [values[i] for i in keep] for key, values in results.items()}
@@ -3,7 +3,7 @@ SQL routes for database connection and querying
 """
 
 from flask import Blueprint, request, jsonify
-from services import context_manager, sql_service
+from services import context_manager, sql_service, duckdb_service, answer_cache, SQLAgent, VertexAIService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,6 +13,9 @@ sql_bp = Blueprint('sql', __name__)
 # Initialize SQL service
 # sql_service = SQLService() # Removed, using imported instance
 
+# One agent per process; it owns a Vertex AI client and its worker pools
+sql_agent = SQLAgent(VertexAIService())
+
 
 @sql_bp.route('/api/sql/connect', methods=['POST'])
 def save_connection():
@@ -79,6 +82,9 @@ def save_connection():
             }
         )
         
+        # Answers from the previous registration may describe another database
+        answer_cache.invalidate(connection_id)
+        
         logger.info(f"Connection {connection_id} created and registered successfully")
         
         return jsonify({
@@ -189,8 +195,6 @@ def execute_query():
 def natural_language_query():
     """Execute natural language query"""
     try:
-        from services import SQLAgent
-        
         data = request.get_json()
         
         connection_id = data.get('connectionId')
@@ -204,7 +208,6 @@ def natural_language_query():
         
         logger.info(f"Processing NL query: {question}")
         
-        sql_agent = SQLAgent()
         result = sql_agent.query_database(connection_id, question)
         analysis = sql_agent.analyze_results(question, result['sql'], result['data'])
         
@@ -224,6 +227,127 @@ def natural_language_query():
         }), 500
 
 
+@sql_bp.route('/api/sql/datasets/schema', methods=['POST'])
+def get_dataset_schema():
+    """
+    Get the SQL tables of uploaded datasets
+    
+    Request JSON:
+        {
+            "datasetIds": ["dataset_1", "dataset_2"]
+        }
+    
+    Returns:
+        JSON with {table: [{name, type}]}; each file (or workbook sheet) is one table
+    """
+    try:
+        data = request.get_json()
+        
+        dataset_ids = data.get('datasetIds')
+        
+        if not dataset_ids:
+            return jsonify({
+                'success': False,
+                'message': 'Missing required fields'
+            }), 400
+        
+        schema = duckdb_service.get_schema(dataset_ids)
+        
+        return jsonify({
+            'success': True,
+            'schema': schema
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting dataset schema: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@sql_bp.route('/api/sql/datasets/query', methods=['POST'])
+def execute_dataset_query():
+    """
+    Execute SQL over uploaded datasets
+    
+    Request JSON:
+        {
+            "datasetIds": ["dataset_1", "dataset_2"],
+            "sql": "SELECT region, SUM(sales) FROM sales GROUP BY region"
+        }
+    
+    Returns:
+        JSON with result rows
+    """
+    try:
+        data = request.get_json()
+        
+        dataset_ids = data.get('datasetIds')
+        sql = data.get('sql')
+        
+        if not all([dataset_ids, sql]):
+            return jsonify({
+                'success': False,
+                'message': 'Missing required fields'
+            }), 400
+        
+        logger.info(f"Executing query on datasets {dataset_ids}")
+        
+        df = duckdb_service.execute_query(dataset_ids, sql)
+        results = df.astype(object).where(df.notna(), None).to_dict('records')
+        
+        return jsonify({
+            'success': True,
+            'data': results,
+            'rowCount': len(results)
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error executing dataset query: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@sql_bp.route('/api/sql/datasets/nl-query', methods=['POST'])
+def natural_language_dataset_query():
+    """Execute natural language query over uploaded datasets"""
+    try:
+        data = request.get_json()
+        
+        dataset_ids = data.get('datasetIds')
+        question = data.get('question')
+        
+        if not all([dataset_ids, question]):
+            return jsonify({
+                'success': False,
+                'message': 'Missing required fields'
+            }), 400
+        
+        logger.info(f"Processing NL dataset query: {question}")
+        
+        result = sql_agent.query_datasets(dataset_ids, question)
+        analysis = sql_agent.analyze_results(question, result['sql'], result['data'])
+        
+        return jsonify({
+            'success': True,
+            'sql': result['sql'],
+            'data': result['data'],
+            'rowCount': result['rowCount'],
+            'tables': result['tables'],
+            'analysis': analysis
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error processing NL dataset query: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
 @sql_bp.route('/api/sql/sources/<user_id>', methods=['GET'])
 def get_user_sources(user_id):
     """Get all data sources for a user"""
@@ -0,0 +1,59 @@
+"""
+Server-sent events
+Streams the events of a query pipeline to the client as they happen
+"""
+
+import json
+import logging
+import queue
+import threading
+from flask import Response
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event, data):
+    """Encode one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def stream_events(producer):
+    """
+    Run a pipeline in a background thread and stream what it emits
+
+    The producer is called as producer(emit) and calls emit(event, data)
+    for each event; everything it emits is sent immediately, so the client
+    sees progress and answer tokens while later steps are still running.
+    An exception ends the stream with an 'error' event.
+
+    Args:
+        producer (callable): Pipeline to run
+
+    Returns:
+        Response: text/event-stream response
+    """
+    events = queue.Queue()
+
+    def run():
+        try:
+            producer(lambda event, data: events.put((event, data)))
+        except Exception as e:
+            logger.error(f"Error in streamed query: {str(e)}")
+            events.put(('error', {'success': False, 'error': str(e)}))
+        finally:
+            events.put(None)
+
+    def generate():
+        while True:
+            item = events.get()
+            if item is None:
+                return
+            yield format_event(*item)
+
+    threading.Thread(target=run, name='sse-producer', daemon=True).start()
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Stop reverse proxies from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
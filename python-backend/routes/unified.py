@@ -9,19 +9,28 @@ from services import (
     context_manager, 
     ChromaDBService, 
     VertexAIService,
-    SQLAgent
+    SQLAgent,
+    dataset_store,
+    answer_cache
 )
+from services.vertex_ai_service import extract_chart_config
+from services.context_builder import adaptive_cutoff, assemble_context
+from services.embedding_backend import EmbeddingMismatchError
+from services.data_processor import SUMMARY_TYPE
+from routes.sse import stream_events
 import logging
 import os
+import config
 
 logger = logging.getLogger(__name__)
 
 unified_bp = Blueprint('unified', __name__)
 
-# Initialize services
-orchestrator = Orchestrator()
-chromadb = ChromaDBService()
+# Initialize services; the agents share one Vertex AI client and its worker pools
 vertex_ai = VertexAIService()
+orchestrator = Orchestrator(vertex_ai)
+sql_agent = SQLAgent(vertex_ai)
+chromadb = ChromaDBService()
 
 
 @unified_bp.route('/api/unified/query', methods=['POST'])
@@ -61,154 +70,298 @@ def unified_query():
                 'message': 'No data sources available. Please upload a CSV or connect a database.'
             }), 400
         
-        # Step 2: Use Orchestrator to detect which sources are needed
-        decision = orchestrator.detect_sources(question, available_sources)
-        
-        logger.info(f"Orchestrator decision: {decision}")
-        
-        # Step 3: Query the appropriate agents
-        csv_results = None
-        sql_results = None
-        
-        # Query CSV sources if needed
-        if 'csv' in decision['sources'] and decision['csv_targets']:
-            csv_results = _query_csv_sources(
-                user_id, 
-                question, 
-                decision['csv_targets'],
-                available_sources['csvFiles']
-            )
-        
-        # Query SQL sources if needed
-        if 'sql' in decision['sources'] and decision['sql_targets']:
-            sql_results = _query_sql_sources(
-                user_id,
-                question,
-                decision['sql_targets'],
-                available_sources['sqlDatabases']
-            )
-        
-        # Step 4: Merge results
-        merged_results = orchestrator.merge_results(
-            csv_results=csv_results,
-            sql_results=sql_results,
-            question=question
-        )
+        return jsonify(_answer_unified(user_id, question, available_sources)), 200
         
-        # Step 5: Generate report if requested
-        report_path = None
-        report_filename = None
-        if decision.get('generate_report', False):
-            try:
-                from services.report_writer_agent import report_writer_agent
-                from datetime import datetime
-                
-                # Extract chart config if present in analysis
-                chart_config = None
-                analysis_text = merged_results['analysis']
-                
-                # Try to extract JSON chart config from analysis
-                import json
-                import re
-                json_match = re.search(r'```json\s*(\{.*?\})\s*```', analysis_text, re.DOTALL)
-                if json_match:
-                    try:
-                        chart_config = json.loads(json_match.group(1))
-                    except:
-                        pass
-                
-                # Prepare report data
-                report_data = {
-                    'title': f"Data Analysis Report - {datetime.now().strftime('%Y-%m-%d')}",
-                    'user_query': question,
-                    'insights': analysis_text,
-                    'data': merged_results['data'],
-                    'chart_config': chart_config,
-                    'metadata': {
-                        'generated_by': user_id,
-                        'timestamp': datetime.now().isoformat(),
-                        'data_source': ', '.join(merged_results['sourcesUsed'])
-                    }
-                }
-                
-                # Generate report
-                report_path = report_writer_agent.generate_report(report_data)
-                report_filename = os.path.basename(report_path)
-                logger.info(f"Report generated: {report_filename}")
-                
-            except Exception as e:
-                logger.error(f"Error generating report: {str(e)}")
-                # Continue without report if generation fails
-        
-        logger.info(f"Query completed. Sources used: {merged_results['sourcesUsed']}")
-        
-        response_data = {
-            'success': True,
-            'answer': merged_results['analysis'],
-            'data': merged_results['data'],
-            'rowCount': merged_results['rowCount'],
-            'sourcesUsed': merged_results['sourcesUsed']
-        }
+    except Exception as e:
+        logger.error(f"Error processing unified query: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@unified_bp.route('/api/unified/query/stream', methods=['POST'])
+def unified_query_stream():
+    """
+    Streaming variant of /api/unified/query (server-sent events)
+    
+    Request JSON: same as /api/unified/query
+    
+    Events:
+        progress: {"stage": "routing", "sources", "csvTargets", "sqlTargets"},
+            {"stage": "sql", "source", "sql"}, {"stage": "rows", "source", "rowCount"}
+            or {"stage": "retrieval", "source", "datasets"}
+        token: {"text"} - answer fragments as Gemini produces them
+        reset: {"source"} - discard the tokens received so far; the answer
+            failed part-way and a fallback answer is streamed next
+        done: the /api/unified/query response, plus "chart" (parsed chart JSON or null)
+        error: {"success": false, "error"}
+    """
+    try:
+        data = request.get_json()
+        
+        user_id = data.get('userId')
+        question = data.get('question')
         
-        # Add report info if generated
-        if report_filename:
-            response_data['reportGenerated'] = True
-            response_data['reportFilename'] = report_filename
-            response_data['reportDownloadUrl'] = f"/api/reports/download/{report_filename}"
+        if not all([user_id, question]):
+            return jsonify({
+                'success': False,
+                'message': 'Missing required fields: userId, question'
+            }), 400
         
-        return jsonify(response_data), 200
+        logger.info(f"Processing streaming unified query for user {user_id}: {question}")
         
+        available_sources = context_manager.get_user_context(user_id)
+        
+        if not available_sources['csvFiles'] and not available_sources['sqlDatabases']:
+            return jsonify({
+                'success': False,
+                'message': 'No data sources available. Please upload a CSV or connect a database.'
+            }), 400
+        
+        def produce(emit):
+            result = _answer_unified(user_id, question, available_sources, emit)
+            if result['cached']:
+                emit('token', {'text': result['answer']})
+            emit('done', {**result, 'chart': extract_chart_config(result['answer'])})
+        
+        return stream_events(produce)
+    
     except Exception as e:
-        logger.error(f"Error processing unified query: {str(e)}")
+        logger.error(f"Error processing streaming unified query: {str(e)}")
         return jsonify({
             'success': False,
             'message': str(e)
         }), 500
 
 
-def _query_csv_sources(user_id, question, target_files, available_files):
+def _answer_unified(user_id, question, available_sources, emit=None):
     """
-    Query CSV sources using ChromaDB and Vertex AI
+    Answer a question over a user's sources
+    
+    Args:
+        user_id: User identifier
+        question: User's question
+        available_sources: The user's context from the context manager
+        emit (callable, optional): Called as emit(event, data) with pipeline
+            progress and answer tokens, for streaming
+        
+    Returns:
+        dict: Response payload
+    """
+    # Reuse the answer to a near-identical question over the same versions of
+    # these sources. The question is only embedded when the user has CSV
+    # datasets, whose retrieval fallback reuses the embedding; SQL-only
+    # questions skip the answer cache rather than pay for an embedding
+    cache_scope = _answer_cache_scope(user_id, available_sources)
+    question_embedding = None
+    if available_sources['csvFiles']:
+        question_embedding = vertex_ai.generate_query_embedding(question)
+        cached, similarity = answer_cache.get(cache_scope, question_embedding)
+        if cached:
+            logger.info(f"Unified query served from answer cache for user {user_id}")
+            return {**cached, 'cached': True, 'cacheSimilarity': similarity}
+    
+    # Step 2: Use Orchestrator to detect which sources are needed
+    decision = orchestrator.detect_sources(question, available_sources)
+    
+    logger.info(f"Orchestrator decision: {decision}")
+    
+    query_csv = 'csv' in decision['sources'] and bool(decision['csv_targets'])
+    query_sql = 'sql' in decision['sources'] and bool(decision['sql_targets'])
+    if emit:
+        emit('progress', {
+            'stage': 'routing',
+            'sources': decision['sources'],
+            'csvTargets': decision['csv_targets'],
+            'sqlTargets': decision['sql_targets']
+        })
+    
+    # Answer tokens are streamed from whichever generation produces the
+    # final answer: a source's own analysis, or the comparison of both
+    on_token = (lambda text: emit('token', {'text': text})) if emit else None
+    
+    # Step 3: Query the appropriate agents
+    csv_results = None
+    sql_results = None
+    
+    # Query CSV sources if needed
+    if query_csv:
+        csv_results = _query_csv_sources(
+            user_id, 
+            question, 
+            decision['csv_targets'],
+            available_sources['csvFiles'],
+            emit=emit,
+            on_token=None if query_sql else on_token,
+            question_embedding=question_embedding
+        )
+    
+    # Query SQL sources if needed
+    if query_sql:
+        sql_results = _query_sql_sources(
+            user_id,
+            question,
+            decision['sql_targets'],
+            available_sources['sqlDatabases'],
+            emit=emit,
+            on_token=None if query_csv else on_token
+        )
+    
+    # Step 4: Merge results
+    merged_results = orchestrator.merge_results(
+        csv_results=csv_results,
+        sql_results=sql_results,
+        question=question,
+        on_token=on_token
+    )
+
+    # Each source ran silently because a comparison was expected; if only one
+    # (or neither) returned results there was none, so send the answer now
+    if on_token and query_csv and query_sql and not (csv_results and sql_results):
+        on_token(merged_results['analysis'])
+
+    # Step 5: Generate report if requested
+    report_path = None
+    report_filename = None
+    if decision.get('generate_report', False):
+        try:
+            from services.report_writer_agent import report_writer_agent
+            from datetime import datetime
+            
+            # Extract chart config if present in analysis
+            analysis_text = merged_results['analysis']
+            chart_config = extract_chart_config(analysis_text)
+            
+            # Prepare report data
+            report_data = {
+                'title': f"Data Analysis Report - {datetime.now().strftime('%Y-%m-%d')}",
+                'user_query': question,
+                'insights': analysis_text,
+                'data': merged_results['data'],
+                'chart_config': chart_config,
+                'metadata': {
+                    'generated_by': user_id,
+                    'timestamp': datetime.now().isoformat(),
+                    'data_source': ', '.join(merged_results['sourcesUsed'])
+                }
+            }
+            
+            # Generate report
+            report_path = report_writer_agent.generate_report(report_data)
+            report_filename = os.path.basename(report_path)
+            logger.info(f"Report generated: {report_filename}")
+            
+        except Exception as e:
+            logger.error(f"Error generating report: {str(e)}")
+            # Continue without report if generation fails
+    
+    logger.info(f"Query completed. Sources used: {merged_results['sourcesUsed']}")
+    
+    response_data = {
+        'success': True,
+        'answer': merged_results['analysis'],
+        'data': merged_results['data'],
+        'rowCount': merged_results['rowCount'],
+        'sourcesUsed': merged_results['sourcesUsed']
+    }
+    
+    # Add report info if generated
+    if report_filename:
+        response_data['reportGenerated'] = True
+        response_data['reportFilename'] = report_filename
+        response_data['reportDownloadUrl'] = f"/api/reports/download/{report_filename}"
+    
+    # Source failures come back as "No results found."; only real answers are cached
+    if merged_results['sourcesUsed'] and question_embedding is not None:
+        answer_cache.put(cache_scope, question_embedding, response_data)
+    
+    return {**response_data, 'cached': False}
+
+
+def _answer_cache_scope(user_id, available_sources):
+    """
+    Answer cache scope for a user's sources: the current stored version of
+    each CSV dataset, and each connection (invalidated when re-registered)
+    """
+    sources = {}
+    for csv_file in available_sources['csvFiles']:
+        manifest = dataset_store.get_manifest(csv_file['id'])
+        sources[csv_file['id']] = manifest['version'] if manifest else None
+    for sql_db in available_sources['sqlDatabases']:
+        sources[sql_db['id']] = None
+    
+    return answer_cache.scope(user_id, sources)
+
+
+def _query_csv_sources(user_id, question, target_files, available_files, emit=None, on_token=None, question_embedding=None):
+    """
+    Query CSV sources, with exact SQL over the stored datasets when possible
+    
+    All target files are queried together, so questions spanning several
+    files can join them. Falls back to retrieval over the embedded chunks
+    of all target files if the datasets are not stored or SQL generation
+    fails. If the analysis had already streamed tokens when it failed, a
+    'reset' event is emitted before the answer that replaces them.
     
     Args:
         user_id: User identifier
         question: User's question
         target_files: List of target filenames
         available_files: List of available CSV files
+        emit (callable, optional): Receives progress events (SQL generated, rows fetched)
+        on_token (callable, optional): Receives the analysis as it streams in
+        question_embedding (list, optional): Query embedding of the question, reused for retrieval
         
     Returns:
         dict: CSV query results
     """
     try:
-        # Find the dataset ID for the target file
-        dataset_id = None
-        for csv_file in available_files:
-            if csv_file['name'] in target_files:
-                dataset_id = csv_file['id']
-                break
-        
-        if not dataset_id:
+        # Find the datasets for the target files
+        datasets = [
+            {'id': csv_file['id'], 'name': csv_file['name']}
+            for csv_file in available_files
+            if csv_file['name'] in target_files
+        ]
+        
+        if not datasets:
             logger.warning(f"CSV file not found: {target_files}")
             return None
         
-        logger.info(f"Querying CSV dataset: {dataset_id}")
-        
-        # Get collection
-        collection = chromadb.get_collection(dataset_id)
-        
-        # Search for relevant context
-        results = chromadb.query_collection(collection, question, n_results=5)
-        
-        # Build context from results
-        context = "\n\n".join(results['documents'][0]) if results['documents'] else ""
+        streamed = []
+        
+        try:
+            logger.info(f"Querying CSV datasets with SQL: {[d['id'] for d in datasets]}")
+            
+            result = sql_agent.query_datasets(datasets, question, on_progress=_progress_reporter(emit, 'csv'))
+            analysis = sql_agent.analyze_results(question, result['sql'], result['data'], _recording(on_token, streamed))
+            _restream_if_changed(emit, on_token, streamed, analysis, 'csv')
+            
+            return {
+                'analysis': analysis,
+                'data': result['data'],
+                'sql': result['sql'],
+                'source': ', '.join(d['name'] for d in datasets)
+            }
+            
+        except Exception as e:
+            logger.warning(f"SQL over CSV datasets failed, falling back to retrieval: {str(e)}")
+            if streamed:
+                emit('reset', {'source': 'csv'})
+        
+        # Fall back to retrieval over every target dataset's chunks
+        retrieved = _retrieve_csv_context(question, datasets, emit, question_embedding)
+        if retrieved is None:
+            return None
+        context, sources = retrieved
         
         # Generate response using Vertex AI
-        response = vertex_ai.generate_response(question, context)
+        response = vertex_ai.generate_response(question, context, on_token)
         
         return {
             'response': response,
             'data': [],  # Could parse data from context if needed
-            'source': target_files[0]
+            'source': ', '.join(sources)
         }
         
     except Exception as e:
@@ -216,7 +369,85 @@ def _query_csv_sources(user_id, question, target_files, available_files):
         return None
 
 
-def _query_sql_sources(user_id, question, target_databases, available_databases):
+def _retrieve_csv_context(question, datasets, emit=None, query_embedding=None):
+    """
+    Retrieve prompt context from the embedded chunks of several datasets
+    
+    Every dataset's collection is searched concurrently with one question
+    embedding; the hits are merged by distance and share one context budget,
+    so a question spanning several files costs one round of searches.
+    
+    Args:
+        question: User's question
+        datasets: List of {'id', 'name'} of the target datasets
+        emit (callable, optional): Receives the retrieval progress event
+        query_embedding (list, optional): Query embedding of the question,
+            if already computed
+        
+    Returns:
+        tuple: (context, names of the datasets searched), or None if no
+        target dataset can be searched
+    """
+    collections = []
+    names = []
+    for dataset in datasets:
+        collection = chromadb.get_collection(dataset['id'])
+        if collection is None:
+            logger.warning(f"CSV dataset not processed: {dataset['id']}")
+            continue
+        
+        try:
+            vertex_ai.embedding_backend.check_collection(collection)
+        except EmbeddingMismatchError as e:
+            logger.warning(f"Skipping CSV dataset {dataset['id']}: {str(e)}")
+            continue
+        
+        collections.append(collection)
+        names.append(dataset['name'])
+    
+    if not collections:
+        return None
+    
+    logger.info(f"Retrieving from CSV datasets: {names}")
+    if emit:
+        emit('progress', {'stage': 'retrieval', 'source': 'csv', 'datasets': names})
+    
+    # Search for relevant context
+    if query_embedding is None:
+        query_embedding = vertex_ai.generate_query_embedding(question)
+    searches = chromadb.semantic_search_collections(collections, query_embedding, top_k=config.CONTEXT_MAX_CHUNKS)
+    
+    # Merge the hits of all datasets by distance (they share one embedding backend)
+    hits = sorted(
+        (distance, i, j)
+        for i, results in enumerate(searches)
+        for j, distance in enumerate(results['distances'])
+    )
+    merged = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+    for distance, i, j in hits:
+        merged['ids'].append(searches[i]['ids'][j])
+        merged['documents'].append(searches[i]['documents'][j])
+        merged['metadatas'].append({**searches[i]['metadatas'][j], 'dataset': names[i]})
+        merged['distances'].append(distance)
+    results = adaptive_cutoff(merged)
+    
+    # Build context from results, within the token budget
+    is_summary = [metadata.get('type') == SUMMARY_TYPE for metadata in results['metadatas']]
+    rows = {
+        key: [value for value, summary in zip(values, is_summary) if not summary]
+        for key, values in results.items()
+    }
+    summaries = [
+        f"Source: {metadata['dataset']}\n{doc}"
+        for doc, metadata, summary in zip(results['documents'], results['metadatas'], is_summary)
+        if summary
+    ]
+    context, _ = assemble_context(question, summaries, rows)
+    
+    return context, names
+
+
+def _query_sql_sources(user_id, question, target_databases, available_databases, emit=None, on_token=None):
     """
     Query SQL sources using SQL Agent
     
@@ -225,6 +456,8 @@ def _query_sql_sources(user_id, question, target_databases, available_databases)
         question: User's question
         target_databases: List of target database names
         available_databases: List of available databases
+        emit (callable, optional): Receives progress events (SQL generated, rows fetched)
+        on_token (callable, optional): Receives the analysis as it streams in
         
     Returns:
         dict: SQL query results
@@ -244,15 +477,17 @@ def _query_sql_sources(user_id, question, target_databases, available_databases)
         logger.info(f"Querying SQL database: {connection_id}")
         
         # Use SQL Agent to query
-        sql_agent = SQLAgent()
-        result = sql_agent.query_database(connection_id, question)
+        result = sql_agent.query_database(connection_id, question, on_progress=_progress_reporter(emit, 'sql'))
         
         # Analyze results
+        streamed = []
         analysis = sql_agent.analyze_results(
             question,
             result['sql'],
-            result['data']
+            result['data'],
+            _recording(on_token, streamed)
         )
+        _restream_if_changed(emit, on_token, streamed, analysis, 'sql')
         
         return {
             'analysis': analysis,
@@ -264,3 +499,34 @@ def _query_sql_sources(user_id, question, target_databases, available_databases)
     except Exception as e:
         logger.error(f"Error querying SQL sources: {str(e)}")
         return None
+
+
+def _recording(on_token, streamed):
+    """Wrap on_token so the fragments it is given are also appended to streamed"""
+    if not on_token:
+        return None
+    
+    def forward(text):
+        streamed.append(text)
+        on_token(text)
+    
+    return forward
+
+
+def _restream_if_changed(emit, on_token, streamed, answer, source):
+    """
+    Replace streamed tokens that are not the final answer
+    
+    The analysis falls back to a basic summary when generation fails part-way,
+    so the client is told to discard what it received and is sent the answer.
+    """
+    if streamed and ''.join(streamed).strip() != answer:
+        emit('reset', {'source': source})
+        on_token(answer)
+
+
+def _progress_reporter(emit, source):
+    """Adapt an emit callback to the SQL agent's on_progress(stage, details)"""
+    if not emit:
+        return None
+    return lambda stage, details: emit('progress', {'stage': stage, 'source': source, **details})
@@ -6,8 +6,17 @@ from .vertex_ai_service import VertexAIService
 from .chromadb_service import ChromaDBService
 from .data_processor import DataProcessor
 from .sql_service import SQLService, sql_service
+from .duckdb_service import DuckDBService, duckdb_service
 from .sql_agent import SQLAgent
 from .orchestrator import Orchestrator
 from .context_manager import ContextManager, context_manager
+from .job_queue import JobQueue, job_queue
+from .embedding_backend import EmbeddingBackend, create_embedding_backend
+from .embedding_cache import EmbeddingCache, embedding_cache
+from .query_embedding_cache import QueryEmbeddingCache, query_embedding_cache
+from .answer_cache import AnswerCache, answer_cache
+from .keyword_index import KeywordIndex, keyword_index
+from .dataset_store import DatasetStore, dataset_store
+from .shared_dataset_cache import SharedDatasetCache, shared_dataset_cache
 
-__all__ = ['VertexAIService', 'ChromaDBService', 'DataProcessor', 'SQLService', 'sql_service', 'SQLAgent', 'Orchestrator', 'ContextManager', 'context_manager']
+__all__ = ['VertexAIService', 'ChromaDBService', 'DataProcessor', 'SQLService', 'sql_service', 'DuckDBService', 'duckdb_service', 'SQLAgent', 'Orchestrator', 'ContextManager', 'context_manager', 'JobQueue', 'job_queue', 'EmbeddingBackend', 'create_embedding_backend', 'EmbeddingCache', 'embedding_cache', 'QueryEmbeddingCache', 'query_embedding_cache', 'AnswerCache', 'answer_cache', 'KeywordIndex', 'keyword_index', 'DatasetStore', 'dataset_store', 'SharedDatasetCache', 'shared_dataset_cache']
@@ -0,0 +1,183 @@
+"""
+Answer Cache Service
+In-memory cache of generated answers, matched by question embedding
+similarity within a scope of user, sources and source versions
+"""
+
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    def __init__(self, max_entries=None, ttl_seconds=None, threshold=None):
+        """
+        Initialize the answer cache
+
+        An answer is reused when a new question in the same scope (user,
+        sources and the version of each source) has a question embedding
+        whose cosine similarity with a cached one reaches the threshold.
+        Reprocessing a dataset changes its version, so older answers stop
+        matching; invalidate() also drops them immediately.
+
+        Args:
+            max_entries: Maximum cached answers (defaults to config.ANSWER_CACHE_SIZE)
+            ttl_seconds: Entry lifetime (defaults to config.ANSWER_CACHE_TTL_SECONDS)
+            threshold: Minimum cosine similarity for a hit (defaults to config.ANSWER_CACHE_SIMILARITY)
+        """
+        self.max_entries = config.ANSWER_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl_seconds = config.ANSWER_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.threshold = config.ANSWER_CACHE_SIMILARITY if threshold is None else threshold
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._scopes = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scope(user_id, sources):
+        """
+        Build a cache scope
+
+        Args:
+            user_id: User the answer was generated for (None if not user specific)
+            sources (dict): {source id: version} of every source the answer
+                may draw on (dataset version, or None for SQL connections)
+
+        Returns:
+            tuple: Hashable scope key
+        """
+        return (user_id, tuple(sorted((str(k), v) for k, v in sources.items())))
+
+    def get(self, scope, embedding):
+        """
+        Find a cached answer to a similar question in the same scope
+
+        Args:
+            scope: Key from AnswerCache.scope()
+            embedding (list): Question embedding
+
+        Returns:
+            tuple: (answer, similarity), or (None, None) on a miss
+        """
+        if self.max_entries <= 0:
+            return None, None
+
+        vector = self._unit(embedding)
+
+        with self._lock:
+            now = time.monotonic()
+            best_id, best_score = None, -1.0
+
+            for entry_id in list(self._scopes.get(scope, ())):
+                entry = self._entries[entry_id]
+                if entry['expires'] < now:
+                    self._remove(entry_id)
+                    continue
+                if len(entry['vector']) != len(vector):
+                    continue
+
+                score = float(np.dot(entry['vector'], vector))
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                self.misses += 1
+                return None, None
+
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id]['answer'], round(best_score, 4)
+
+    def put(self, scope, embedding, answer):
+        """
+        Cache an answer
+
+        Args:
+            scope: Key from AnswerCache.scope()
+            embedding (list): Question embedding
+            answer (dict): Response payload to serve on a hit
+        """
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {
+                'scope': scope,
+                'vector': self._unit(embedding),
+                'answer': answer,
+                'expires': time.monotonic() + self.ttl_seconds
+            }
+            self._scopes.setdefault(scope, []).append(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, source_id):
+        """
+        Drop every answer that drew on a source
+
+        Args:
+            source_id: Dataset or connection identifier
+        """
+        source_id = str(source_id)
+
+        with self._lock:
+            stale = [
+                scope for scope in self._scopes
+                if any(key == source_id for key, _ in scope[1])
+            ]
+            for scope in stale:
+                for entry_id in list(self._scopes[scope]):
+                    self._remove(entry_id)
+
+        if stale:
+            logger.info(f"Invalidated cached answers for source {source_id}")
+
+    def get_stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: Hits, misses, evictions and entries for this process
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'threshold': self.threshold
+            }
+
+    def _remove(self, entry_id):
+        # Caller holds self._lock
+        entry = self._entries.pop(entry_id)
+        scope_ids = self._scopes[entry['scope']]
+        scope_ids.remove(entry_id)
+        if not scope_ids:
+            del self._scopes[entry['scope']]
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+# Global instance
+answer_cache = AnswerCache()
@@ -3,13 +3,102 @@ ChromaDB Service for vector storage and semantic search
 """
 
 import chromadb
+import chromadb.errors
 from chromadb.config import Settings
 import config
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# get_collection raises ValueError for unknown names before chromadb 0.6
+_NOT_FOUND_ERRORS = (ValueError,) + tuple(
+    error for error in [getattr(chromadb.errors, 'NotFoundError', None)] if error
+)
+
+
+class CollectionCache:
+    def __init__(self, ttl_seconds=None):
+        """
+        In-process cache of collection handles and document counts
+        
+        Shared by every ChromaDBService in the process, so counts updated by
+        the ingestion path are seen by the query routes. Entries expire after
+        ttl_seconds to pick up changes made by other worker processes.
+        
+        Args:
+            ttl_seconds: Entry lifetime (defaults to config.CHROMADB_CACHE_TTL_SECONDS)
+        """
+        self.ttl_seconds = config.CHROMADB_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def get(self, name):
+        """Get the cached entry ({'collection', 'count', 'expires'}) for a collection name, or None"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry and entry['expires'] > time.monotonic():
+                self.hits += 1
+                return entry
+            
+            self._entries.pop(name, None)
+            self.misses += 1
+            return None
+    
+    def put(self, name, collection, count=None):
+        """Cache a collection handle, with its document count if known"""
+        with self._lock:
+            self._entries[name] = {
+                'collection': collection,
+                'count': count,
+                'expires': time.monotonic() + self.ttl_seconds
+            }
+    
+    def set_count(self, name, count):
+        with self._lock:
+            if name in self._entries:
+                self._entries[name]['count'] = count
+    
+    def adjust_count(self, name, delta):
+        """Apply a known change to a cached count; unknown counts stay unknown"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry and entry['count'] is not None:
+                entry['count'] += delta
+    
+    def invalidate(self, name, count_only=False):
+        with self._lock:
+            if count_only:
+                if name in self._entries:
+                    self._entries[name]['count'] = None
+            else:
+                self._entries.pop(name, None)
+    
+    def get_stats(self):
+        """
+        Get cache counters
+        
+        Returns:
+            dict: Hits, misses and cached collections for this process
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries)
+            }
+
+
+# Global instance
+collection_cache = CollectionCache()
+
 
 class ChromaDBService:
     def __init__(self):
@@ -21,31 +110,48 @@ class ChromaDBService:
                     anonymized_telemetry=False
                 )
             )
+            
+            # Shared pool for searching several collections at once
+            self.search_executor = ThreadPoolExecutor(
+                max_workers=config.RETRIEVAL_CONCURRENCY,
+                thread_name_prefix='chromadb-search'
+            )
+            
             logger.info(f"ChromaDB initialized with persist directory: {config.CHROMADB_PERSIST_DIR}")
             
         except Exception as e:
             logger.error(f"Error initializing ChromaDB: {str(e)}")
             raise
 
-    def create_collection(self, dataset_id):
+    def create_collection(self, dataset_id, embedding=None):
         """
         Create or get a collection for a dataset
         
         Args:
             dataset_id (str): Unique identifier for the dataset
+            embedding (dict, optional): Signature of the embedding backend
+                filling the collection, recorded in its metadata
             
         Returns:
             Collection: ChromaDB collection object
         """
         try:
             collection_name = f"dataset_{dataset_id}"
+            metadata = {"dataset_id": dataset_id, **(embedding or {})}
             
             # Get or create collection
             collection = self.client.get_or_create_collection(
                 name=collection_name,
-                metadata={"dataset_id": dataset_id}
+                metadata=metadata
             )
             
+            # Existing collections keep their metadata; record the backend
+            # on ones created before it was tracked
+            if any((collection.metadata or {}).get(key) != value for key, value in metadata.items()):
+                collection.modify(metadata={**(collection.metadata or {}), **metadata})
+            
+            collection_cache.put(collection_name, collection)
+            
             logger.info(f"Collection created/retrieved: {collection_name}")
             return collection
             
@@ -53,6 +159,39 @@ class ChromaDBService:
             logger.error(f"Error creating collection: {str(e)}")
             raise
 
+    def get_collection(self, dataset_id):
+        """
+        Look up the collection of a dataset without creating it
+        
+        Served from the in-process cache when possible, so the query path
+        does not hit storage for every request.
+        
+        Args:
+            dataset_id (str): Dataset identifier
+            
+        Returns:
+            Collection: ChromaDB collection object, or None if the dataset
+            has no collection
+        """
+        try:
+            collection_name = f"dataset_{dataset_id}"
+            
+            entry = collection_cache.get(collection_name)
+            if entry:
+                return entry['collection']
+            
+            try:
+                collection = self.client.get_collection(name=collection_name)
+            except _NOT_FOUND_ERRORS:
+                return None
+            
+            collection_cache.put(collection_name, collection)
+            return collection
+            
+        except Exception as e:
+            logger.error(f"Error getting collection: {str(e)}")
+            raise
+
     def add_documents(self, collection, documents, embeddings, metadatas=None, ids=None):
         """
         Add documents with embeddings to a collection
@@ -80,6 +219,7 @@ class ChromaDBService:
                 metadatas=metadatas,
                 ids=ids
             )
+            collection_cache.adjust_count(collection.name, len(ids))
             
             logger.info(f"Added {len(documents)} documents to collection")
             return True
@@ -88,7 +228,135 @@ class ChromaDBService:
             logger.error(f"Error adding documents: {str(e)}")
             raise
 
-    def semantic_search(self, collection, query_embedding, top_k=5):
+    def upsert_documents(self, collection, documents, embeddings, metadatas, ids):
+        """
+        Insert documents, replacing any existing documents with the same ids
+        
+        Args:
+            collection: ChromaDB collection
+            documents (list): List of text documents
+            embeddings (list): List of embedding vectors
+            metadatas (list): List of metadata dicts
+            ids (list): List of document IDs
+            
+        Returns:
+            bool: Success status
+        """
+        try:
+            collection.upsert(
+                documents=documents,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                ids=ids
+            )
+            # Upserts may replace or add, so the count is re-read on next use
+            collection_cache.invalidate(collection.name, count_only=True)
+            
+            logger.info(f"Upserted {len(documents)} documents to collection")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error upserting documents: {str(e)}")
+            raise
+
+    def update_metadatas(self, collection, metadatas, ids):
+        """
+        Update the metadata of existing documents, keeping their embeddings
+        
+        Args:
+            collection: ChromaDB collection
+            metadatas (list): List of metadata dicts
+            ids (list): List of document IDs
+            
+        Returns:
+            bool: Success status
+        """
+        try:
+            if ids:
+                collection.update(ids=ids, metadatas=metadatas)
+                logger.info(f"Updated metadata of {len(ids)} documents")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error updating metadata: {str(e)}")
+            raise
+
+    def delete_documents(self, collection, ids):
+        """
+        Delete documents from a collection by id
+        
+        Args:
+            collection: ChromaDB collection
+            ids (list): List of document IDs
+            
+        Returns:
+            bool: Success status
+        """
+        try:
+            if ids:
+                collection.delete(ids=ids)
+                collection_cache.invalidate(collection.name, count_only=True)
+                logger.info(f"Deleted {len(ids)} documents from collection")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error deleting documents: {str(e)}")
+            raise
+
+    def get_document_metadatas(self, collection, page_size=5000):
+        """
+        Get the metadata stored with every document in a collection
+        
+        Args:
+            collection: ChromaDB collection
+            page_size (int): Documents fetched per request
+            
+        Returns:
+            dict: {document id: metadata dict (chunk_hash, start_row, ...)}
+        """
+        try:
+            metadatas = {}
+            offset = 0
+            
+            while True:
+                page = collection.get(include=['metadatas'], limit=page_size, offset=offset)
+                for doc_id, metadata in zip(page['ids'], page['metadatas']):
+                    metadatas[doc_id] = metadata or {}
+                
+                if len(page['ids']) < page_size:
+                    break
+                offset += page_size
+            
+            return metadatas
+            
+        except Exception as e:
+            logger.error(f"Error getting document metadata: {str(e)}")
+            raise
+
+    def get_embeddings(self, collection, ids):
+        """
+        Get the stored embeddings of documents
+        
+        Args:
+            collection: ChromaDB collection
+            ids (list): Document IDs
+            
+        Returns:
+            list: Embedding vectors, in the order of ids
+        """
+        try:
+            if not ids:
+                return []
+            
+            results = collection.get(ids=ids, include=['embeddings'])
+            by_id = dict(zip(results['ids'], results['embeddings']))
+            return [list(by_id[doc_id]) for doc_id in ids]
+            
+        except Exception as e:
+            logger.error(f"Error getting embeddings: {str(e)}")
+            raise
+
+    def semantic_search(self, collection, query_embedding, top_k=5, where=None):
         """
         Perform semantic search using query embedding
         
@@ -96,19 +364,22 @@ class ChromaDBService:
             collection: ChromaDB collection
             query_embedding (list): Query embedding vector
             top_k (int): Number of results to return
+            where (dict, optional): Metadata filter (e.g. {"type": "summary"})
             
         Returns:
-            dict: Search results with documents and metadata
+            dict: Search results with ids, documents and metadata
         """
         try:
             results = collection.query(
                 query_embeddings=[query_embedding],
-                n_results=top_k
+                n_results=top_k,
+                where=where
             )
             
             logger.info(f"Semantic search returned {len(results['documents'][0])} results")
             
             return {
+                'ids': results['ids'][0],
                 'documents': results['documents'][0],
                 'metadatas': results['metadatas'][0],
                 'distances': results['distances'][0]
@@ -118,6 +389,67 @@ class ChromaDBService:
             logger.error(f"Error performing semantic search: {str(e)}")
             raise
 
+    def semantic_search_many(self, collection, query_embeddings, top_k=5, where=None):
+        """
+        Perform one semantic search for several query embeddings
+        
+        Args:
+            collection: ChromaDB collection
+            query_embeddings (list): Query embedding vectors
+            top_k (int): Number of results per query
+            where (dict, optional): Metadata filter applied to every query
+            
+        Returns:
+            list: Search results (as in semantic_search) for each query, in order
+        """
+        try:
+            if not query_embeddings:
+                return []
+            
+            results = collection.query(
+                query_embeddings=query_embeddings,
+                n_results=top_k,
+                where=where
+            )
+            
+            logger.info(f"Semantic search for {len(query_embeddings)} queries")
+            
+            return [
+                {
+                    'ids': results['ids'][i],
+                    'documents': results['documents'][i],
+                    'metadatas': results['metadatas'][i],
+                    'distances': results['distances'][i]
+                }
+                for i in range(len(query_embeddings))
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error performing semantic search: {str(e)}")
+            raise
+
+    def semantic_search_collections(self, collections, query_embedding, top_k=5, where=None):
+        """
+        Search several collections with the same query embedding concurrently
+        
+        Args:
+            collections (list): ChromaDB collections
+            query_embedding (list): Query embedding vector
+            top_k (int): Number of results per collection
+            where (dict, optional): Metadata filter applied to every collection
+            
+        Returns:
+            list: Search results (as in semantic_search) for each collection, in order
+        """
+        if len(collections) == 1:
+            return [self.semantic_search(collections[0], query_embedding, top_k, where)]
+        
+        futures = [
+            self.search_executor.submit(self.semantic_search, collection, query_embedding, top_k, where)
+            for collection in collections
+        ]
+        return [future.result() for future in futures]
+
     def delete_collection(self, dataset_id):
         """
         Delete a collection for a dataset
@@ -130,6 +462,7 @@ class ChromaDBService:
         """
         try:
             collection_name = f"dataset_{dataset_id}"
+            collection_cache.invalidate(collection_name)
             self.client.delete_collection(name=collection_name)
             
             logger.info(f"Collection deleted: {collection_name}")
@@ -150,7 +483,19 @@ class ChromaDBService:
             int: Number of documents
         """
         try:
-            return collection.count()
+            entry = collection_cache.get(collection.name)
+            if entry and entry['count'] is not None:
+                return entry['count']
+            
+            count = collection.count()
+            if count == 0:
+                # Not processed yet (possibly by another worker); keep checking
+                return count
+            if entry:
+                collection_cache.set_count(collection.name, count)
+            else:
+                collection_cache.put(collection.name, collection, count)
+            return count
         except Exception as e:
             logger.error(f"Error getting collection count: {str(e)}")
             return 0
@@ -0,0 +1,131 @@
+"""
+Context Builder
+Assembles the retrieved summaries and row chunks into prompt context:
+adaptive chunk count from search distances, duplicate rows removed, and
+the least relevant rows dropped to fit a token budget
+"""
+
+import logging
+import re
+from services.keyword_index import STOPWORDS
+from services.vertex_ai_service import estimate_tokens
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def adaptive_cutoff(results, ratio=None, max_k=None):
+    """
+    Keep the search results close enough to the best one
+
+    Results farther than ratio times the best distance are dropped, so a
+    question with one clearly matching chunk gets one chunk and a broad
+    question gets several. At least one result is always kept.
+
+    Args:
+        results (dict): Search results with 'distances', best first
+        ratio (float): Distance ratio (defaults to config.CONTEXT_DISTANCE_RATIO)
+        max_k (int): Most results to keep (defaults to config.CONTEXT_MAX_CHUNKS)
+
+    Returns:
+        dict: Results cut to the chosen k
+    """
+    ratio = config.CONTEXT_DISTANCE_RATIO if ratio is None else ratio
+    max_k = config.CONTEXT_MAX_CHUNKS if max_k is None else max_k
+
+    distances = results.get('distances') or []
+    keep = min(len(results['ids']), max_k)
+    if distances:
+        threshold = distances[0] + abs(distances[0]) * (ratio - 1)
+        keep = max(1, sum(1 for distance in distances[:keep] if distance <= threshold))
+
+    return {key: values[:keep] for key, values in results.items()}
+
+
+def assemble_context(question, summaries, results, budget=None):
+    """
+    Build prompt context from summary documents and row chunks
+
+    Summaries (exact aggregates) go first. Chunk rows already included
+    (the same dataset, sheet and row number, or the same text within a
+    dataset) are skipped; if the remaining rows exceed the budget, rows
+    sharing the fewest words with the question are dropped first,
+    lower-ranked chunks before higher ones.
+    Kept rows stay in their original order under their chunk's header.
+
+    Args:
+        question (str): User question
+        summaries (list): Summary document texts
+        results (dict): Row chunk search results (documents and metadatas), best
+            first; chunks whose metadata has a 'dataset' name are labelled with it
+        budget (int): Estimated token budget (defaults to config.CONTEXT_TOKEN_BUDGET)
+
+    Returns:
+        tuple: (context, stats) - the context text and {'chunksUsed',
+        'summariesUsed', 'rowsUsed', 'rowsDropped', 'duplicateRows',
+        'contextTokens'}
+    """
+    budget = config.CONTEXT_TOKEN_BUDGET if budget is None else budget
+    terms = set(re.findall(r'\w+', question.lower())) - STOPWORDS
+
+    parts = []
+    remaining = budget
+    for doc in summaries:
+        text = f"Dataset summary (exact aggregates over all rows):\n{doc}"
+        if estimate_tokens(text) <= remaining:
+            parts.append(text)
+            remaining -= estimate_tokens(text)
+
+    # Split chunks into header and rows, skipping rows already seen
+    chunks = []
+    candidates = []
+    seen_rows = set()
+    seen_texts = set()
+    duplicates = 0
+    for rank, (doc, metadata) in enumerate(zip(results['documents'], results['metadatas'])):
+        header, _, body = doc.partition('\n\n')
+        rows = body.split('\n') if body else []
+        dataset = metadata.get('dataset')
+        source = f" from {dataset}" if dataset else ""
+        label = f"Data chunk{source} (rows {metadata['start_row']}-{metadata['end_row']}):\n{header}"
+        chunks.append({'label': label, 'rows': rows, 'kept': [], 'cost': estimate_tokens(label) + 1})
+
+        for i, row in enumerate(rows):
+            key = (dataset, metadata.get('sheet'), metadata['start_row'] + i)
+            if key in seen_rows or (dataset, row) in seen_texts:
+                duplicates += 1
+                continue
+            seen_rows.add(key)
+            seen_texts.add((dataset, row))
+
+            hits = len(terms.intersection(re.findall(r'\w+', row.lower()))) if terms else 0
+            candidates.append((-hits, rank, i, estimate_tokens(row)))
+
+    # Most relevant rows first; a chunk's header is paid for with its first row
+    candidates.sort()
+    dropped = 0
+    for _, rank, i, tokens in candidates:
+        chunk = chunks[rank]
+        cost = tokens + (0 if chunk['kept'] else chunk['cost'])
+        if cost > remaining:
+            dropped += 1
+            continue
+        chunk['kept'].append(i)
+        remaining -= cost
+
+    used = [chunk for chunk in chunks if chunk['kept']]
+    for chunk in used:
+        rows = [chunk['rows'][i] for i in sorted(chunk['kept'])]
+        parts.append(chunk['label'] + '\n\n' + '\n'.join(rows))
+
+    context = "\n\n".join(parts)
+    stats = {
+        'chunksUsed': len(used),
+        'summariesUsed': len(parts) - len(used),
+        'rowsUsed': sum(len(chunk['kept']) for chunk in used),
+        'rowsDropped': dropped,
+        'duplicateRows': duplicates,
+        'contextTokens': estimate_tokens(context)
+    }
+    return context, stats
@@ -3,13 +3,39 @@ Data Processor Service for CSV/Excel file handling
 """
 
 import pandas as pd
+import numpy as np
+import hashlib
 import io
+import tempfile
+import openpyxl
 import requests
+import config
 import logging
+from services.profile_sketch import TableSketch, NUMERIC, DATETIME
+from services.zone_maps import build_zone_maps
+from services.vertex_ai_service import estimate_tokens, CHARS_PER_TOKEN
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Chunk text encodings: 'verbose' repeats "col: val" on every row, 'compact'
+# lists the columns once and renders rows as delimited values
+VERBOSE_ENCODING = 'verbose'
+COMPACT_ENCODING = 'compact'
+CHUNK_ENCODINGS = (VERBOSE_ENCODING, COMPACT_ENCODING)
+
+# Metadata type of ingest-time summary documents (row chunks have no type)
+SUMMARY_TYPE = 'summary'
+
+# Workbook formats openpyxl can read in streaming (read-only) mode
+STREAMABLE_EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+
+# Date formats tried, in order, when detecting date columns at load time
+DATE_FORMATS = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d', 'ISO8601']
+
+# Formats that read the same text as different dates; columns matching both stay text
+AMBIGUOUS_DATE_FORMATS = {'%m/%d/%Y': '%d/%m/%Y', '%d/%m/%Y': '%m/%d/%Y'}
+
 
 class DataProcessor:
     def __init__(self):
@@ -44,6 +70,9 @@ class DataProcessor:
             else:
                 raise ValueError(f"Unsupported file type: {file_name}")
             
+            if config.OPTIMIZE_DTYPES:
+                df = self.optimize_dtypes(df)
+            
             logger.info(f"File loaded successfully. Shape: {df.shape}")
             return df
             
@@ -51,10 +80,330 @@ class DataProcessor:
             logger.error(f"Error reading file: {str(e)}")
             raise
 
+    def optimize_dtypes(self, df, plan=None):
+        """
+        Compact column dtypes without changing any value
+        
+        - low-cardinality text columns become categoricals
+        - integers are downcast to the smallest signed type that fits
+        - floats become float32 only when every value survives the round trip
+        - text columns whose values all parse as dates become datetime64,
+          when the dates can be rendered back to exactly the original text
+        
+        Each conversion is decided on the given frame, or taken from plan
+        (the 'dtype_plan' of an earlier batch), so every batch of a streamed
+        file gets the same schema as its first batch. A planned conversion a
+        batch's values do not allow is skipped for that batch.
+        
+        The memory saved is recorded in df.attrs['memory'] and reported by
+        profile_data; df.attrs['dtype_plan'] holds the conversions and
+        df.attrs['date_formats'] the text format of each parsed date column.
+        
+        Args:
+            df (pd.DataFrame): Input dataframe
+            plan (dict, optional): Conversions to apply, by column
+            
+        Returns:
+            pd.DataFrame: Dataframe with compacted dtypes
+        """
+        try:
+            bytes_before = int(df.memory_usage(deep=True).sum())
+            converted = {}
+            date_formats = {}
+            decided = {}
+            df = df.copy()
+            
+            for col in df.columns:
+                series = df[col]
+                original_dtype = str(series.dtype)
+                conversion = self._plan_column(series) if plan is None else plan.get(col)
+                if conversion is None:
+                    continue
+                decided[col] = conversion
+                
+                kind = conversion[0]
+                if kind == 'integer':
+                    if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+                        target = np.dtype(conversion[1])
+                        info = np.iinfo(target)
+                        if series.empty or (series.min() >= info.min and series.max() <= info.max):
+                            df[col] = series.astype(target)
+                
+                elif kind == 'float32':
+                    if series.dtype == 'float64':
+                        as_float32 = series.astype('float32')
+                        if ((as_float32.astype('float64') == series) | series.isna()).all():
+                            df[col] = as_float32
+                
+                elif kind == 'datetime':
+                    _, parse_format, text_format = conversion
+                    parsed = self._convert_dates(series, parse_format, text_format)
+                    if parsed is not None:
+                        df[col] = parsed
+                        if text_format:
+                            date_formats[str(col)] = text_format
+                
+                elif kind == 'category':
+                    if series.dtype == object or isinstance(series.dtype, pd.StringDtype):
+                        df[col] = series.astype('category')
+                
+                if str(df[col].dtype) != original_dtype:
+                    converted[str(col)] = f"{original_dtype} -> {df[col].dtype}"
+            
+            bytes_after = int(df.memory_usage(deep=True).sum())
+            df.attrs['memory'] = {
+                'bytes_before': bytes_before,
+                'bytes_after': bytes_after,
+                'reduction_ratio': round(bytes_before / bytes_after, 2) if bytes_after else None,
+                'converted_columns': converted
+            }
+            df.attrs['dtype_plan'] = decided if plan is None else plan
+            df.attrs['date_formats'] = date_formats
+            
+            logger.info(f"Dtypes optimized: {bytes_before} -> {bytes_after} bytes, {len(converted)} columns converted")
+            return df
+            
+        except Exception as e:
+            logger.error(f"Error optimizing dtypes: {str(e)}")
+            raise
+
+    def _plan_column(self, series):
+        """
+        Decide the compact dtype of a column from its values
+        
+        Returns:
+            tuple: ('integer', dtype), ('float32',), ('datetime', parse
+            format, text format or None) or ('category',); None to leave
+            the column as it is
+        """
+        if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+            return 'integer', str(pd.to_numeric(series, downcast='integer').dtype)
+        
+        if pd.api.types.is_float_dtype(series) and series.dtype == 'float64':
+            return 'float32',
+        
+        if series.dtype == object or isinstance(series.dtype, pd.StringDtype):
+            date_format = self._parse_dates(series)
+            if date_format is not None:
+                # Text is kept as written, so the column is only converted if
+                # its dates render back to the same strings
+                text_format = date_format if self._is_text(series) else None
+                if self._convert_dates(series, date_format, text_format) is not None:
+                    return 'datetime', date_format, text_format
+            elif len(series) and series.nunique(dropna=True) / len(series) <= config.CATEGORY_MAX_RATIO:
+                return 'category',
+        
+        return None
+
+    def _parse_dates(self, series, sample_size=100):
+        """
+        Find the date format every non-null value of a text column matches
+        
+        Columns matching both month-first and day-first formats (every day
+        is 12 or less) are ambiguous and are not treated as dates.
+        
+        Returns:
+            str: Date format, or None if the column is not a date column
+        """
+        non_null = series.dropna()
+        if non_null.empty:
+            return None
+        
+        sample = non_null.iloc[:sample_size].astype(str)
+        
+        # Cheap rejection before trying formats: dates contain a separator and a digit
+        if not sample.str.contains(r'\d[-/]\d', regex=True).all():
+            return None
+        
+        for date_format in DATE_FORMATS:
+            if pd.to_datetime(sample, format=date_format, errors='coerce').notna().all():
+                # Lossless only: no non-null value may fail to parse
+                if pd.to_datetime(non_null.astype(str), format=date_format, errors='coerce').notna().all():
+                    alternative = AMBIGUOUS_DATE_FORMATS.get(date_format)
+                    if alternative and pd.to_datetime(non_null.astype(str), format=alternative, errors='coerce').notna().all():
+                        logger.info(f"Column {series.name} is ambiguous between {date_format} and {alternative}; kept as text")
+                        return None
+                    return date_format
+        
+        return None
+
+    def _convert_dates(self, series, parse_format, text_format=None):
+        """
+        Parse a column with a date format, losslessly
+        
+        Returns:
+            pd.Series: datetime64 column, or None if a value does not parse or
+            (with text_format) does not render back to its original text
+        """
+        non_null = series.notna()
+        text = series.astype(str)
+        parsed = pd.to_datetime(text.where(non_null), format=parse_format, errors='coerce')
+        if (parsed.notna() != non_null).any():
+            return None
+        
+        if text_format is not None:
+            if text_format == 'ISO8601' or not (parsed.dt.strftime(text_format)[non_null] == text[non_null]).all():
+                return None
+        
+        return parsed
+
+    @staticmethod
+    def _is_text(series):
+        return pd.api.types.infer_dtype(series, skipna=True) == 'string'
+
+    def get_file_size(self, file_url):
+        """
+        Get the size of a remote file without downloading its body
+        
+        Args:
+            file_url (str): Signed URL to the file
+            
+        Returns:
+            int: File size in bytes (0 if the server does not report it)
+        """
+        try:
+            # Signed URLs are only valid for GET, so open a streamed GET and
+            # close it after reading the headers instead of sending a HEAD
+            with requests.get(file_url, stream=True) as response:
+                response.raise_for_status()
+                return int(response.headers.get('Content-Length', 0))
+            
+        except Exception as e:
+            logger.error(f"Error getting file size: {str(e)}")
+            raise
+
+    def read_file_batches(self, file_url, file_name, batch_size=None):
+        """
+        Stream a CSV or Excel file from URL and yield it in fixed-size row batches
+        
+        CSV bodies are parsed as they arrive. Excel workbooks are spooled to a
+        temporary file and read with openpyxl in read-only mode, one sheet at
+        a time. Only one batch is held in memory at a time regardless of the
+        file size.
+        
+        With config.OPTIMIZE_DTYPES, dtypes are decided on the first batch of
+        each sheet and the same conversions are applied to the rest, so the
+        batches share one schema.
+        
+        Args:
+            file_url (str): Signed URL to the file
+            file_name (str): Original file name
+            batch_size (int, optional): Rows per batch (defaults to config.STREAMING_BATCH_ROWS)
+            
+        Yields:
+            tuple: (sheet name, or None for CSV files; pd.DataFrame batch)
+        """
+        batch_size = batch_size or config.STREAMING_BATCH_ROWS
+        
+        if file_name.endswith('.csv'):
+            batches = self._read_csv_batches(file_url, file_name, batch_size)
+        elif file_name.endswith(STREAMABLE_EXCEL_EXTENSIONS):
+            batches = self._read_excel_batches(file_url, file_name, batch_size)
+        else:
+            raise ValueError(f"Streaming is not supported for file type: {file_name}")
+        
+        if not config.OPTIMIZE_DTYPES:
+            yield from batches
+            return
+        
+        plans = {}
+        for sheet_name, batch_df in batches:
+            batch_df = self.optimize_dtypes(batch_df, plan=plans.get(sheet_name))
+            plans.setdefault(sheet_name, batch_df.attrs['dtype_plan'])
+            yield sheet_name, batch_df
+
+    def _read_csv_batches(self, file_url, file_name, batch_size):
+        try:
+            logger.info(f"Streaming file: {file_name} in batches of {batch_size} rows")
+            
+            with requests.get(file_url, stream=True) as response:
+                response.raise_for_status()
+                
+                # Let urllib3 undo any transfer compression before pandas reads it
+                response.raw.decode_content = True
+                
+                for batch_df in pd.read_csv(response.raw, chunksize=batch_size):
+                    yield None, batch_df
+            
+        except Exception as e:
+            logger.error(f"Error streaming file: {str(e)}")
+            raise
+
+    def _read_excel_batches(self, file_url, file_name, batch_size):
+        try:
+            logger.info(f"Streaming workbook: {file_name} in batches of {batch_size} rows")
+            
+            # openpyxl needs a seekable file; spool the body to disk, not memory
+            with requests.get(file_url, stream=True) as response, tempfile.TemporaryFile() as spool:
+                response.raise_for_status()
+                for block in response.iter_content(chunk_size=1024 * 1024):
+                    spool.write(block)
+                spool.seek(0)
+                
+                workbook = openpyxl.load_workbook(spool, read_only=True, data_only=True)
+                try:
+                    for sheet in workbook.worksheets:
+                        yield from self._read_sheet_batches(sheet, batch_size)
+                finally:
+                    workbook.close()
+            
+        except Exception as e:
+            logger.error(f"Error streaming workbook: {str(e)}")
+            raise
+
+    def _read_sheet_batches(self, sheet, batch_size):
+        """Yield (sheet name, batch) pairs; the first non-empty row is the header"""
+        header = None
+        rows = []
+        
+        for values in sheet.iter_rows(values_only=True):
+            if all(value is None for value in values):
+                continue
+            
+            if header is None:
+                header = self._excel_header(values)
+                continue
+            
+            # Pad short rows and drop cells beyond the header
+            row = list(values[:len(header)])
+            row.extend([None] * (len(header) - len(row)))
+            rows.append(row)
+            
+            if len(rows) >= batch_size:
+                yield sheet.title, pd.DataFrame(rows, columns=header)
+                rows = []
+        
+        if rows:
+            yield sheet.title, pd.DataFrame(rows, columns=header)
+        
+        logger.info(f"Finished reading sheet: {sheet.title}")
+
+    def _excel_header(self, values):
+        """Column names for a header row, named and de-duplicated like pandas"""
+        header = []
+        seen = {}
+        
+        for i, value in enumerate(values):
+            name = str(value) if value is not None else f"Unnamed: {i}"
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            header.append(name)
+        
+        return header
+
     def profile_data(self, df):
         """
         Generate data profile with statistics
         
+        Statistics come from mergeable sketches (see services.profile_sketch)
+        built in a single pass, so batch profiles can be combined with
+        merge_profiles without revisiting the data. summary_stats covers every
+        column: counts, nulls, approximate distinct count and top values, plus
+        mean/std/min/max and approximate quartiles for numeric and date columns.
+        
         Args:
             df (pd.DataFrame): Input dataframe
             
@@ -64,13 +413,22 @@ class DataProcessor:
         try:
             logger.info("Generating data profile")
             
+            sketch = TableSketch.from_dataframe(df)
+            
             profile = {
                 'row_count': len(df),
                 'column_count': len(df.columns),
                 'columns': list(df.columns),
                 'dtypes': df.dtypes.astype(str).to_dict(),
-                'missing_values': df.isnull().sum().to_dict(),
-                'summary_stats': df.describe().to_dict() if len(df) > 0 else {}
+                'missing_values': sketch.missing_values(),
+                'summary_stats': sketch.summary(),
+                'sketch': sketch,
+                'memory': df.attrs.get('memory', {
+                    'bytes_before': int(df.memory_usage(deep=True).sum()),
+                    'bytes_after': int(df.memory_usage(deep=True).sum()),
+                    'reduction_ratio': 1.0,
+                    'converted_columns': {}
+                })
             }
             
             logger.info(f"Data profile generated: {profile['row_count']} rows, {profile['column_count']} columns")
@@ -80,34 +438,151 @@ class DataProcessor:
             logger.error(f"Error profiling data: {str(e)}")
             raise
 
-    def chunk_dataframe(self, df, chunk_size=100):
+    def merge_profiles(self, profile, batch_profile):
+        """
+        Merge the profile of a new batch into a running profile
+        
+        Column sketches are merged, so the statistics match a profile of all
+        batches together (within the sketches' error bounds); the schema is
+        taken from the first batch. The running profile's sketch is updated
+        in place.
+        
+        Args:
+            profile (dict): Running profile (None for the first batch)
+            batch_profile (dict): Profile of the new batch
+            
+        Returns:
+            dict: Merged profile
+        """
+        if profile is None:
+            return batch_profile
+        
+        sketch = profile['sketch'].merge(batch_profile['sketch'])
+        
+        memory = {
+            'bytes_before': profile['memory']['bytes_before'] + batch_profile['memory']['bytes_before'],
+            'bytes_after': profile['memory']['bytes_after'] + batch_profile['memory']['bytes_after'],
+            'converted_columns': {**profile['memory']['converted_columns'], **batch_profile['memory']['converted_columns']}
+        }
+        memory['reduction_ratio'] = round(memory['bytes_before'] / memory['bytes_after'], 2) if memory['bytes_after'] else None
+        
+        return {
+            **profile,
+            'row_count': profile['row_count'] + batch_profile['row_count'],
+            'missing_values': sketch.missing_values(),
+            'summary_stats': sketch.summary(),
+            'sketch': sketch,
+            'memory': memory
+        }
+
+    def combine_table_profiles(self, profiles):
+        """
+        Combine per-sheet profiles into one dataset profile
+        
+        Schema fields come from the first sheet; row counts are summed and
+        every sheet is listed under 'tables'.
+        
+        Args:
+            profiles (dict): {sheet name (None for CSV): profile}
+            
+        Returns:
+            dict: Dataset profile
+        """
+        if list(profiles) == [None]:
+            return profiles[None]
+        
+        first = next(iter(profiles.values()))
+        return {
+            **first,
+            'row_count': sum(profile['row_count'] for profile in profiles.values()),
+            'tables': {
+                name: {
+                    'row_count': profile['row_count'],
+                    'column_count': profile['column_count'],
+                    'columns': profile['columns'],
+                    'summary_stats': profile['summary_stats'],
+                    'sketch': profile['sketch']
+                }
+                for name, profile in profiles.items()
+            }
+        }
+
+    def chunk_dataframe(self, df, chunk_size=None, row_offset=0, table_name=None, target_tokens=None, encoding=None):
         """
         Split dataframe into chunks for embedding
         
+        By default chunks are sized adaptively: each chunk holds between half
+        of target_tokens and target_tokens, never exceeding the embedding
+        model's input limit or config.MAX_CHUNK_SIZE rows. Wide tables get few
+        rows per chunk and narrow tables many. Within that range a chunk ends
+        at a row chosen by its content hash, so boundaries depend on the rows
+        themselves rather than their positions: inserting or deleting a row
+        only changes the chunks around it, and appended rows only affect the
+        last chunk.
+        
+        With the compact encoding the column names appear once per chunk and
+        free-text columns wider than config.COMPACT_MAX_COLUMN_CHARS are left
+        out of the text (they stay in the dataset store and are listed in the
+        chunk header).
+        
+        Each chunk carries a zone map (see services.zone_maps): min/max of
+        numeric and date columns and the values of low-cardinality columns,
+        stored as metadata so queries can skip chunks that cannot match.
+        
         Args:
             df (pd.DataFrame): Input dataframe
-            chunk_size (int): Number of rows per chunk
+            chunk_size (int, optional): Fixed number of rows per chunk (disables adaptive sizing)
+            row_offset (int): Row number of the first row in df (for streamed batches)
+            table_name (str, optional): Sheet the rows come from (multi-sheet workbooks)
+            target_tokens (int, optional): Token target per chunk (defaults to config.CHUNK_TARGET_TOKENS)
+            encoding (str, optional): 'verbose' or 'compact' (defaults to config.CHUNK_ENCODING)
             
         Returns:
             list: List of text chunks with metadata
         """
         try:
-            logger.info(f"Chunking dataframe into chunks of {chunk_size} rows")
-            
+            encoding = self._check_encoding(encoding)
             chunks = []
             total_rows = len(df)
             
-            for i in range(0, total_rows, chunk_size):
-                chunk_df = df.iloc[i:i+chunk_size]
+            # Zone maps and row hashes cover every column, including those the text omits
+            source_df = df
+            
+            omitted = []
+            if encoding == COMPACT_ENCODING:
+                omitted = self.wide_text_columns(df)
+                df = df.drop(columns=omitted)
+            
+            # Render every row once, then assemble chunks from list slices
+            columns = list(df.columns)
+            rows = self.render_rows(df, encoding)
+            row_hashes = self.hash_rows(source_df, rendered=rows if encoding == COMPACT_ENCODING and not omitted else None)
+            text_format = {'table_name': table_name, 'encoding': encoding, 'omitted': omitted}
+            
+            if chunk_size:
+                logger.info(f"Chunking dataframe into chunks of {chunk_size} rows")
+                bounds = [(i, min(i + chunk_size, total_rows)) for i in range(0, total_rows, chunk_size)]
+            else:
+                bounds = self._chunk_bounds(columns, rows, row_hashes, row_offset, text_format, target_tokens)
+            
+            zone_maps = build_zone_maps(source_df, bounds)
+            
+            for (start, end), zone_map in zip(bounds, zone_maps):
+                chunk_rows = rows[start:end]
                 
                 # Convert chunk to text representation
-                chunk_text = self.dataframe_to_text(chunk_df, start_row=i)
+                chunk_text = self._format_chunk_text(columns, chunk_rows, start_row=row_offset + start, **text_format)
                 
                 chunks.append({
                     'text': chunk_text,
-                    'start_row': i,
-                    'end_row': min(i + chunk_size, total_rows),
-                    'row_count': len(chunk_df)
+                    'start_row': row_offset + start,
+                    'end_row': row_offset + end,
+                    'row_count': len(chunk_rows),
+                    'token_count': estimate_tokens(chunk_text),
+                    'chunk_hash': self._hash_chunk(columns, row_hashes[start:end], table_name, encoding),
+                    'table': table_name,
+                    'encoding': encoding,
+                    'zone_map': zone_map
                 })
             
             logger.info(f"Created {len(chunks)} chunks")
@@ -117,34 +592,353 @@ class DataProcessor:
             logger.error(f"Error chunking dataframe: {str(e)}")
             raise
 
-    def dataframe_to_text(self, df, start_row=0):
+    def _chunk_bounds(self, columns, rows, row_hashes, row_offset, text_format, target_tokens=None):
+        """
+        Row ranges for adaptive, content-defined chunks
+        
+        A chunk is filled to at least half the token target, then ends after
+        the first row whose hash marks a boundary (or at the target). A row
+        is a boundary with probability proportional to its length, decided by
+        its content alone, so chunks re-align right after an edited row.
+        
+        Returns:
+            list: (start, end) row index pairs
+        """
+        target_tokens = min(target_tokens or config.CHUNK_TARGET_TOKENS, config.EMBEDDING_MAX_INPUT_TOKENS)
+        
+        # Header of the widest chunk this frame can produce (row newlines are counted below)
+        header = self._format_chunk_text(columns, [""], start_row=row_offset + len(rows), **text_format)
+        budget_chars = max(target_tokens * CHARS_PER_TOKEN - len(header), 0)
+        
+        # Cumulative characters including each row's newline
+        row_chars = np.fromiter((len(row) + 1 for row in rows), dtype=np.int64, count=len(rows))
+        cumulative = np.concatenate([[0], np.cumsum(row_chars)])
+        
+        # Boundary rows: about one per quarter target of text past the minimum
+        min_chars = budget_chars // 2
+        cut_chars = max(budget_chars // 4, 1)
+        threshold = np.minimum(row_chars * (2.0 ** 32 / cut_chars), 2.0 ** 32)
+        cut_rows = np.flatnonzero((np.asarray(row_hashes, dtype=np.uint64) >> np.uint64(32)) < threshold)
+        
+        bounds = []
+        start = 0
+        while start < len(rows):
+            end = int(np.searchsorted(cumulative, cumulative[start] + budget_chars, side='right')) - 1
+            
+            # At least one row per chunk, at most MAX_CHUNK_SIZE rows
+            end = min(max(end, start + 1), start + config.MAX_CHUNK_SIZE, len(rows))
+            if end == start + 1 and row_chars[start] > budget_chars:
+                logger.warning(f"Row {row_offset + start} alone exceeds the chunk token target; the embedding model may truncate it")
+            
+            # End early at the first boundary row past the minimum size
+            min_end = max(int(np.searchsorted(cumulative, cumulative[start] + min_chars, side='left')), start + 1)
+            i = int(np.searchsorted(cut_rows, min_end - 1))
+            if i < len(cut_rows) and cut_rows[i] + 1 < end:
+                end = int(cut_rows[i]) + 1
+            
+            bounds.append((start, end))
+            start = end
+        
+        logger.info(f"Adaptive chunking: {len(bounds)} chunks for {len(rows)} rows (target {target_tokens} tokens)")
+        return bounds
+
+    def chunk_stats(self, chunks):
+        """
+        Summarize chunk sizes for the profile
+        
+        Args:
+            chunks (list): Chunks from chunk_dataframe
+            
+        Returns:
+            dict: chunk_count, total_tokens and avg_tokens_per_chunk
+        """
+        total_tokens = sum(chunk['token_count'] for chunk in chunks)
+        return {
+            'chunk_count': len(chunks),
+            'total_tokens': total_tokens,
+            'avg_tokens_per_chunk': round(total_tokens / len(chunks), 1) if chunks else 0
+        }
+
+    def build_summary_documents(self, profile):
+        """
+        Render dataset-level aggregates as summary documents for retrieval
+        
+        One set of documents describes every column (counts, sums, means,
+        ranges, top values); another gives exact totals per group for each
+        low-cardinality text column. Aggregates come from the profile's
+        sketches, so they cover all rows, including streamed files. Long
+        summaries are split into parts of about config.CHUNK_TARGET_TOKENS.
+        
+        Args:
+            profile (dict): Profile from profile_data / merge_profiles / combine_table_profiles
+            
+        Returns:
+            list: Documents with key (unique within the dataset), text and metadata
+        """
+        tables = profile.get('tables') or {None: profile}
+        documents = []
+        
+        for table_name, table in tables.items():
+            sketch = table['sketch']
+            where = f" (sheet {table_name})" if table_name is not None else ""
+            prefix = f"{table_name}_" if table_name is not None else ""
+            
+            header = f"Dataset summary{where}: {sketch.row_count} rows, {len(sketch.columns)} columns. Exact totals over all rows."
+            lines = [
+                self._column_summary_line(col, sketch.columns[col].kind, stats)
+                for col, stats in sketch.summary().items()
+            ]
+            documents.extend(self._summary_parts(f"{prefix}columns", header, lines, 'columns', table_name))
+            
+            for col, groups in sketch.group_summary().items():
+                # Near-unique columns (ids, names) give one group per row
+                if len(groups) > sketch.row_count * config.CATEGORY_MAX_RATIO:
+                    continue
+                
+                covered = sum(group['rows'] for group in groups)
+                header = f"Totals by {col}{where}: {len(groups)} groups covering {covered} of {sketch.row_count} rows."
+                lines = [self._group_summary_line(group) for group in groups]
+                documents.extend(self._summary_parts(f"{prefix}by_{col}", header, lines, 'group', table_name, group_by=col))
+        
+        logger.info(f"Built {len(documents)} summary documents")
+        return documents
+
+    def _summary_parts(self, key, header, lines, summary_kind, table_name, group_by=None):
+        """Split summary lines into documents that fit the chunk token target"""
+        budget_chars = min(config.CHUNK_TARGET_TOKENS, config.EMBEDDING_MAX_INPUT_TOKENS) * CHARS_PER_TOKEN - len(header)
+        
+        parts = [[]]
+        used = 0
+        for line in lines:
+            if parts[-1] and used + len(line) + 1 > budget_chars:
+                parts.append([])
+                used = 0
+            parts[-1].append(line)
+            used += len(line) + 1
+        
+        documents = []
+        for i, part in enumerate(parts):
+            metadata = {'type': SUMMARY_TYPE, 'summary_kind': summary_kind, 'part': i}
+            if group_by is not None:
+                metadata['group_by'] = str(group_by)
+            if table_name is not None:
+                metadata['sheet'] = table_name
+            
+            text = "\n".join([header] + part)
+            metadata['token_count'] = estimate_tokens(text)
+            metadata['chunk_hash'] = hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+            
+            documents.append({
+                'key': f"summary_{key}_{i}",
+                'text': text,
+                'metadata': metadata
+            })
+        
+        return documents
+
+    def _column_summary_line(self, col, kind, stats):
+        missing = f", {stats['nulls']} missing" if stats['nulls'] else ""
+        top = ", ".join(f"{item['value']} ({item['count']})" for item in stats['top'])
+        
+        if kind == NUMERIC and stats['count']:
+            line = (
+                f"{col} (numeric): count {stats['count']}{missing}, sum {self._format_number(stats['sum'])}, "
+                f"mean {self._format_number(stats['mean'])}, min {self._format_number(stats['min'])}, "
+                f"median ~{self._format_number(stats['50%'])}, max {self._format_number(stats['max'])}, ~{stats['distinct']} distinct"
+            )
+        elif kind == DATETIME and stats['count']:
+            line = f"{col} (date): from {stats['min']} to {stats['max']}, count {stats['count']}{missing}, ~{stats['distinct']} distinct"
+        else:
+            line = f"{col} (text): count {stats['count']}{missing}, ~{stats['distinct']} distinct"
+        
+        return f"{line}; most frequent: {top}" if top else line
+
+    def _group_summary_line(self, group):
+        parts = [f"{group['value']}: {group['rows']} rows"]
+        for measure, values in group['measures'].items():
+            if values['mean'] is None:
+                continue
+            parts.append(f"{measure} sum {self._format_number(values['sum'])}, mean {self._format_number(values['mean'])}")
+        
+        return " | ".join(parts)
+
+    @staticmethod
+    def _format_number(value):
+        """Render a statistic without float noise (e.g. 12345.5, 6.86, 240)"""
+        if value is None:
+            return "n/a"
+        if float(value).is_integer():
+            return str(int(value))
+        return f"{value:.2f}" if abs(value) >= 1 else f"{value:.4g}"
+
+    def dataframe_to_text(self, df, start_row=0, encoding=None):
         """
         Convert dataframe to text representation for embedding
         
         Args:
             df (pd.DataFrame): Input dataframe
             start_row (int): Starting row number
+            encoding (str, optional): 'verbose' or 'compact' (defaults to config.CHUNK_ENCODING)
             
         Returns:
             str: Text representation
         """
         try:
-            # Create header
-            text_parts = [f"Data rows {start_row} to {start_row + len(df) - 1}:"]
-            text_parts.append(f"Columns: {', '.join(df.columns)}")
-            text_parts.append("")
+            encoding = self._check_encoding(encoding)
+            omitted = self.wide_text_columns(df) if encoding == COMPACT_ENCODING else []
+            df = df.drop(columns=omitted)
             
-            # Add data rows
-            for idx, row in df.iterrows():
-                row_text = " | ".join([f"{col}: {val}" for col, val in row.items()])
-                text_parts.append(row_text)
-            
-            return "\n".join(text_parts)
+            return self._format_chunk_text(
+                list(df.columns), self.render_rows(df, encoding), start_row,
+                encoding=encoding, omitted=omitted
+            )
             
         except Exception as e:
             logger.error(f"Error converting dataframe to text: {str(e)}")
             raise
 
+    def render_rows(self, df, encoding=VERBOSE_ENCODING):
+        """
+        Render each row as "col: val | col: val | ..." (or "val | val | ..."
+        for the compact encoding) without building per-row Series objects
+        
+        Values are taken column by column from the same interleaved array that
+        df.iterrows() uses, so the text is identical to formatting each row.
+        
+        Args:
+            df (pd.DataFrame): Input dataframe
+            encoding (str): 'verbose' or 'compact'
+            
+        Returns:
+            list: One rendered string per row
+        """
+        if len(df.columns) == 0:
+            return [""] * len(df)
+        
+        values = df.to_numpy()
+        date_formats = df.attrs.get('date_formats', {})
+        
+        column_parts = []
+        for j, col in enumerate(df.columns):
+            column_values = values[:, j]
+            
+            # Date columns parsed at load time render as they appeared in the
+            # file rather than with a 00:00:00 time part
+            date_text = self._format_dates(df.iloc[:, j], date_formats.get(str(col)))
+            if date_text is not None:
+                column_values = date_text
+            
+            # iterrows yields Timestamps/Timedeltas for datetime-like frames,
+            # and Python scalars (ndarray.tolist) for everything else
+            elif column_values.dtype.kind in 'mM':
+                column_values = list(pd.Series(column_values))
+            else:
+                column_values = column_values.tolist()
+            
+            if encoding == COMPACT_ENCODING:
+                column_parts.append(list(map(format, column_values)))
+            else:
+                prefix = f"{col}: "
+                column_parts.append([prefix + text for text in map(format, column_values)])
+        
+        return [" | ".join(parts) for parts in zip(*column_parts)]
+
+    def _format_dates(self, series, text_format=None):
+        """
+        Render a datetime column in the format its text had in the file, or
+        as YYYY-MM-DD if it has no time component
+        """
+        if not pd.api.types.is_datetime64_dtype(series):
+            return None
+        
+        if text_format is not None:
+            return series.dt.strftime(text_format).fillna('NaT').tolist()
+        
+        non_null = series.dropna()
+        if not (non_null == non_null.dt.normalize()).all():
+            return None
+        
+        return series.dt.strftime('%Y-%m-%d').fillna('NaT').tolist()
+
+    def hash_rows(self, df, rendered=None):
+        """
+        Compute a 64-bit content hash for every row (index excluded)
+        
+        Rows are hashed as rendered text rather than as typed values, so the
+        hash does not depend on the dtypes optimize_dtypes picked: a row
+        appended to a file can widen a column (int8 to int16) without
+        changing the hash of any other row.
+        
+        Args:
+            df (pd.DataFrame): Input dataframe
+            rendered (list, optional): The compact rendering of df's rows, if already built
+            
+        Returns:
+            np.ndarray: uint64 hash per row
+        """
+        if rendered is None:
+            rendered = self.render_rows(df, COMPACT_ENCODING)
+        return pd.util.hash_pandas_object(pd.Series(rendered, dtype=object), index=False).to_numpy()
+
+    def wide_text_columns(self, df):
+        """
+        Free-text columns too wide for the compact encoding
+        
+        Args:
+            df (pd.DataFrame): Input dataframe
+            
+        Returns:
+            list: Text columns whose average value length exceeds config.COMPACT_MAX_COLUMN_CHARS
+        """
+        wide = []
+        for col in df.columns:
+            series = df[col]
+            if not (pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)):
+                continue
+            
+            lengths = series.dropna().astype(str).str.len()
+            if len(lengths) and lengths.mean() > config.COMPACT_MAX_COLUMN_CHARS:
+                wide.append(col)
+        
+        return wide
+
+    def _check_encoding(self, encoding):
+        encoding = encoding or config.CHUNK_ENCODING
+        if encoding not in CHUNK_ENCODINGS:
+            raise ValueError(f"Unknown chunk encoding: {encoding}. Expected one of {', '.join(CHUNK_ENCODINGS)}")
+        return encoding
+
+    def _hash_chunk(self, columns, row_hashes, table_name=None, encoding=VERBOSE_ENCODING):
+        """
+        Content hash of a chunk: its sheet, encoding, schema and row hashes
+        
+        The position is left out, so a chunk moved by rows inserted or
+        deleted before it keeps its hash (and its embedding).
+        """
+        prefix = f"{table_name}|" if table_name is not None else ""
+        if encoding != VERBOSE_ENCODING:
+            prefix += f"{encoding}|"
+        digest = hashlib.sha256(f"{prefix}{'|'.join(map(str, columns))}|".encode('utf-8'))
+        digest.update(row_hashes.tobytes())
+        return digest.hexdigest()[:32]
+
+    def _format_chunk_text(self, columns, rows, start_row=0, table_name=None, encoding=VERBOSE_ENCODING, omitted=None):
+        """Join a header and pre-rendered rows into a chunk's text"""
+        text_parts = [f"Data rows {start_row} to {start_row + len(rows) - 1}:"]
+        if table_name is not None:
+            text_parts.append(f"Sheet: {table_name}")
+        
+        if encoding == COMPACT_ENCODING:
+            text_parts.append(f"Columns: {' | '.join(map(str, columns))}")
+            if omitted:
+                text_parts.append(f"Omitted text columns: {', '.join(map(str, omitted))}")
+        else:
+            text_parts.append(f"Columns: {', '.join(columns)}")
+        text_parts.append("")
+        text_parts.extend(rows)
+        
+        return "\n".join(text_parts)
+
     def get_sample_data(self, df, n=5):
         """
         Get sample rows from dataframe
@@ -196,3 +990,4 @@ Column Data Types:
         except Exception as e:
             logger.error(f"Error formatting for LLM: {str(e)}")
             raise
+
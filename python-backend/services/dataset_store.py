@@ -0,0 +1,291 @@
+"""
+Dataset Store Service
+Persists processed datasets as compressed Parquet files keyed by datasetId
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+DEFAULT_TABLE = 'data'
+
+
+class DatasetWriter:
+    def __init__(self, store, dataset_id, version, version_dir):
+        """
+        Writer for one version of a dataset; batches are written as separate
+        Parquet parts so a streamed file never has to be held in memory
+
+        Use DatasetStore.create_writer() instead of constructing directly.
+        """
+        self.store = store
+        self.dataset_id = dataset_id
+        self.version = version
+        self.version_dir = version_dir
+        self.part_count = 0
+        self.tables = {}
+
+    def write(self, df, table=None):
+        """
+        Append a batch of rows
+
+        Args:
+            df (pd.DataFrame): Batch to append
+            table (str, optional): Logical table (e.g. workbook sheet) the rows belong to
+        """
+        table = table or DEFAULT_TABLE
+        entry = self.tables.setdefault(table, {'parts': [], 'schema': None, 'rowCount': 0})
+
+        arrow_table = self.store._to_arrow(df)
+        part_name = f"part-{self.part_count:05d}.parquet"
+
+        pq.write_table(arrow_table, os.path.join(self.version_dir, part_name), compression=config.DATASET_STORE_COMPRESSION)
+
+        if entry['schema'] is None:
+            entry['schema'] = [
+                {'name': str(col), 'dtype': str(dtype)}
+                for col, dtype in df.dtypes.items()
+            ]
+
+        entry['parts'].append(part_name)
+        entry['rowCount'] += len(df)
+        self.part_count += 1
+
+    def commit(self, file_name=None, stats=None, zone_maps=None):
+        """
+        Publish this version by writing the manifest and removing older versions
+
+        The top-level parts, schema and row count describe the primary
+        (first written) table; every table is listed under 'tables'.
+
+        Args:
+            file_name (str, optional): Original file name, recorded in the manifest
+            stats (dict, optional): Column statistics of the primary table, recorded in the manifest
+            zone_maps (dict, optional): Column info for filtering chunks by predicate (see services.zone_maps)
+
+        Returns:
+            dict: The new manifest
+        """
+        size_bytes = sum(
+            os.path.getsize(os.path.join(self.version_dir, part))
+            for entry in self.tables.values() for part in entry['parts']
+        )
+
+        primary_name = next(iter(self.tables), DEFAULT_TABLE)
+        primary = self.tables.get(primary_name, {'parts': [], 'schema': [], 'rowCount': 0})
+
+        manifest = {
+            'datasetId': self.dataset_id,
+            'version': self.version,
+            'fileName': file_name,
+            'rowCount': primary['rowCount'],
+            'columnCount': len(primary['schema'] or []),
+            'schema': primary['schema'] or [],
+            'parts': primary['parts'],
+            'stats': stats or {},
+            'zoneMaps': zone_maps,
+            'primaryTable': primary_name,
+            'tables': self.tables,
+            'path': os.path.basename(self.version_dir),
+            'sizeBytes': size_bytes,
+            'compression': config.DATASET_STORE_COMPRESSION,
+            'createdAt': datetime.now().isoformat()
+        }
+
+        self.store._publish(self.dataset_id, manifest)
+        logger.info(f"Stored dataset {self.dataset_id} v{self.version}: {len(self.tables)} tables, {size_bytes} bytes")
+        return manifest
+
+    def abort(self):
+        """Discard a partially written version"""
+        shutil.rmtree(self.version_dir, ignore_errors=True)
+
+
+class DatasetStore:
+    def __init__(self, base_dir=None):
+        """
+        Initialize the dataset store
+
+        Layout: <base_dir>/<dataset_id>/manifest.json points at the current
+        version directory, which holds one or more Parquet parts.
+
+        Args:
+            base_dir: Root directory (defaults to config.DATASET_STORE_DIR)
+        """
+        self.base_dir = base_dir or config.DATASET_STORE_DIR
+        self._lock = threading.Lock()
+
+        os.makedirs(self.base_dir, exist_ok=True)
+        logger.info(f"Dataset store initialized at {self.base_dir}")
+
+    def _dataset_dir(self, dataset_id):
+        # Dataset ids come from requests; keep them inside base_dir. Ids with
+        # a path separator are rejected rather than trimmed, so that two ids
+        # can never share a directory
+        dataset_id = str(dataset_id)
+        if dataset_id in ('', '.', '..') or '/' in dataset_id or '\\' in dataset_id:
+            raise ValueError(f"Invalid dataset id: {dataset_id}")
+        return os.path.join(self.base_dir, dataset_id)
+
+    def create_writer(self, dataset_id):
+        """
+        Start writing a new version of a dataset
+
+        Args:
+            dataset_id: Dataset identifier
+
+        Returns:
+            DatasetWriter: Writer for the new version
+        """
+        with self._lock:
+            manifest = self.get_manifest(dataset_id)
+            version = (manifest['version'] + 1) if manifest else 1
+
+            version_dir = os.path.join(self._dataset_dir(dataset_id), f"v{version}")
+            shutil.rmtree(version_dir, ignore_errors=True)
+            os.makedirs(version_dir)
+
+        return DatasetWriter(self, dataset_id, version, version_dir)
+
+    def save(self, dataset_id, df, file_name=None, stats=None):
+        """
+        Store a complete DataFrame as a new version
+
+        Args:
+            dataset_id: Dataset identifier
+            df (pd.DataFrame): Dataset contents
+            file_name (str, optional): Original file name
+            stats (dict, optional): Column statistics
+
+        Returns:
+            dict: The new manifest
+        """
+        writer = self.create_writer(dataset_id)
+        try:
+            writer.write(df)
+            return writer.commit(file_name, stats)
+        except Exception:
+            writer.abort()
+            raise
+
+    def get_manifest(self, dataset_id):
+        """
+        Get the manifest of the current version
+
+        Returns:
+            dict: Manifest, or None if the dataset is not stored
+        """
+        path = os.path.join(self._dataset_dir(dataset_id), MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+
+        with open(path) as f:
+            return json.load(f)
+
+    def load(self, dataset_id, columns=None, table=None):
+        """
+        Load a stored dataset, reading only the requested columns
+
+        Args:
+            dataset_id: Dataset identifier
+            columns (list, optional): Column names to read (all if None)
+            table (str, optional): Logical table to read (primary table if None)
+
+        Returns:
+            pd.DataFrame: Dataset contents
+        """
+        return self.load_table(dataset_id, columns, table).to_pandas()
+
+    def load_table(self, dataset_id, columns=None, table=None):
+        """
+        Load a stored dataset as an Arrow table, reading only the requested columns
+
+        Args:
+            dataset_id: Dataset identifier
+            columns (list, optional): Column names to read (all if None)
+            table (str, optional): Logical table to read (primary table if None)
+
+        Returns:
+            pa.Table: Dataset contents
+        """
+        try:
+            manifest = self.get_manifest(dataset_id)
+            if not manifest:
+                raise ValueError(f"Dataset not found in store: {dataset_id}")
+
+            entry = manifest
+            if table is not None:
+                entry = manifest.get('tables', {}).get(table)
+                if entry is None:
+                    raise ValueError(f"Table {table} not found in dataset {dataset_id}")
+
+            version_dir = os.path.join(self._dataset_dir(dataset_id), manifest['path'])
+            tables = [
+                pq.read_table(os.path.join(version_dir, part), columns=columns)
+                for part in entry['parts']
+            ]
+
+            if not tables:
+                return pa.table({col: [] for col in (columns or [c['name'] for c in entry['schema']])})
+
+            # Streamed parts may infer different types (e.g. int then float)
+            return tables[0] if len(tables) == 1 else pa.concat_tables(tables, promote_options='permissive')
+
+        except Exception as e:
+            logger.error(f"Error loading dataset {dataset_id}: {str(e)}")
+            raise
+
+    def delete(self, dataset_id):
+        """
+        Remove every stored version of a dataset
+
+        Returns:
+            bool: Success status
+        """
+        try:
+            shutil.rmtree(self._dataset_dir(dataset_id), ignore_errors=True)
+            logger.info(f"Dataset removed from store: {dataset_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting dataset {dataset_id}: {str(e)}")
+            return False
+
+    def _publish(self, dataset_id, manifest):
+        dataset_dir = self._dataset_dir(dataset_id)
+        tmp_path = os.path.join(dataset_dir, f"{MANIFEST_FILE}.tmp")
+
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, os.path.join(dataset_dir, MANIFEST_FILE))
+
+            # Keep the previous version for readers that loaded the old
+            # manifest just before the switch; anything older is removed
+            for entry in os.listdir(dataset_dir):
+                if entry.startswith('v') and entry[1:].isdigit() and int(entry[1:]) < manifest['version'] - 1:
+                    shutil.rmtree(os.path.join(dataset_dir, entry), ignore_errors=True)
+
+    def _to_arrow(self, df):
+        try:
+            return pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Object columns mixing types (e.g. numbers and text) are stored as strings
+            df = df.copy()
+            for col in df.columns:
+                if df[col].dtype == object:
+                    df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+            return pa.Table.from_pandas(df, preserve_index=False)
+
+
+# Global instance
+dataset_store = DatasetStore()
@@ -0,0 +1,270 @@
+"""
+DuckDB Service
+Runs SQL over stored datasets in-process, so uploaded files can be queried
+exactly (aggregations, filters, joins across files) without a database server
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import ExitStack, contextmanager
+import duckdb
+from services.dataset_store import dataset_store
+from services.shared_dataset_cache import shared_dataset_cache
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DB_TYPE = 'duckdb'
+
+
+class DuckDBService:
+    def __init__(self, store=None, cache=None):
+        """
+        Initialize the in-process SQL engine
+
+        One in-memory database is shared by the process; every query runs on
+        its own cursor, where each dataset is registered as a memory-mapped
+        Arrow table from the shared dataset cache, so all worker processes
+        scan one copy of the data. The engine has no file access at all and
+        its configuration is locked; validate_sql additionally limits queries
+        to the registered tables, so user SQL cannot reach other datasets.
+
+        Args:
+            store: DatasetStore holding the manifests (defaults to the global dataset_store)
+            cache: SharedDatasetCache to read from (defaults to the global shared_dataset_cache)
+        """
+        self.store = store or dataset_store
+        self.cache = cache or shared_dataset_cache
+        self._lock = threading.Lock()
+
+        try:
+            self.conn = duckdb.connect(':memory:', config={
+                'threads': config.DUCKDB_THREADS,
+                'memory_limit': config.DUCKDB_MEMORY_LIMIT,
+                'autoload_known_extensions': False,
+                'autoinstall_known_extensions': False
+            })
+            self.conn.execute("SET enable_external_access = false")
+            self.conn.execute("SET lock_configuration = true")
+
+            logger.info("DuckDB engine initialized")
+
+        except Exception as e:
+            logger.error(f"Error initializing DuckDB: {str(e)}")
+            raise
+
+    @staticmethod
+    def table_name(file_name, sheet=None):
+        """
+        Derive a SQL table name from an uploaded file name
+
+        Args:
+            file_name: Original file name (e.g. "Sales 2024.csv")
+            sheet (str, optional): Workbook sheet, appended to the name
+
+        Returns:
+            str: Lowercase identifier (e.g. "sales_2024")
+        """
+        base = os.path.splitext(os.path.basename(str(file_name or '')))[0]
+        if sheet:
+            base = f"{base}_{sheet}"
+
+        name = re.sub(r'[^a-z0-9_]+', '_', base.lower()).strip('_') or 'dataset'
+        return f"t_{name}" if name[0].isdigit() else name
+
+    def resolve_tables(self, datasets):
+        """
+        Map datasets to the tables they are queried as
+
+        Args:
+            datasets: Dataset ids, or dicts with 'id' and optional 'name'
+                (file name; the stored file name is used otherwise)
+
+        Returns:
+            list: (table_name, dataset_id, stored_table) tuples, one per
+            table of each dataset; workbook sheets become separate tables
+        """
+        tables = []
+        used = set()
+
+        for dataset in datasets:
+            dataset_id = dataset['id'] if isinstance(dataset, dict) else dataset
+            manifest = self.store.get_manifest(dataset_id)
+            if not manifest:
+                raise ValueError(f"Dataset not found in store: {dataset_id}")
+
+            file_name = (dataset.get('name') if isinstance(dataset, dict) else None) or manifest.get('fileName') or dataset_id
+            stored_tables = manifest.get('tables') or {}
+            sheets = [None] if len(stored_tables) <= 1 else list(stored_tables)
+
+            for sheet in sheets:
+                name = self.table_name(file_name, sheet)
+                candidate, suffix = name, 2
+                while candidate in used:
+                    candidate, suffix = f"{name}_{suffix}", suffix + 1
+                used.add(candidate)
+                tables.append((candidate, dataset_id, sheet))
+
+        return tables
+
+    @contextmanager
+    def session(self, datasets):
+        """
+        Open a cursor with the given datasets registered as tables
+
+        The datasets stay pinned in the shared cache until the session ends.
+
+        Args:
+            datasets: Dataset ids, or dicts with 'id' and optional 'name'
+
+        Yields:
+            tuple: (cursor, list of table names)
+        """
+        tables = self.resolve_tables(datasets)
+
+        with self._lock:
+            cursor = self.conn.cursor()
+
+        try:
+            with ExitStack() as pinned:
+                for name, dataset_id, sheet in tables:
+                    arrow_table = pinned.enter_context(self.cache.open(dataset_id, table=sheet))
+                    cursor.register(name, arrow_table)
+
+                yield cursor, [name for name, _, _ in tables]
+        finally:
+            cursor.close()
+
+    def get_schema(self, datasets):
+        """
+        Get the tables and columns of the given datasets
+
+        Args:
+            datasets: Dataset ids, or dicts with 'id' and optional 'name'
+
+        Returns:
+            dict: {table_name: [{'name': col, 'type': type}]}, the same
+            shape as SQLService.get_schema
+        """
+        try:
+            schema = {}
+            with self.session(datasets) as (cursor, tables):
+                for name in tables:
+                    rows = cursor.execute(f"DESCRIBE {self._quote_identifier(name)}").fetchall()
+                    schema[name] = [{'name': row[0], 'type': row[1]} for row in rows]
+            return schema
+
+        except Exception as e:
+            logger.error(f"Error getting dataset schema: {str(e)}")
+            raise
+
+    def validate_sql(self, sql, tables=None):
+        """
+        Validate SQL query for security
+
+        The query must be a single SELECT. Its parse tree is walked so that
+        table functions (read_parquet, read_csv, glob, ...) and file paths
+        used as tables are rejected, and, when tables is given, every
+        relation must be one of them or a CTE of the query.
+
+        Args:
+            sql: SQL query string
+            tables: Names of the tables the query may read (optional)
+
+        Returns:
+            dict: {'valid': bool, 'message': str}
+        """
+        try:
+            statements = duckdb.extract_statements(sql)
+        except duckdb.Error as e:
+            return {'valid': False, 'message': f'Invalid SQL: {str(e)}'}
+
+        if len(statements) != 1:
+            return {'valid': False, 'message': 'Exactly one query is allowed'}
+        if statements[0].type != duckdb.StatementType.SELECT:
+            return {'valid': False, 'message': 'Only SELECT queries are allowed'}
+
+        try:
+            with self._lock:
+                serialized = self.conn.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0]
+            tree = json.loads(serialized)
+        except (duckdb.Error, ValueError) as e:
+            return {'valid': False, 'message': f'Invalid SQL: {str(e)}'}
+        if tree.get('error'):
+            return {'valid': False, 'message': f"Invalid SQL: {tree.get('error_message', 'unsupported query')}"}
+
+        ctes = set()
+        relations = []
+        self._collect_relations(tree['statements'], ctes, relations)
+
+        allowed = None if tables is None else {name.lower() for name in tables} | ctes
+        for relation in relations:
+            if relation['type'] == 'TABLE_FUNCTION':
+                function = (relation.get('function') or {}).get('function_name', '')
+                return {'valid': False, 'message': f'Table function not allowed: {function}'}
+
+            name = relation.get('table_name', '')
+            if relation.get('schema_name') or relation.get('catalog_name'):
+                return {'valid': False, 'message': f'Qualified table names are not allowed: {name}'}
+            if allowed is not None and name.lower() not in allowed:
+                return {'valid': False, 'message': f'Unknown table: {name}'}
+            if allowed is None and re.search(r'[./\\]', name):
+                return {'valid': False, 'message': f'File paths are not allowed as tables: {name}'}
+
+        return {'valid': True, 'message': 'Query is valid'}
+
+    @classmethod
+    def _collect_relations(cls, node, ctes, relations):
+        # Walk a json_serialize_sql tree, collecting CTE names and table refs
+        if isinstance(node, list):
+            for item in node:
+                cls._collect_relations(item, ctes, relations)
+            return
+        if not isinstance(node, dict):
+            return
+
+        if node.get('type') in ('BASE_TABLE', 'TABLE_FUNCTION'):
+            relations.append(node)
+        for entry in (node.get('cte_map') or {}).get('map', []):
+            ctes.add(str(entry.get('key', '')).lower())
+
+        for value in node.values():
+            if isinstance(value, (dict, list)):
+                cls._collect_relations(value, ctes, relations)
+
+    def execute_query(self, datasets, sql, limit=None):
+        """
+        Execute SQL over the given datasets and return results as DataFrame
+
+        Args:
+            datasets: Dataset ids, or dicts with 'id' and optional 'name'
+            sql: SQL query
+            limit: Maximum rows to return (defaults to config.DUCKDB_MAX_ROWS)
+
+        Returns:
+            pd.DataFrame: Query results
+        """
+        try:
+            with self.session(datasets) as (cursor, tables):
+                validation = self.validate_sql(sql, tables)
+                if not validation['valid']:
+                    raise ValueError(validation['message'])
+
+                relation = cursor.sql(sql.strip().rstrip(';'))
+                return relation.limit(limit or config.DUCKDB_MAX_ROWS).df()
+
+        except Exception as e:
+            logger.error(f"Error executing dataset query: {str(e)}")
+            raise
+
+    @staticmethod
+    def _quote_identifier(name):
+        return '"' + name.replace('"', '""') + '"'
+
+
+# Global instance
+duckdb_service = DuckDBService()
@@ -0,0 +1,254 @@
+"""
+Embedding Backends
+Interchangeable text embedding implementations: the Vertex AI embedding
+model, and a local feature-hashing projection that runs on the CPU without
+network access. Collections record which backend built them.
+"""
+
+import hashlib
+import logging
+import math
+import re
+import threading
+from collections import Counter
+import numpy as np
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Collection metadata keys recording the backend that built a collection
+BACKEND_KEY = 'embedding_backend'
+MODEL_KEY = 'embedding_model'
+DIMENSION_KEY = 'embedding_dimension'
+
+# Collections created before backends were recorded were built by Vertex AI
+LEGACY_SIGNATURE = {BACKEND_KEY: 'vertex', MODEL_KEY: config.EMBEDDING_MODEL, DIMENSION_KEY: 768}
+
+
+class EmbeddingMismatchError(ValueError):
+    """A collection was built by a different embedding backend than the one configured"""
+
+
+class EmbeddingBackend:
+    """
+    Base class for embedding backends
+
+    Subclasses set name, model and dimension and implement embed().
+    Remote backends are called in concurrent batches with retries; local
+    ones are called once with every text.
+    """
+
+    name = None
+    model = None
+    dimension = None
+    remote = False
+
+    def embed(self, texts):
+        """
+        Embed a batch of texts
+
+        Args:
+            texts (list): Text strings
+
+        Returns:
+            list: Embedding vectors, in input order
+        """
+        raise NotImplementedError
+
+    def signature(self):
+        """
+        Get the collection metadata identifying this backend
+
+        Returns:
+            dict: Backend name, model and vector dimension
+        """
+        return {BACKEND_KEY: self.name, MODEL_KEY: self.model, DIMENSION_KEY: self.dimension}
+
+    def check_collection(self, collection):
+        """
+        Reject a collection whose vectors were built by another backend
+
+        Query vectors from a different backend (or dimension) are not
+        comparable with the stored ones, so searching would return
+        meaningless neighbours or fail inside ChromaDB.
+
+        Args:
+            collection: ChromaDB collection
+
+        Raises:
+            EmbeddingMismatchError: If the collection's backend, model or
+            dimension differs from this backend's
+        """
+        built_by = collection_signature(collection.metadata)
+        if built_by != self.signature():
+            raise EmbeddingMismatchError(
+                f"Dataset was embedded with {built_by[BACKEND_KEY]} ({built_by[MODEL_KEY]}, "
+                f"{built_by[DIMENSION_KEY]} dimensions) but the configured backend is {self.name} "
+                f"({self.model}, {self.dimension} dimensions); reprocess the dataset to query it"
+            )
+
+    def _checked(self, vectors):
+        for vector in vectors:
+            if len(vector) != self.dimension:
+                raise ValueError(
+                    f"{self.name} returned {len(vector)}-dimensional embeddings, expected "
+                    f"{self.dimension}; set EMBEDDING_DIMENSION to the model's output size"
+                )
+        return vectors
+
+
+class VertexEmbeddingBackend(EmbeddingBackend):
+    name = 'vertex'
+    remote = True
+
+    def __init__(self, model=None, dimension=None):
+        """
+        Embeddings from a Vertex AI text embedding model
+
+        Expects vertexai.init() to have been called.
+
+        Args:
+            model: Model name (defaults to config.EMBEDDING_MODEL)
+            dimension: Model output size (defaults to config.EMBEDDING_DIMENSION)
+        """
+        from vertexai.language_models import TextEmbeddingModel
+
+        self.model = model or config.EMBEDDING_MODEL
+        self.dimension = dimension or config.EMBEDDING_DIMENSION
+        self.embedding_model = TextEmbeddingModel.from_pretrained(self.model)
+
+    def embed(self, texts):
+        embeddings = self.embedding_model.get_embeddings(texts)
+        return self._checked([embedding.values for embedding in embeddings])
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    name = 'hashing'
+
+    # Features whose buckets are kept in memory before the table is reset
+    MAX_CACHED_FEATURES = 500000
+    # Character trigrams hashed per word; longer words use their first ones
+    MAX_TRIGRAMS = 15
+
+    def __init__(self, dimension=None):
+        """
+        Local embeddings by feature hashing
+
+        Words, word bigrams and character trigrams of each word are hashed
+        into signed buckets with sublinear term-frequency weights, and the
+        vector is L2-normalized, so cosine similarity reflects shared
+        vocabulary (including partial words like "laptop"/"laptops").
+        Hashes are stable across processes and machines; no model files or
+        network calls are needed.
+
+        Args:
+            dimension: Vector size (defaults to config.EMBEDDING_DIMENSION)
+        """
+        self.dimension = dimension or config.EMBEDDING_DIMENSION
+        self.model = f"feature-hashing-v1-{self.dimension}"
+        self._lock = threading.Lock()
+        self._reset_features()
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+
+        # CPU bound either way; one caller at a time keeps the feature table consistent
+        with self._lock:
+            if len(self._feature_ids) > self.MAX_CACHED_FEATURES:
+                self._reset_features()
+            known = self._feature_ids.get
+
+            for row, text in enumerate(texts):
+                words = re.findall(r'\w+', str(text).lower())
+                counts = Counter(words)
+                counts.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+                if not counts:
+                    continue
+
+                ids = [known(feature) for feature in counts]
+                if None in ids:
+                    ids = [self._feature_id(feature) if i is None else i for i, feature in zip(ids, counts)]
+                ids = np.array(ids, dtype=np.int64)
+                tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+
+                vector = np.bincount(
+                    self._buckets[ids].ravel(),
+                    weights=(self._weights[ids] * tf[:, None]).ravel(),
+                    minlength=self.dimension
+                )
+                norm = np.linalg.norm(vector)
+                if norm:
+                    vectors[row] = vector / norm
+
+        return vectors.tolist()
+
+    def _reset_features(self):
+        # Row i of the tables holds the buckets and signed weights of feature i
+        # (the feature itself, then its trigrams; unused slots weigh 0)
+        self._feature_ids = {}
+        self._buckets = np.zeros((1024, 1 + self.MAX_TRIGRAMS), dtype=np.int64)
+        self._weights = np.zeros((1024, 1 + self.MAX_TRIGRAMS), dtype=np.float32)
+
+    def _feature_id(self, feature):
+        parts = [feature]
+        if ' ' not in feature and len(feature) > 3:
+            padded = f"<{feature}>"
+            parts += [padded[i:i + 3] for i in range(len(padded) - 2)][:self.MAX_TRIGRAMS]
+
+        feature_id = len(self._feature_ids)
+        if feature_id == len(self._buckets):
+            self._buckets = np.concatenate([self._buckets, np.zeros_like(self._buckets)])
+            self._weights = np.concatenate([self._weights, np.zeros_like(self._weights)])
+
+        for slot, part in enumerate(parts):
+            digest = int.from_bytes(hashlib.blake2b(part.encode(), digest_size=8).digest(), 'little')
+            # The whole word weighs as much as all its trigrams together
+            weight = 1.0 if slot == 0 else 1.0 / math.sqrt(len(parts) - 1)
+            self._buckets[feature_id, slot] = digest % self.dimension
+            self._weights[feature_id, slot] = weight if digest >> 63 else -weight
+
+        self._feature_ids[feature] = feature_id
+        return feature_id
+
+
+BACKENDS = {
+    VertexEmbeddingBackend.name: VertexEmbeddingBackend,
+    HashingEmbeddingBackend.name: HashingEmbeddingBackend
+}
+
+
+def create_embedding_backend(name=None):
+    """
+    Create the configured embedding backend
+
+    Args:
+        name: Backend name (defaults to config.EMBEDDING_BACKEND)
+
+    Returns:
+        EmbeddingBackend: Backend instance
+    """
+    name = name or config.EMBEDDING_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+    backend = BACKENDS[name]()
+    logger.info(f"Embedding backend: {backend.name} ({backend.model}, {backend.dimension} dimensions)")
+    return backend
+
+
+def collection_signature(metadata):
+    """
+    Get the backend that built a collection from its metadata
+
+    Args:
+        metadata (dict): Collection metadata
+
+    Returns:
+        dict: Backend name, model and dimension (LEGACY_SIGNATURE for
+        collections that predate the record)
+    """
+    metadata = metadata or {}
+    if BACKEND_KEY not in metadata:
+        return dict(LEGACY_SIGNATURE)
+    return {key: metadata.get(key) for key in (BACKEND_KEY, MODEL_KEY, DIMENSION_KEY)}
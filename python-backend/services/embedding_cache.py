@@ -0,0 +1,210 @@
+"""
+Embedding Cache Service
+Persistent, content-addressed cache of embedding vectors in front of the embedding model
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    def __init__(self, path=None, max_bytes=None):
+        """
+        Initialize the on-disk embedding cache
+
+        Entries are keyed by sha256(model, text) and stored as float32 blobs in
+        SQLite, so the cache is shared by every worker process on the host.
+        The least recently used entries are evicted once the stored vectors
+        exceed the size budget.
+
+        Args:
+            path: SQLite file path (defaults to config.EMBEDDING_CACHE_PATH)
+            max_bytes: Size budget for stored vectors (defaults to config.EMBEDDING_CACHE_MAX_MB)
+        """
+        self.path = path or config.EMBEDDING_CACHE_PATH
+        self.max_bytes = max_bytes or config.EMBEDDING_CACHE_MAX_MB * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access);
+                CREATE TABLE IF NOT EXISTS cache_meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total_bytes INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO cache_meta (id, total_bytes) VALUES (1, 0);
+            """)
+            self.conn.commit()
+
+            logger.info(f"Embedding cache initialized at {self.path}")
+
+        except Exception as e:
+            logger.error(f"Error initializing embedding cache: {str(e)}")
+            raise
+
+    @property
+    def conn(self):
+        """SQLite connection, reopened after a fork (e.g. gunicorn --preload)"""
+        if self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def make_key(model, text):
+        """Content address of a (model, text) pair"""
+        return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, model, texts):
+        """
+        Look up cached vectors for a list of texts
+
+        Args:
+            model: Embedding model name
+            texts: List of texts
+
+        Returns:
+            dict: {index in texts: vector} for every cached text
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        found = {}
+
+        with self._lock:
+            rows = {}
+            unique_keys = list(set(keys))
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(unique_keys), 500):
+                batch = unique_keys[i:i+500]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall())
+
+            if rows:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in rows]
+                )
+                self.conn.commit()
+
+            for i, key in enumerate(keys):
+                if key in rows:
+                    found[i] = array('f', rows[key]).tolist()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, model, texts, vectors):
+        """
+        Store vectors for a list of texts, evicting old entries if over budget
+
+        Args:
+            model: Embedding model name
+            texts: List of texts
+            vectors: Embedding vectors, aligned with texts
+        """
+        now = time.time()
+        entries = {
+            self.make_key(model, text): array('f', vector).tobytes()
+            for text, vector in zip(texts, vectors)
+        }
+
+        with self._lock:
+            added_bytes = 0
+            for key, blob in entries.items():
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                    (key, blob, now)
+                )
+                if cursor.rowcount:
+                    added_bytes += len(blob)
+
+            self.conn.execute("UPDATE cache_meta SET total_bytes = total_bytes + ? WHERE id = 1", (added_bytes,))
+            self.conn.commit()
+
+            self._evict()
+
+    def _evict(self):
+        # Caller holds self._lock. Evict down to 90% of the budget so that
+        # eviction does not run again on every insert.
+        total_bytes = self.conn.execute("SELECT total_bytes FROM cache_meta WHERE id = 1").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        while total_bytes > target:
+            rows = self.conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access LIMIT 500"
+            ).fetchall()
+            if not rows:
+                total_bytes = 0
+                break
+
+            # Stop at the target rather than dropping the whole batch
+            evicted = []
+            for key, size in rows:
+                if total_bytes <= target:
+                    break
+                evicted.append((key,))
+                total_bytes -= size
+
+            self.conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+            self.evictions += len(evicted)
+
+        self.conn.execute("UPDATE cache_meta SET total_bytes = ? WHERE id = 1", (max(total_bytes, 0),))
+        self.conn.commit()
+        logger.info(f"Embedding cache evicted entries, now {total_bytes} bytes")
+
+    def get_stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: Hits, misses and hit rate for this process, plus entry count
+            and stored bytes for the shared cache file
+        """
+        with self._lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total_bytes = self.conn.execute("SELECT total_bytes FROM cache_meta WHERE id = 1").fetchone()[0]
+            lookups = self.hits + self.misses
+
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'bytes': total_bytes,
+                'maxBytes': self.max_bytes
+            }
+
+
+# Global instance
+embedding_cache = EmbeddingCache() if config.EMBEDDING_CACHE_ENABLED else None
@@ -0,0 +1,315 @@
+"""
+Job Queue Service
+Runs long dataset ingestion pipelines on a local worker pool and tracks their status
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from services.process_utils import pid_alive
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+class Job:
+    def __init__(self, key, params, on_change=None):
+        """
+        Initialize a job record
+
+        Args:
+            key: Idempotency key (the dataset id for ingestion jobs)
+            params: Submission parameters, used to detect duplicate submissions
+            on_change: Called with the job after every state change, to persist it
+        """
+        self.id = str(uuid.uuid4())
+        self.key = key
+        self.params = params
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.progress = {}
+        self.timings = {}
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self._stage_started = None
+        self._lock = threading.Lock()
+        self._on_change = on_change
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        Rebuild a job from its stored record (a read-only snapshot)
+
+        Args:
+            record: Row of the jobs table as a dict
+
+        Returns:
+            Job: Job with the stored state
+        """
+        job = cls(record['key'], json.loads(record['params']))
+        job.id = record['id']
+        job.status = record['status']
+        job.stage = record['stage']
+        job.progress = json.loads(record['progress'])
+        job.timings = json.loads(record['timings'])
+        job.result = json.loads(record['result']) if record['result'] else None
+        job.error = record['error']
+        job.submitted_at = record['submitted_at']
+        job.started_at = record['started_at']
+        job.finished_at = record['finished_at']
+        job.host = record['host']
+        job.pid = record['pid']
+        return job
+
+    def set_stage(self, stage):
+        """
+        Move the job to a new pipeline stage, closing the timer of the previous one
+
+        Re-entering a stage (streamed batches cycle through the same stages)
+        adds to its accumulated time.
+
+        Args:
+            stage: Stage name (e.g. 'downloading', 'embedding')
+        """
+        with self._lock:
+            self._close_stage()
+            self.stage = stage
+            self._stage_started = time.time()
+        self._changed()
+
+    def update_progress(self, **progress):
+        """Merge progress counters (rows processed, chunks stored, ...)"""
+        with self._lock:
+            self.progress.update(progress)
+        self._changed()
+
+    def _changed(self):
+        if self._on_change:
+            self._on_change(self)
+
+    def _close_stage(self):
+        if self._stage_started is not None and self.stage not in (QUEUED, COMPLETED, FAILED):
+            elapsed = time.time() - self._stage_started
+            self.timings[self.stage] = round(self.timings.get(self.stage, 0) + elapsed, 3)
+        self._stage_started = None
+
+    def is_active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self):
+        """Serialize job status for the API"""
+        with self._lock:
+            elapsed_end = self.finished_at or time.time()
+            return {
+                'jobId': self.id,
+                'datasetId': self.key,
+                'status': self.status,
+                'stage': self.stage,
+                'progress': dict(self.progress),
+                'timings': dict(self.timings),
+                'submittedAt': datetime.fromtimestamp(self.submitted_at).isoformat(),
+                'elapsedSeconds': round(elapsed_end - (self.started_at or self.submitted_at), 3),
+                'result': self.result,
+                'error': self.error
+            }
+
+
+class JobQueue:
+    def __init__(self, max_workers=None, path=None):
+        """
+        Initialize the job queue
+
+        Jobs run on the worker pool of the process that accepted them, but
+        their records live in SQLite, so any worker process on the host can
+        report a job's status and recognise a duplicate submission. Active
+        jobs whose process has exited are marked failed when next read.
+
+        Args:
+            max_workers: Size of the worker pool (defaults to config.INGESTION_WORKERS)
+            path: SQLite file path (defaults to config.JOB_STORE_PATH)
+        """
+        self.path = path or config.JOB_STORE_PATH
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.INGESTION_WORKERS,
+            thread_name_prefix='ingestion'
+        )
+        self._lock = threading.Lock()
+
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+            self._conn = None
+            self._conn_pid = None
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    key TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    progress TEXT NOT NULL,
+                    timings TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    submitted_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    host TEXT NOT NULL,
+                    pid INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs(key, submitted_at);
+            """)
+            self.conn.commit()
+
+            logger.info(f"Job store initialized at {self.path}")
+
+        except Exception as e:
+            logger.error(f"Error initializing job store: {str(e)}")
+            raise
+
+    @property
+    def conn(self):
+        """SQLite connection, reopened after a fork (e.g. gunicorn --preload)"""
+        if self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.row_factory = sqlite3.Row
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def submit(self, key, params, target, *args, **kwargs):
+        """
+        Enqueue a job, or return the existing one for a duplicate submission
+
+        A submission is a duplicate if a job with the same key is still queued
+        or running, or has completed with the same params. Failed jobs and
+        completed jobs with different params (e.g. a new file) are re-run.
+        The check and the insert share one write transaction, so concurrent
+        submissions to different worker processes cannot both start a job.
+
+        Args:
+            key: Idempotency key
+            params: Dict of submission parameters
+            target: Callable run as target(job, *args, **kwargs); its return value becomes the job result
+
+        Returns:
+            tuple: (Job, created) where created is False for duplicates
+        """
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._prune()
+
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE key = ? ORDER BY submitted_at DESC LIMIT 1", (key,)
+                ).fetchone()
+                existing = self._check_owner(Job.from_record(dict(row))) if row else None
+                if existing and (existing.is_active() or (existing.status == COMPLETED and existing.params == params)):
+                    conn.commit()
+                    logger.info(f"Duplicate submission for {key}, returning job {existing.id}")
+                    return existing, False
+
+                job = Job(key, params, on_change=self._save)
+                self._write(job)
+                conn.commit()
+
+            except Exception:
+                conn.rollback()
+                raise
+
+        self.executor.submit(self._run, job, target, args, kwargs)
+        logger.info(f"Job {job.id} queued for {key}")
+        return job, True
+
+    def get_job(self, job_id):
+        """Get a job by id (None if unknown or expired)"""
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+
+            job = self._check_owner(Job.from_record(dict(row)))
+            self.conn.commit()
+            return job
+
+    def _run(self, job, target, args, kwargs):
+        job.started_at = time.time()
+        job.status = RUNNING
+        self._save(job)
+
+        try:
+            job.result = target(job, *args, **kwargs)
+            job.set_stage(COMPLETED)
+            job.status = COMPLETED
+            logger.info(f"Job {job.id} completed in {time.time() - job.started_at:.1f}s")
+
+        except Exception as e:
+            logger.error(f"Job {job.id} failed during {job.stage}: {str(e)}")
+            job.error = str(e)
+            job.set_stage(FAILED)
+            job.status = FAILED
+
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+
+    def _save(self, job):
+        with self._lock:
+            self._write(job)
+            self.conn.commit()
+
+    def _write(self, job):
+        # Caller holds self._lock and commits
+        record = job.to_dict()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, key, params, status, stage, progress, timings, result, error, "
+            "submitted_at, started_at, finished_at, host, pid) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job.id, job.key, json.dumps(job.params), record['status'], record['stage'],
+                json.dumps(record['progress']), json.dumps(record['timings']),
+                json.dumps(record['result'], default=str) if record['result'] is not None else None,
+                record['error'], job.submitted_at, job.started_at, job.finished_at, job.host, job.pid
+            )
+        )
+
+    def _check_owner(self, job):
+        # Caller holds self._lock and commits. A job left active by a process
+        # that no longer exists will never finish; record it as failed
+        if job.is_active() and job.host == socket.gethostname() and not pid_alive(job.pid):
+            job.status = FAILED
+            job.stage = FAILED
+            job.error = 'Worker process exited before the job finished'
+            job.finished_at = time.time()
+            self._write(job)
+            logger.warning(f"Job {job.id} was orphaned by process {job.pid}")
+        return job
+
+    def _prune(self):
+        # Caller holds self._lock and commits
+        cutoff = time.time() - config.JOB_RETENTION_SECONDS
+        self.conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (COMPLETED, FAILED, cutoff)
+        )
+
+
+# Global instance
+job_queue = JobQueue()
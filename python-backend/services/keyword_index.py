@@ -0,0 +1,337 @@
+"""
+Keyword Index Service
+Local BM25 inverted index over chunk and summary texts (SQLite FTS5), used
+to answer exact-token lookups without an embedding call and to fuse keyword
+and vector rankings for other queries
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from services.data_processor import SUMMARY_TYPE
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Words that never make a lookup specific
+STOPWORDS = frozenset("""
+    a about all an and any are as at be by can did do does for from had has have how i in is it
+    its me my of on or show tell than that the their there these this those to was were what
+    when where which who why with you your give list find many much between before after since
+    until over under above below than more less
+""".split())
+
+
+class KeywordIndex:
+    def __init__(self, index_dir=None):
+        """
+        Initialize the keyword index
+
+        Each dataset has its own SQLite FTS5 table in index_dir, so every
+        worker process reads what the ingestion worker wrote. Documents are
+        indexed with the same ids as in ChromaDB.
+
+        Args:
+            index_dir: Directory for index files (defaults to config.KEYWORD_INDEX_DIR)
+        """
+        self.index_dir = index_dir or config.KEYWORD_INDEX_DIR
+        self.keyword_queries = 0
+        self.hybrid_queries = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        logger.info(f"Keyword index initialized at {self.index_dir}")
+
+    def _path(self, dataset_id):
+        # Dataset ids come from requests; keep them inside index_dir
+        safe_id = re.sub(r'[^A-Za-z0-9_.-]', '_', str(dataset_id))
+        return os.path.join(self.index_dir, f"{safe_id}.sqlite3")
+
+    def _connect(self, dataset_id, create=False):
+        path = self._path(dataset_id)
+        if not create and not os.path.exists(path):
+            return None
+
+        conn = sqlite3.connect(path, timeout=30)
+        if create:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5("
+                "doc_id UNINDEXED, is_summary UNINDEXED, metadata UNINDEXED, text)"
+            )
+        return conn
+
+    def upsert_documents(self, dataset_id, documents):
+        """
+        Index documents, replacing any with the same ids
+
+        Args:
+            dataset_id: Dataset identifier
+            documents: List of (id, text, metadata) tuples; summary documents
+                are marked by their metadata type
+        """
+        try:
+            if not documents:
+                return
+
+            conn = self._connect(dataset_id, create=True)
+            try:
+                with conn:
+                    conn.executemany(
+                        "DELETE FROM documents WHERE doc_id = ?",
+                        [(doc_id,) for doc_id, _, _ in documents]
+                    )
+                    conn.executemany(
+                        "INSERT INTO documents (doc_id, is_summary, metadata, text) VALUES (?, ?, ?, ?)",
+                        [
+                            (doc_id, int(metadata.get('type') == SUMMARY_TYPE), json.dumps(metadata), text)
+                            for doc_id, text, metadata in documents
+                        ]
+                    )
+            finally:
+                conn.close()
+
+        except Exception as e:
+            logger.error(f"Error indexing documents: {str(e)}")
+            raise
+
+    def delete_documents(self, dataset_id, ids):
+        """Remove documents from a dataset's index by id"""
+        try:
+            conn = self._connect(dataset_id)
+            if conn is None or not ids:
+                return
+
+            try:
+                with conn:
+                    conn.executemany("DELETE FROM documents WHERE doc_id = ?", [(doc_id,) for doc_id in ids])
+            finally:
+                conn.close()
+
+        except Exception as e:
+            logger.error(f"Error deleting indexed documents: {str(e)}")
+            raise
+
+    def delete_dataset(self, dataset_id):
+        """Remove a dataset's index"""
+        path = self._path(dataset_id)
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def has_dataset(self, dataset_id):
+        return os.path.exists(self._path(dataset_id))
+
+    @staticmethod
+    def query_terms(query):
+        """
+        Split a question into index terms, specific terms and candidate terms
+
+        Only quoted text is specific by itself. Identifiers (tokens mixing
+        letters and digits, e.g. "T1003", but also "Q1") and phrases of two
+        or more consecutive non-stopwords that are not plain numbers (e.g.
+        "smart coffee maker", but also "total revenue") are candidates: see
+        selective_terms.
+
+        Returns:
+            tuple: (terms, specific, candidates) lists of FTS5 terms/phrases, quoted
+        """
+        quote = lambda text: '"' + text.replace('"', '""') + '"'
+
+        specific = [quote(phrase.lower()) for phrase in re.findall(r'"([^"]+)"', query) if phrase.strip()]
+        terms = []
+        candidates = []
+        run = []
+
+        for token in re.findall(r'\w+', query.lower()) + [None]:
+            if token is not None and token not in STOPWORDS:
+                terms.append(quote(token))
+
+                # Numbers (dates, amounts) neither extend phrases nor identify rows
+                if re.search(r'[^\W\d_]', token):
+                    run.append(token)
+                    if re.search(r'\d', token):
+                        candidates.append(quote(token))
+                    continue
+
+            if len(run) >= 2:
+                candidates.append(quote(' '.join(run)))
+            run = []
+
+        specific = list(dict.fromkeys(specific))
+        return list(dict.fromkeys(terms)), specific, [term for term in dict.fromkeys(candidates) if term not in specific]
+
+    def selective_terms(self, dataset_id, candidates, terms):
+        """
+        Keep the identifiers and phrases that single out a few row chunks
+
+        A candidate is kept when it occurs in at most config.KEYWORD_PHRASE_MAX_DF
+        of the dataset's row chunks and, ranking chunks by BM25 over all of
+        the question's terms, the best chunk containing it leads every chunk
+        without it by config.KEYWORD_PHRASE_MARGIN. Column names and common
+        values ("total revenue", "units sold", a quarter such as "Q1") occur
+        in most chunks and are not kept, so those questions still use hybrid
+        retrieval.
+
+        Args:
+            dataset_id: Dataset identifier
+            candidates (list): Candidate terms from query_terms
+            terms (list): All index terms of the question
+
+        Returns:
+            list: The selective candidates
+        """
+        if not candidates or not terms:
+            return []
+
+        try:
+            conn = self._connect(dataset_id)
+            if conn is None:
+                return []
+
+            try:
+                total = conn.execute("SELECT COUNT(*) FROM documents WHERE is_summary = 0").fetchone()[0]
+                max_matches = max(1, int(total * config.KEYWORD_PHRASE_MAX_DF))
+
+                ranking = conn.execute(
+                    "SELECT doc_id, bm25(documents) FROM documents "
+                    "WHERE documents MATCH ? AND is_summary = 0 ORDER BY bm25(documents) LIMIT ?",
+                    (' OR '.join(terms), config.HYBRID_CANDIDATES)
+                ).fetchall()
+
+                selective = []
+                for candidate in candidates:
+                    matched = {
+                        doc_id for doc_id, in conn.execute(
+                            "SELECT doc_id FROM documents WHERE documents MATCH ? AND is_summary = 0 LIMIT ?",
+                            (candidate, max_matches + 1)
+                        )
+                    }
+                    if not matched or len(matched) > max_matches:
+                        continue
+
+                    # bm25() is lower for better matches
+                    best_in = max((-score for doc_id, score in ranking if doc_id in matched), default=None)
+                    best_out = max((-score for doc_id, score in ranking if doc_id not in matched), default=None)
+                    if best_in is not None and (best_out is None or best_in >= config.KEYWORD_PHRASE_MARGIN * best_out):
+                        selective.append(candidate)
+            finally:
+                conn.close()
+
+            return selective
+
+        except Exception as e:
+            logger.error(f"Error checking keyword terms: {str(e)}")
+            raise
+
+    def search(self, dataset_id, match, top_k=5, summaries=False):
+        """
+        Rank a dataset's documents by BM25
+
+        Args:
+            dataset_id: Dataset identifier
+            match (list): FTS5 terms/phrases, any of which may match
+            top_k (int): Number of results to return
+            summaries (bool): Search summary documents instead of row chunks
+
+        Returns:
+            dict: Search results with ids, documents, metadatas and scores
+            (higher is better), in the shape of ChromaDBService.semantic_search
+        """
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'scores': []}
+        if not match or top_k <= 0:
+            return results
+
+        try:
+            conn = self._connect(dataset_id)
+            if conn is None:
+                return results
+
+            try:
+                rows = conn.execute(
+                    "SELECT doc_id, text, metadata, bm25(documents) FROM documents "
+                    "WHERE documents MATCH ? AND is_summary = ? ORDER BY bm25(documents) LIMIT ?",
+                    (' OR '.join(match), int(summaries), top_k)
+                ).fetchall()
+            finally:
+                conn.close()
+
+            for doc_id, text, metadata, score in rows:
+                results['ids'].append(doc_id)
+                results['documents'].append(text)
+                results['metadatas'].append(json.loads(metadata))
+                results['scores'].append(-score)
+
+            return results
+
+        except Exception as e:
+            logger.error(f"Error searching keyword index: {str(e)}")
+            raise
+
+    def record_query(self, keyword_only):
+        """Count a query answered from the index alone (embedding skipped) or by fusion"""
+        with self._lock:
+            if keyword_only:
+                self.keyword_queries += 1
+            else:
+                self.hybrid_queries += 1
+
+    def get_stats(self):
+        """
+        Get query counters
+
+        Returns:
+            dict: Queries answered from the index alone (no embedding call)
+            and by hybrid fusion, for this process
+        """
+        with self._lock:
+            total = self.keyword_queries + self.hybrid_queries
+
+            return {
+                'embeddingsSkipped': self.keyword_queries,
+                'hybridQueries': self.hybrid_queries,
+                'skipRate': round(self.keyword_queries / total, 4) if total else 0.0
+            }
+
+
+def reciprocal_rank_fusion(result_lists, top_k=5, k=None):
+    """
+    Merge ranked result lists by reciprocal rank fusion
+
+    Each document scores sum(1 / (k + rank)) over the lists it appears in,
+    so keyword and vector rankings combine without comparing raw scores.
+
+    Args:
+        result_lists (list): Results with 'ids', 'documents' and 'metadatas'
+        top_k (int): Number of results to return
+        k (int): Rank damping constant (defaults to config.HYBRID_RRF_K)
+
+    Returns:
+        dict: Fused results with ids, documents, metadatas and scores
+    """
+    k = config.HYBRID_RRF_K if k is None else k
+    scores = {}
+    entries = {}
+
+    for results in result_lists:
+        for rank, doc_id in enumerate(results['ids']):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+            entries.setdefault(doc_id, (results['documents'][rank], results['metadatas'][rank]))
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return {
+        'ids': ranked,
+        'documents': [entries[doc_id][0] for doc_id in ranked],
+        'metadatas': [entries[doc_id][1] for doc_id in ranked],
+        'scores': [round(scores[doc_id], 6) for doc_id in ranked]
+    }
+
+
+# Global instance
+keyword_index = KeywordIndex() if config.KEYWORD_INDEX_ENABLED else None
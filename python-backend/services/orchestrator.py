@@ -12,9 +12,14 @@ logger = logging.getLogger(__name__)
 
 
 class Orchestrator:
-    def __init__(self):
-        """Initialize Orchestrator"""
-        self.vertex_ai = VertexAIService()
+    def __init__(self, vertex_ai=None):
+        """
+        Initialize Orchestrator
+        
+        Args:
+            vertex_ai: VertexAIService to generate with (a new one is created if omitted)
+        """
+        self.vertex_ai = vertex_ai or VertexAIService()
     
     def detect_sources(self, question, available_sources):
         """
@@ -100,7 +105,7 @@ JSON Response:"""
                     'generate_report': False
                 }
     
-    def merge_results(self, csv_results=None, sql_results=None, question=""):
+    def merge_results(self, csv_results=None, sql_results=None, question="", on_token=None):
         """
         Merge results from multiple agents
         
@@ -108,6 +113,8 @@ JSON Response:"""
             csv_results: Results from CSV agent
             sql_results: Results from SQL agent
             question: Original question
+            on_token (callable, optional): Streams the comparison analysis
+                when both sources returned results
             
         Returns:
             dict: Merged results with combined analysis
@@ -127,7 +134,7 @@ JSON Response:"""
             # Generate combined analysis if both sources used
             if csv_results and sql_results:
                 analysis = self._generate_comparison_analysis(
-                    question, csv_results, sql_results
+                    question, csv_results, sql_results, on_token
                 )
             elif csv_results:
                 analysis = csv_results.get('analysis', csv_results.get('response', ''))
@@ -147,7 +154,7 @@ JSON Response:"""
             logger.error(f"Error merging results: {str(e)}")
             raise
     
-    def _generate_comparison_analysis(self, question, csv_results, sql_results):
+    def _generate_comparison_analysis(self, question, csv_results, sql_results, on_token=None):
         """
         Generate analysis comparing CSV and SQL results
         
@@ -155,6 +162,8 @@ JSON Response:"""
             question: Original question
             csv_results: CSV agent results
             sql_results: SQL agent results
+            on_token (callable, optional): Called with each text fragment as
+                the analysis streams in
             
         Returns:
             str: Comparison analysis
@@ -184,8 +193,7 @@ Analysis:"""
 
             logger.info("Generating comparison analysis")
             
-            response = self.vertex_ai.gemini_model.generate_content(prompt)
-            return response.text.strip()
+            return self.vertex_ai.generate_text(prompt, on_token).strip()
             
         except Exception as e:
             logger.error(f"Error generating comparison: {str(e)}")
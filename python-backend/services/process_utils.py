@@ -0,0 +1,26 @@
+"""
+Process Utilities
+Helpers for state that is shared between worker processes on one host
+"""
+
+import os
+
+
+def pid_alive(pid):
+    """
+    Check whether a process is still running on this host
+
+    Args:
+        pid: Process id
+
+    Returns:
+        bool: False only if no such process exists
+    """
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but owned by another user
+        return True
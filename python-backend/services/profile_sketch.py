@@ -0,0 +1,432 @@
+"""
+Profile Sketches
+Mergeable, bounded-size column summaries used to profile datasets in one pass
+"""
+
+import math
+import numpy as np
+import pandas as pd
+import config
+
+# HyperLogLog precision: 2^12 registers, ~1.6% standard error on distinct counts
+HLL_PRECISION = 12
+
+# Items kept per level of the quantile sketch; rank error is roughly 1/k per level
+QUANTILE_K = 256
+
+# Counters kept by the heavy-hitter summary, and how many are reported
+FREQUENT_ITEMS_CAPACITY = 64
+TOP_K = 5
+
+NUMERIC = 'numeric'
+DATETIME = 'datetime'
+CATEGORICAL = 'categorical'
+
+
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION):
+        """Approximate distinct counter over 64-bit value hashes"""
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes):
+        """Add an array of uint64 hashes"""
+        if len(hashes) == 0:
+            return
+
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        remainder = hashes << np.uint64(p)
+
+        # Rank = position of the first set bit in the remaining 64 - p bits
+        bit_length = np.frexp(remainder.astype(np.float64))[1]
+        rank = np.where(remainder == 0, 64 - p + 1, 64 - bit_length + 1)
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+
+        # Small-range correction (linear counting)
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+
+class QuantileSketch:
+    def __init__(self, k=QUANTILE_K):
+        """
+        Approximate quantiles with a stack of compactors (KLL-style)
+
+        Level i holds items of weight 2^i. A full level is sorted and every
+        other item is promoted, so memory grows only with log(n / k).
+        """
+        self.k = k
+        self.levels = []
+        self._rng = np.random.default_rng(0)
+
+    def update(self, values):
+        """Add an array of float values (no NaNs)"""
+        self._add(0, values)
+        self._compress()
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            self._add(level, items)
+        self._compress()
+
+    def quantiles(self, qs):
+        if not self.levels:
+            return [None] * len(qs)
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 1 << level, dtype=np.int64) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        values = values[order]
+        cumulative = np.cumsum(weights[order])
+
+        positions = np.searchsorted(cumulative, [q * cumulative[-1] for q in qs])
+        return [float(values[min(pos, len(values) - 1)]) for pos in positions]
+
+    def _add(self, level, items):
+        while len(self.levels) <= level:
+            self.levels.append(np.empty(0, dtype=np.float64))
+        self.levels[level] = np.concatenate([self.levels[level], np.asarray(items, dtype=np.float64)])
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.k:
+                items = np.sort(items)
+                # An odd item out stays at this level so total weight is exact
+                keep, rest = items[:len(items) % 2], items[len(items) % 2:]
+                offset = int(self._rng.integers(2))
+                self.levels[level] = keep
+                self._add(level + 1, rest[offset::2])
+            level += 1
+
+
+class FrequentItems:
+    def __init__(self, capacity=FREQUENT_ITEMS_CAPACITY):
+        """
+        Heavy hitters with a Misra-Gries summary
+
+        Reported counts underestimate true counts by at most n / (capacity + 1).
+        """
+        self.capacity = capacity
+        self.counts = {}
+
+    def update(self, value_counts):
+        """Add a batch's exact counts (pd.Series from value_counts())"""
+        # Reduce in pandas first; high-cardinality batches stay vectorized
+        if len(value_counts) > self.capacity:
+            largest = value_counts.nlargest(self.capacity + 1, keep='first')
+            value_counts = largest.iloc[:self.capacity] - largest.iloc[self.capacity]
+            value_counts = value_counts[value_counts > 0]
+
+        self._merge_counts(dict(zip(value_counts.index.tolist(), value_counts.tolist())))
+
+    def merge(self, other):
+        self._merge_counts(other.counts)
+
+    def top(self, n=TOP_K):
+        """Most frequent values; values seen once are not heavy hitters and are left out"""
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return [(value, count) for value, count in ranked[:n] if count > 1]
+
+    def _merge_counts(self, counts):
+        merged = dict(self.counts)
+        for value, count in counts.items():
+            merged[value] = merged.get(value, 0) + count
+        self.counts = self._reduce(merged)
+
+    def _reduce(self, counts):
+        if len(counts) <= self.capacity:
+            return counts
+
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        threshold = ranked[self.capacity][1]
+        return {value: count - threshold for value, count in ranked[:self.capacity] if count > threshold}
+
+
+class ColumnSketch:
+    def __init__(self, kind):
+        """
+        Running summary of one column
+
+        Counts, nulls, distinct values and heavy hitters are kept for every
+        column; numeric and datetime columns also track min/max, mean and
+        variance (merged with Chan's parallel formula) and quantiles.
+        """
+        self.kind = kind
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.sum = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.quantiles = QuantileSketch() if kind in (NUMERIC, DATETIME) else None
+        self.distinct = HyperLogLog()
+        self.frequent = FrequentItems()
+
+    @staticmethod
+    def kind_of(series):
+        if pd.api.types.is_bool_dtype(series.dtype):
+            return CATEGORICAL
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            return NUMERIC
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return DATETIME
+        return CATEGORICAL
+
+    @classmethod
+    def from_series(cls, series):
+        sketch = cls(cls.kind_of(series))
+        values = series.dropna()
+
+        sketch.count = len(values)
+        sketch.nulls = len(series) - len(values)
+        sketch.frequent.update(values.value_counts(sort=False))
+
+        if sketch.kind == CATEGORICAL:
+            sketch.distinct.update(pd.util.hash_pandas_object(values, index=False).to_numpy())
+            return sketch
+
+        if sketch.kind == DATETIME:
+            if getattr(values.dt, 'tz', None) is not None:
+                values = values.dt.tz_convert(None)
+            numbers = values.to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(np.float64)
+        else:
+            numbers = values.to_numpy(dtype=np.float64)
+
+        # Hash floats so that ints and floats from different batches agree
+        sketch.distinct.update(pd.util.hash_array(numbers))
+
+        if len(numbers):
+            sketch.min = float(numbers.min())
+            sketch.max = float(numbers.max())
+            sketch.sum = float(numbers.sum())
+            sketch.mean = float(numbers.mean())
+            sketch.m2 = float(((numbers - sketch.mean) ** 2).sum())
+            sketch.quantiles.update(numbers)
+
+        return sketch
+
+    def merge(self, other):
+        """Merge another sketch of the same column into this one"""
+        if self.kind != other.kind:
+            # e.g. a streamed batch where text appeared in a numeric column
+            self._drop_moments()
+            other_moments = False
+        else:
+            other_moments = self.kind != CATEGORICAL
+
+        if other_moments and other.count:
+            if self.count:
+                total = self.count + other.count
+                delta = other.mean - self.mean
+                self.mean += delta * other.count / total
+                self.m2 += other.m2 + delta * delta * self.count * other.count / total
+                self.sum += other.sum
+                self.min = min(self.min, other.min)
+                self.max = max(self.max, other.max)
+            else:
+                self.sum, self.mean, self.m2 = other.sum, other.mean, other.m2
+                self.min, self.max = other.min, other.max
+            self.quantiles.merge(other.quantiles)
+
+        self.count += other.count
+        self.nulls += other.nulls
+        self.distinct.merge(other.distinct)
+        self.frequent.merge(other.frequent)
+
+    def summary(self):
+        stats = {
+            'count': self.count,
+            'nulls': self.nulls,
+            'distinct': min(self.distinct.estimate(), self.count),
+            'top': [{'value': _json_value(value), 'count': count} for value, count in self.frequent.top()]
+        }
+
+        if self.kind == CATEGORICAL or not self.count:
+            return stats
+
+        q25, q50, q75 = self.quantiles.quantiles([0.25, 0.5, 0.75])
+        if self.kind == DATETIME:
+            to_time = lambda ns: pd.Timestamp(int(ns)).isoformat()
+            stats.update({
+                'mean': to_time(self.mean), 'min': to_time(self.min),
+                '25%': to_time(q25), '50%': to_time(q50), '75%': to_time(q75),
+                'max': to_time(self.max)
+            })
+        else:
+            stats.update({
+                'sum': self.sum,
+                'mean': self.mean,
+                'std': math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None,
+                'min': self.min, '25%': q25, '50%': q50, '75%': q75,
+                'max': self.max
+            })
+
+        return stats
+
+    def _drop_moments(self):
+        self.kind = CATEGORICAL
+        self.min = self.max = None
+        self.sum = self.mean = self.m2 = 0.0
+        self.quantiles = None
+
+
+class GroupAggregates:
+    def __init__(self, max_groups=None):
+        """
+        Exact per-group row counts, sums and non-null counts of the numeric
+        columns, for every low-cardinality text column
+
+        A grouping column is dropped (kept as None) once it has more than
+        max_groups distinct values, so state stays bounded.
+
+        Args:
+            max_groups: Group limit per column (defaults to config.SUMMARY_MAX_GROUPS)
+        """
+        self.max_groups = max_groups or config.SUMMARY_MAX_GROUPS
+        self.measures = []
+        self.groups = {}
+
+    @classmethod
+    def from_dataframe(cls, df, kinds):
+        aggregates = cls()
+        aggregates.measures = [col for col, kind in kinds.items() if kind == NUMERIC]
+
+        for col, kind in kinds.items():
+            if kind != CATEGORICAL:
+                continue
+
+            grouped = df.groupby(df[col], observed=True, sort=False)
+            rows = grouped.size()
+            if len(rows) > aggregates.max_groups:
+                aggregates.groups[col] = None
+                continue
+
+            aggregates.groups[col] = {
+                'rows': rows,
+                'sums': grouped[aggregates.measures].sum(),
+                'counts': grouped[aggregates.measures].count()
+            }
+            # Plain object index so batches with different categories align
+            for key, value in aggregates.groups[col].items():
+                value.index = pd.Index(value.index.tolist(), dtype=object)
+
+        return aggregates
+
+    def merge(self, other):
+        # Measures that were not numeric in every batch would be partial
+        measures = [col for col in self.measures if col in other.measures]
+
+        merged = {}
+        for col in list(self.groups) + [col for col in other.groups if col not in self.groups]:
+            ours, theirs = self.groups.get(col), other.groups.get(col)
+            if ours is None or theirs is None:
+                merged[col] = None
+                continue
+
+            rows = ours['rows'].add(theirs['rows'], fill_value=0)
+            if len(rows) > self.max_groups:
+                merged[col] = None
+                continue
+
+            merged[col] = {
+                'rows': rows,
+                'sums': ours['sums'][measures].add(theirs['sums'][measures], fill_value=0),
+                'counts': ours['counts'][measures].add(theirs['counts'][measures], fill_value=0)
+            }
+
+        self.measures = measures
+        self.groups = merged
+
+    def summary(self):
+        """
+        Returns:
+            dict: {group column: [{'value', 'rows', 'measures': {col: {'sum', 'mean'}}}]},
+            groups ordered by row count
+        """
+        result = {}
+        for col, group in self.groups.items():
+            if group is None:
+                continue
+
+            entries = []
+            for value, rows in group['rows'].sort_values(ascending=False).items():
+                measures = {}
+                for measure in self.measures:
+                    count = group['counts'].at[value, measure]
+                    total = float(group['sums'].at[value, measure])
+                    measures[measure] = {'sum': total, 'mean': total / count if count else None}
+                entries.append({'value': _json_value(value), 'rows': int(rows), 'measures': measures})
+
+            result[col] = entries
+
+        return result
+
+
+class TableSketch:
+    def __init__(self):
+        """
+        Mergeable profile of a table, built batch by batch
+
+        Sketch state is plain numpy arrays, dicts and small pandas objects, so
+        sketches built by separate workers can be pickled and merged.
+        """
+        self.row_count = 0
+        self.columns = {}
+        self.groups = GroupAggregates()
+
+    @classmethod
+    def from_dataframe(cls, df):
+        sketch = cls()
+        sketch.row_count = len(df)
+        sketch.columns = {col: ColumnSketch.from_series(df[col]) for col in df.columns}
+        sketch.groups = GroupAggregates.from_dataframe(df, {col: column.kind for col, column in sketch.columns.items()})
+        return sketch
+
+    def merge(self, other):
+        """Merge another sketch into this one; columns missing on either side count as nulls"""
+        for col, column in self.columns.items():
+            if col not in other.columns:
+                column.nulls += other.row_count
+
+        for col, column in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(column)
+            else:
+                column.nulls += self.row_count
+                self.columns[col] = column
+
+        self.groups.merge(other.groups)
+        self.row_count += other.row_count
+        return self
+
+    def missing_values(self):
+        return {col: column.nulls for col, column in self.columns.items()}
+
+    def summary(self):
+        return {col: column.summary() for col, column in self.columns.items()}
+
+    def group_summary(self):
+        return self.groups.summary()
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
@@ -0,0 +1,118 @@
+"""
+Query Embedding Cache Service
+Bounded in-memory LRU cache of question embeddings, so repeated questions
+skip the embedding round trip
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_entries=None, ttl_seconds=None):
+        """
+        Initialize the query embedding cache
+
+        Entries are keyed by (model, normalized question), so questions that
+        differ only in case, spacing or trailing punctuation share a vector.
+        The least recently used entry is evicted once max_entries is reached,
+        and entries older than ttl_seconds are treated as misses.
+
+        Args:
+            max_entries: Maximum cached questions (defaults to config.QUERY_EMBEDDING_CACHE_SIZE)
+            ttl_seconds: Entry lifetime (defaults to config.QUERY_EMBEDDING_CACHE_TTL_SECONDS)
+        """
+        self.max_entries = config.QUERY_EMBEDDING_CACHE_SIZE if max_entries is None else max_entries
+        self.ttl_seconds = config.QUERY_EMBEDDING_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text):
+        """Normalize a question for cache lookup (case, whitespace, trailing punctuation)"""
+        return re.sub(r'\s+', ' ', str(text)).strip().rstrip('?!.').strip().casefold()
+
+    def get(self, model, text):
+        """
+        Get the cached embedding of a question
+
+        Args:
+            model: Embedding model name
+            text: Question text
+
+        Returns:
+            list: Embedding vector, or None on a miss
+        """
+        key = (model, self.normalize(text))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, model, text, vector):
+        """
+        Cache the embedding of a question
+
+        Args:
+            model: Embedding model name
+            text: Question text
+            vector (list): Embedding vector
+        """
+        if self.max_entries <= 0:
+            return
+
+        key = (model, self.normalize(text))
+
+        with self._lock:
+            self._entries[key] = (vector, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached embedding"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: Hits, misses, evictions and entries for this process
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries
+            }
+
+
+# Global instance
+query_embedding_cache = QueryEmbeddingCache()
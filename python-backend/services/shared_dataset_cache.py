@@ -0,0 +1,260 @@
+"""
+Shared Dataset Cache Service
+Cross-process cache of loaded datasets as memory-mapped Arrow files, so every
+gunicorn worker reads the same pages instead of holding its own copy
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from services.dataset_store import dataset_store
+from services.process_utils import pid_alive
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SharedDatasetCache:
+    def __init__(self, cache_dir=None, max_bytes=None):
+        """
+        Initialize the shared dataset cache
+
+        Each cached dataset version is an uncompressed Arrow IPC file in
+        cache_dir (tmpfs by default). Readers memory-map it, so the OS page
+        cache holds a single copy shared by all processes. A SQLite index in
+        the same directory tracks sizes, per-process reference counts and
+        last access for LRU eviction under the global budget.
+
+        Args:
+            cache_dir: Directory for Arrow files (defaults to config.SHARED_CACHE_DIR)
+            max_bytes: Global size budget (defaults to config.SHARED_CACHE_MAX_MB)
+        """
+        self.cache_dir = cache_dir or config.SHARED_CACHE_DIR
+        self.max_bytes = max_bytes or config.SHARED_CACHE_MAX_MB * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            self._conn = None
+            self._conn_pid = None
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    dataset_id TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS refs (
+                    key TEXT NOT NULL,
+                    pid INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (key, pid)
+                );
+            """)
+            self.conn.commit()
+
+            logger.info(f"Shared dataset cache initialized at {self.cache_dir}")
+
+        except Exception as e:
+            logger.error(f"Error initializing shared dataset cache: {str(e)}")
+            raise
+
+    @property
+    def conn(self):
+        """SQLite index connection, reopened after a fork (e.g. gunicorn --preload)"""
+        if self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(
+                os.path.join(self.cache_dir, 'index.sqlite3'),
+                check_same_thread=False,
+                timeout=30
+            )
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    @contextmanager
+    def open(self, dataset_id, columns=None, table=None):
+        """
+        Open a stored dataset as a memory-mapped Arrow table
+
+        The dataset is pinned (not evictable) while the context is open.
+        Tables are zero-copy views of the shared file; copy anything that
+        must outlive eviction.
+
+        Args:
+            dataset_id: Dataset identifier
+            columns (list, optional): Columns to select (all if None)
+            table (str, optional): Logical table (primary table if None)
+
+        Yields:
+            pa.Table: Memory-mapped table
+        """
+        key = self._acquire(dataset_id, table)
+        try:
+            path = self._path_for(key)
+            with pa.memory_map(path, 'r') as source:
+                arrow_table = ipc.open_file(source).read_all()
+                yield arrow_table.select(columns) if columns else arrow_table
+        finally:
+            self._release(key)
+
+    def invalidate(self, dataset_id):
+        """Drop every cached version of a dataset that no process is using"""
+        with self._lock:
+            keys = [row[0] for row in self.conn.execute(
+                "SELECT key FROM entries WHERE dataset_id = ?", (dataset_id,)
+            )]
+            for key in keys:
+                if not self._is_pinned(key):
+                    self._remove(key)
+            self.conn.commit()
+
+    def get_stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: Hits and misses for this process, plus entries and bytes
+            held by the shared cache
+        """
+        with self._lock:
+            entries, total_bytes = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM entries"
+            ).fetchone()
+            lookups = self.hits + self.misses
+
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': entries,
+                'bytes': total_bytes,
+                'maxBytes': self.max_bytes
+            }
+
+    def _acquire(self, dataset_id, table=None):
+        manifest = dataset_store.get_manifest(dataset_id)
+        if not manifest:
+            raise ValueError(f"Dataset not found in store: {dataset_id}")
+
+        key = f"{dataset_id}:v{manifest['version']}"
+        if table is not None:
+            key = f"{key}:{table}"
+
+        with self._lock:
+            row = self.conn.execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+            if row and os.path.exists(row[0]):
+                self.hits += 1
+                self._pin(key)
+                return key
+
+        # Build the Arrow file outside the lock; concurrent builders of the
+        # same key each write a temp file and the last rename wins
+        self.misses += 1
+        size_bytes = self._materialize(dataset_id, key, table)
+
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, dataset_id, path, size_bytes, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, dataset_id, self._path_for(key), size_bytes, time.time())
+            )
+            self._pin(key)
+
+            # A new version supersedes older ones of the same dataset
+            version_prefix = f"{dataset_id}:v{manifest['version']}"
+            stale = [row[0] for row in self.conn.execute(
+                "SELECT key FROM entries WHERE dataset_id = ?", (dataset_id,)
+            ) if not (row[0] == version_prefix or row[0].startswith(f"{version_prefix}:"))]
+            for stale_key in stale:
+                if not self._is_pinned(stale_key):
+                    self._remove(stale_key)
+
+            self._evict()
+            self.conn.commit()
+
+        return key
+
+    def _materialize(self, dataset_id, key, table=None):
+        arrow_table = dataset_store.load_table(dataset_id, table=table)
+
+        path = self._path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        os.replace(tmp_path, path)
+
+        logger.info(f"Dataset {key} cached in shared memory ({os.path.getsize(path)} bytes)")
+        return os.path.getsize(path)
+
+    def _release(self, key):
+        with self._lock:
+            self.conn.execute(
+                "UPDATE refs SET count = count - 1 WHERE key = ? AND pid = ?", (key, os.getpid())
+            )
+            self.conn.execute("DELETE FROM refs WHERE count <= 0")
+            self.conn.commit()
+
+    def _pin(self, key):
+        # Caller holds self._lock
+        self.conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.conn.execute(
+            "INSERT INTO refs (key, pid, count) VALUES (?, ?, 1) "
+            "ON CONFLICT(key, pid) DO UPDATE SET count = count + 1",
+            (key, os.getpid())
+        )
+        self.conn.commit()
+
+    def _is_pinned(self, key):
+        # Caller holds self._lock. References held by dead workers are dropped.
+        pinned = False
+        for pid, in self.conn.execute("SELECT pid FROM refs WHERE key = ?", (key,)).fetchall():
+            if pid_alive(pid):
+                pinned = True
+            else:
+                self.conn.execute("DELETE FROM refs WHERE key = ? AND pid = ?", (key, pid))
+        return pinned
+
+    def _evict(self):
+        # Caller holds self._lock. Least recently used unpinned entries go first.
+        total_bytes = self.conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM entries").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        for key, size_bytes in self.conn.execute(
+            "SELECT key, size_bytes FROM entries ORDER BY last_access"
+        ).fetchall():
+            if total_bytes <= self.max_bytes:
+                break
+            if self._is_pinned(key):
+                continue
+            self._remove(key)
+            total_bytes -= size_bytes
+            logger.info(f"Evicted {key} from shared dataset cache")
+
+    def _remove(self, key):
+        # Caller holds self._lock. Processes that still map the file keep
+        # their view until they drop it; the pages are freed afterwards.
+        self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        try:
+            os.remove(self._path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def _path_for(self, key):
+        return os.path.join(self.cache_dir, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', key)}.arrow")
+
+
+# Global instance
+shared_dataset_cache = SharedDatasetCache()
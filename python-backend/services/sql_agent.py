@@ -6,6 +6,7 @@ Generates SQL queries from natural language using Gemini
 import logging
 from services.vertex_ai_service import VertexAIService
 from services.sql_service import sql_service
+from services.duckdb_service import duckdb_service, DB_TYPE as DUCKDB_TYPE
 import json
 
 logging.basicConfig(level=logging.INFO)
@@ -13,10 +14,16 @@ logger = logging.getLogger(__name__)
 
 
 class SQLAgent:
-    def __init__(self):
-        """Initialize SQL Agent"""
-        self.vertex_ai = VertexAIService()
+    def __init__(self, vertex_ai=None):
+        """
+        Initialize SQL Agent
+        
+        Args:
+            vertex_ai: VertexAIService to generate with (a new one is created if omitted)
+        """
+        self.vertex_ai = vertex_ai or VertexAIService()
         self.sql_service = sql_service
+        self.duckdb_service = duckdb_service
     
     def _format_schema_for_prompt(self, schema):
         """
@@ -35,7 +42,7 @@ class SQLAgent:
         
         return "\n\n".join(schema_text)
     
-    def generate_sql(self, connection_id, question, schema=None):
+    def generate_sql(self, connection_id, question, schema=None, db_type=None):
         """
         Generate SQL query from natural language question
         
@@ -43,6 +50,7 @@ class SQLAgent:
             connection_id: Database connection ID
             question: Natural language question
             schema: Optional schema dict (if not provided, will fetch)
+            db_type: Optional target dialect (if not provided, taken from the connection)
             
         Returns:
             dict: {'sql': str, 'explanation': str}
@@ -56,7 +64,8 @@ class SQLAgent:
             schema_text = self._format_schema_for_prompt(schema)
             
             # Get database type
-            db_type = self.sql_service.get_db_type(connection_id)
+            if db_type is None:
+                db_type = self.sql_service.get_db_type(connection_id)
             
             # Create prompt for SQL generation
             prompt = f"""You are a SQL expert. Generate a SQL query based on the user's question.
@@ -93,7 +102,8 @@ SQL Query:"""
             logger.info(f"Generated SQL: {sql_query}")
             
             # Validate the generated SQL
-            validation = self.sql_service.validate_sql(sql_query)
+            validator = self.duckdb_service if db_type == DUCKDB_TYPE else self.sql_service
+            validation = validator.validate_sql(sql_query)
             if not validation['valid']:
                 raise ValueError(f"Generated invalid SQL: {validation['message']}")
             
@@ -106,13 +116,15 @@ SQL Query:"""
             logger.error(f"Error generating SQL: {str(e)}")
             raise
     
-    def query_database(self, connection_id, question):
+    def query_database(self, connection_id, question, on_progress=None):
         """
         Complete workflow: Generate SQL from question and execute it
         
         Args:
             connection_id: Database connection ID
             question: Natural language question
+            on_progress (callable, optional): Called as on_progress(stage, details)
+                once the SQL is generated ('sql') and once rows are fetched ('rows')
             
         Returns:
             dict: {
@@ -128,12 +140,16 @@ SQL Query:"""
             # Generate SQL
             sql_result = self.generate_sql(connection_id, question)
             sql_query = sql_result['sql']
+            if on_progress:
+                on_progress('sql', {'sql': sql_query})
             
             # Execute SQL
             df = self.sql_service.execute_query(connection_id, sql_query)
             
             # Convert to records
             data = df.to_dict('records')
+            if on_progress:
+                on_progress('rows', {'rowCount': len(data)})
             
             logger.info(f"Query executed successfully. Rows returned: {len(data)}")
             
@@ -148,7 +164,59 @@ SQL Query:"""
             logger.error(f"Error in query_database: {str(e)}")
             raise
     
-    def analyze_results(self, question, sql_query, data):
+    def query_datasets(self, datasets, question, on_progress=None):
+        """
+        Complete workflow over uploaded datasets: generate SQL and run it in-process
+        
+        Every row of every dataset is queried, so aggregations and joins
+        across files are exact.
+        
+        Args:
+            datasets: Dataset ids, or dicts with 'id' and optional 'name'
+            question: Natural language question
+            on_progress (callable, optional): Called as on_progress(stage, details)
+                once the SQL is generated ('sql') and once rows are fetched ('rows')
+            
+        Returns:
+            dict: {
+                'sql': str,
+                'data': list,
+                'rowCount': int,
+                'explanation': str,
+                'tables': list
+            }
+        """
+        try:
+            logger.info(f"Processing natural language dataset query: {question}")
+            
+            schema = self.duckdb_service.get_schema(datasets)
+            sql_result = self.generate_sql(None, question, schema=schema, db_type=DUCKDB_TYPE)
+            sql_query = sql_result['sql']
+            if on_progress:
+                on_progress('sql', {'sql': sql_query})
+            
+            df = self.duckdb_service.execute_query(datasets, sql_query)
+            
+            # NaN is not valid JSON
+            data = df.astype(object).where(df.notna(), None).to_dict('records')
+            if on_progress:
+                on_progress('rows', {'rowCount': len(data)})
+            
+            logger.info(f"Dataset query executed successfully. Rows returned: {len(data)}")
+            
+            return {
+                'sql': sql_query,
+                'data': data,
+                'rowCount': len(data),
+                'explanation': sql_result['explanation'],
+                'tables': list(schema)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error in query_datasets: {str(e)}")
+            raise
+    
+    def analyze_results(self, question, sql_query, data, on_token=None):
         """
         Use LLM to analyze query results and generate insights
         
@@ -156,6 +224,8 @@ SQL Query:"""
             question: Original question
             sql_query: SQL query that was executed
             data: Query results (list of dicts)
+            on_token (callable, optional): Called with each text fragment as
+                the analysis streams in
             
         Returns:
             str: Natural language analysis
@@ -206,8 +276,7 @@ Analysis:"""
 
             logger.info("Generating analysis of query results")
             
-            response = self.vertex_ai.gemini_model.generate_content(prompt)
-            analysis = response.text.strip()
+            analysis = self.vertex_ai.generate_text(prompt, on_token).strip()
             
             return analysis
             
@@ -3,16 +3,63 @@ Vertex AI Service for Gemini 2.0 Flash integration
 Handles embeddings generation and natural language query responses
 """
 
+import json
 import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 import vertexai
 from vertexai.generative_models import GenerativeModel, Part
-from vertexai.language_models import TextEmbeddingModel
+from google.api_core import exceptions as google_exceptions
+from services.embedding_cache import embedding_cache
+from services.query_embedding_cache import query_embedding_cache
+from services.embedding_backend import create_embedding_backend
 import config
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rough characters-per-token ratio used to size requests without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Digits, separators and short codes in CSV text tokenize far denser than
+# prose, so embedding batches are sized with a conservative ratio to stay
+# under the per-request token limit
+BATCH_CHARS_PER_TOKEN = 2
+
+# Errors worth retrying: quota, overload and transient server failures
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError
+)
+
+
+def estimate_tokens(text, chars_per_token=CHARS_PER_TOKEN):
+    """Estimate the token count of a text from its length"""
+    return int(len(text) // chars_per_token) + 1
+
+
+def extract_chart_config(text):
+    """
+    Extract the chart JSON block the prompts ask Gemini to append
+    
+    Returns:
+        dict: Chart configuration, or None if the answer has no valid one
+    """
+    match = re.search(r'```json\s*(\{.*?\})\s*```', text or '', re.DOTALL)
+    if not match:
+        return None
+    
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
 
 class VertexAIService:
     def __init__(self):
@@ -29,7 +76,19 @@ class VertexAIService:
             
             # Initialize models
             self.gemini_model = GenerativeModel(config.GEMINI_MODEL)
-            self.embedding_model = TextEmbeddingModel.from_pretrained(config.EMBEDDING_MODEL)
+            self.embedding_backend = create_embedding_backend()
+            
+            # Shared pool bounds concurrent embedding requests across callers
+            self.embedding_executor = ThreadPoolExecutor(
+                max_workers=config.EMBEDDING_CONCURRENCY,
+                thread_name_prefix='embedding'
+            )
+            
+            # Shared pool bounds concurrent Gemini calls from batch queries
+            self.generation_executor = ThreadPoolExecutor(
+                max_workers=config.QUERY_BATCH_CONCURRENCY,
+                thread_name_prefix='generation'
+            )
             
             logger.info(f"Vertex AI initialized successfully with project: {config.GCP_PROJECT_ID}")
             
@@ -55,36 +114,203 @@ class VertexAIService:
             if isinstance(texts, str):
                 texts = [texts]
             
-            logger.info(f"Generating embeddings for {len(texts)} texts")
+            # Serve repeated texts from the persistent cache
+            model = self.embedding_backend.model
+            cached = embedding_cache.get_many(model, texts) if embedding_cache else {}
+            missing = [i for i in range(len(texts)) if i not in cached]
             
-            # Generate embeddings
-            embeddings = self.embedding_model.get_embeddings(texts)
+            vectors = [cached.get(i) for i in range(len(texts))]
             
-            # Extract vectors
-            vectors = [embedding.values for embedding in embeddings]
+            if missing:
+                # Embed each distinct uncached text once
+                missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+                new_vectors = self._embed_texts(missing_texts)
+                
+                vectors_by_text = dict(zip(missing_texts, new_vectors))
+                for i in missing:
+                    vectors[i] = vectors_by_text[texts[i]]
+                
+                if embedding_cache:
+                    embedding_cache.put_many(model, missing_texts, new_vectors)
             
-            logger.info(f"Generated {len(vectors)} embeddings successfully")
+            logger.info(f"Generated {len(vectors)} embeddings successfully ({len(cached)} from cache)")
             return vectors
             
         except Exception as e:
             logger.error(f"Error generating embeddings: {str(e)}")
             raise
 
-    def generate_response(self, prompt, context=None):
+    def generate_query_embedding(self, query):
         """
-        Generate AI response using Gemini 2.0 Flash
+        Generate the embedding of a user question, served from the in-memory
+        query cache when the same question was asked recently
+        
+        Args:
+            query (str): Question text
+            
+        Returns:
+            list: Embedding vector
+        """
+        return self.generate_query_embeddings([query])[0]
+
+    def generate_query_embeddings(self, queries):
+        """
+        Generate the embeddings of several user questions, embedding the
+        ones missing from the query cache in a single batched call
+        
+        Args:
+            queries (list): Question texts
+            
+        Returns:
+            list: Embedding vectors, in input order
+        """
+        model = self.embedding_backend.model
+        vectors = [query_embedding_cache.get(model, query) for query in queries]
+        
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            new_vectors = self.generate_embeddings([queries[i] for i in missing])
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+                query_embedding_cache.put(model, queries[i], vector)
+        
+        return vectors
+
+    def _embed_texts(self, texts):
+        """
+        Embed texts through the model in concurrent, request-sized batches
+        (local backends embed everything in one call)
+        
+        Args:
+            texts (list): List of text strings to embed
+            
+        Returns:
+            list: List of embedding vectors, in input order
+        """
+        if not self.embedding_backend.remote:
+            return self.embedding_backend.embed(texts)
+        
+        batches = self._batch_texts(texts)
+        logger.info(f"Requesting embeddings for {len(texts)} texts in {len(batches)} batches")
+        
+        # Dispatch batches concurrently; futures are collected in input order
+        if len(batches) == 1:
+            results = [self._embed_batch(batches[0])]
+        else:
+            futures = [self.embedding_executor.submit(self._embed_batch, batch) for batch in batches]
+            results = [future.result() for future in futures]
+        
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def _batch_texts(self, texts):
+        """
+        Split texts into request-sized batches, bounded by both the number of
+        texts and the estimated token total
+        
+        Args:
+            texts (list): Texts to embed
+            
+        Returns:
+            list: List of text batches, in input order
+        """
+        batches = []
+        current = []
+        current_tokens = 0
+        
+        for text in texts:
+            tokens = estimate_tokens(text, BATCH_CHARS_PER_TOKEN)
+            
+            if current and (
+                len(current) >= config.EMBEDDING_BATCH_SIZE or
+                current_tokens + tokens > config.EMBEDDING_BATCH_TOKENS
+            ):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            
+            current.append(text)
+            current_tokens += tokens
+        
+        if current:
+            batches.append(current)
+        
+        return batches
+
+    def _embed_batch(self, texts):
+        """
+        Embed one batch, retrying transient errors with exponential backoff
+        
+        A batch the API rejects as invalid (e.g. over the request token limit
+        because the estimate was low) is split in half and each half retried.
+        
+        Args:
+            texts (list): Batch of texts
+            
+        Returns:
+            list: Embedding vectors for the batch
+        """
+        for attempt in range(config.EMBEDDING_MAX_RETRIES + 1):
+            try:
+                return self.embedding_backend.embed(texts)
+                
+            except google_exceptions.InvalidArgument as e:
+                if len(texts) == 1:
+                    raise
+                
+                middle = len(texts) // 2
+                logger.warning(f"Embedding batch of {len(texts)} rejected ({str(e)}), splitting it in two")
+                return self._embed_batch(texts[:middle]) + self._embed_batch(texts[middle:])
+                
+            except RETRYABLE_ERRORS as e:
+                if attempt == config.EMBEDDING_MAX_RETRIES:
+                    raise
+                
+                delay = config.EMBEDDING_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+                delay += random.uniform(0, delay / 2)
+                logger.warning(f"Embedding batch of {len(texts)} failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def generate_text(self, prompt, on_token=None):
+        """
+        Run a Gemini completion, optionally streaming it
+        
+        Args:
+            prompt (str): Full prompt
+            on_token (callable, optional): Called with each text fragment as
+                it arrives; the completion is streamed when given
+            
+        Returns:
+            str: Complete response text
+        """
+        if on_token is None:
+            return self.gemini_model.generate_content(prompt).text
+        
+        parts = []
+        for chunk in self.gemini_model.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text (e.g. only a finish reason)
+                continue
+            if text:
+                parts.append(text)
+                on_token(text)
+        
+        return ''.join(parts)
+
+    def build_prompt(self, prompt, context=None):
+        """
+        Build the full prompt generate_response sends for a question
         
         Args:
             prompt (str): User's query
             context (str, optional): Additional context for the query
             
         Returns:
-            str: AI-generated response
+            str: Full prompt
         """
-        try:
-            # Build the full prompt
-            if context:
-                full_prompt = f"""You are a helpful data analyst assistant. Use the following context to answer the user's question.
+        if context:
+            return f"""You are a helpful data analyst assistant. Use the following context to answer the user's question.
 
 Context:
 {context}
@@ -111,16 +337,30 @@ The JSON format must be compatible with Recharts and follow this structure:
 ```
 
 If no chart is needed, do NOT include any JSON."""
-            else:
-                full_prompt = prompt
+        
+        return prompt
+
+    def generate_response(self, prompt, context=None, on_token=None):
+        """
+        Generate AI response using Gemini 2.0 Flash
+        
+        Args:
+            prompt (str): User's query
+            context (str, optional): Additional context for the query
+            on_token (callable, optional): Called with each text fragment as
+                the response streams in
+            
+        Returns:
+            str: AI-generated response
+        """
+        try:
+            # Build the full prompt
+            full_prompt = self.build_prompt(prompt, context)
             
             logger.info("Generating AI response")
             
             # Generate response
-            response = self.gemini_model.generate_content(full_prompt)
-            
-            # Extract text from response
-            response_text = response.text
+            response_text = self.generate_text(full_prompt, on_token)
             
             logger.info("AI response generated successfully")
             return response_text
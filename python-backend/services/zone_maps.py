@@ -0,0 +1,303 @@
+"""
+Zone Maps
+Per-chunk min/max and small value sets recorded as chunk metadata, and the
+question predicates (date ranges, categories, numeric bounds) that use them
+to skip chunks that cannot match
+"""
+
+import calendar
+import logging
+import re
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from services.profile_sketch import ColumnSketch, NUMERIC, DATETIME, CATEGORICAL
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Longest categorical value recorded; longer values make a chunk's set incomplete
+MAX_VALUE_CHARS = 64
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+
+_DATE = r'(\d{4}-\d{1,2}-\d{1,2}|(?:' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\.?\s+\d{4}|\d{4})'
+_COMPARISONS = [
+    (r'>=|at least|no less than', '$gte'),
+    (r'<=|at most|no more than', '$lte'),
+    (r'>|over|above|greater than|more than|higher than|exceeding', '$gt'),
+    (r'<|under|below|less than|lower than|fewer than', '$lt')
+]
+
+
+def min_key(column):
+    return f"min:{column}"
+
+
+def max_key(column):
+    return f"max:{column}"
+
+
+def value_key(column, value):
+    return f"has:{column}={value}"
+
+
+def complete_key(column):
+    """True when every value of the column in the chunk is listed under value keys"""
+    return f"set:{column}"
+
+
+def build_zone_maps(df, bounds):
+    """
+    Compute the zone map of each chunk of a dataframe
+
+    Numeric and date columns get min/max (dates as Unix seconds, since
+    ChromaDB only compares numbers); text and categorical columns get a
+    flag per value when the chunk holds at most config.ZONE_MAP_MAX_VALUES
+    distinct values.
+
+    Args:
+        df (pd.DataFrame): Rows being chunked
+        bounds (list): (start, end) row index pairs, one per chunk
+
+    Returns:
+        list: Metadata dict for each chunk
+    """
+    zone_maps = [{} for _ in bounds]
+    if not bounds or df.empty:
+        return zone_maps
+
+    first, last = bounds[0][0], bounds[-1][1]
+    labels = np.repeat(np.arange(len(bounds)), [end - start for start, end in bounds])
+
+    for col in df.columns:
+        series = df[col].iloc[first:last]
+        kind = ColumnSketch.kind_of(series)
+        name = str(col)
+
+        if kind in (NUMERIC, DATETIME):
+            if kind == DATETIME:
+                series = _to_seconds(series)
+            grouped = series.groupby(labels).agg(['min', 'max']).dropna()
+            for chunk_index, low, high in zip(grouped.index, grouped['min'], grouped['max']):
+                zone_maps[chunk_index][min_key(name)] = _number(low)
+                zone_maps[chunk_index][max_key(name)] = _number(high)
+
+        else:
+            # Distinct (chunk, value) pairs; chunks with few short values list them all
+            pairs = pd.DataFrame({'chunk': labels, 'value': series.to_numpy(dtype=object)}).dropna().drop_duplicates()
+            pairs['value'] = pairs['value'].astype(str)
+            counts = np.bincount(pairs['chunk'], minlength=len(bounds))
+            listed = counts <= config.ZONE_MAP_MAX_VALUES
+            listed[pairs.loc[pairs['value'].str.len() > MAX_VALUE_CHARS, 'chunk'].to_numpy()] = False
+
+            key = complete_key(name)
+            for chunk_index, complete in enumerate(listed.tolist()):
+                zone_maps[chunk_index][key] = complete
+
+            pairs = pairs[listed[pairs['chunk'].to_numpy()]]
+            for chunk_index, value in zip(pairs['chunk'], pairs['value']):
+                zone_maps[chunk_index][value_key(name, value)] = True
+
+    return zone_maps
+
+
+def column_info(sketches):
+    """
+    Describe a dataset's columns for predicate extraction
+
+    Args:
+        sketches (list): TableSketch of each table (sheet) of the dataset
+
+    Returns:
+        dict: {column: {'kind', 'min', 'max'}} for numeric and date columns
+        (dates in Unix seconds) and {column: {'kind', 'values'}} for text
+        columns with group summaries (at most config.SUMMARY_MAX_GROUPS values)
+    """
+    info = {}
+    for sketch in sketches:
+        groups = sketch.group_summary()
+        for col, column in sketch.columns.items():
+            name = str(col)
+
+            if column.kind in (NUMERIC, DATETIME) and column.count:
+                # Datetime sketches hold nanoseconds; zone maps use seconds
+                low, high = (column.min // 10 ** 9, column.max // 10 ** 9) if column.kind == DATETIME else (column.min, column.max)
+                entry = info.setdefault(name, {'kind': column.kind, 'min': _number(low), 'max': _number(high)})
+                if entry['kind'] == column.kind:
+                    entry['min'] = min(entry['min'], _number(low))
+                    entry['max'] = max(entry['max'], _number(high))
+
+            elif column.kind == CATEGORICAL and col in groups:
+                entry = info.setdefault(name, {'kind': CATEGORICAL, 'values': []})
+                if entry['kind'] == CATEGORICAL:
+                    entry['values'] = sorted(set(entry['values']) | {str(group['value']) for group in groups[col]})
+
+    return info
+
+
+def extract_predicates(question, info):
+    """
+    Find predicates in a question that zone maps can evaluate
+
+    - categorical values of the dataset mentioned in the question
+    - dates: "2024", "March 2024", "2024-03-15", optionally with
+      before/after/since/until or between ... and ...
+    - numeric bounds next to a column name: "unit price over 100"
+
+    Date predicates apply to the only date column, or to date columns
+    named in the question.
+
+    Args:
+        question (str): User question
+        info (dict): Dataset column info (the manifest's zoneMaps)
+
+    Returns:
+        list: Predicates {'column', 'op', 'value'}; op is 'in' (list of
+        values), or a ChromaDB comparison on the column's min/max
+    """
+    predicates = []
+    if not info:
+        return predicates
+
+    text = question.lower()
+
+    for name, column in info.items():
+        if column['kind'] != CATEGORICAL or not column.get('values'):
+            continue
+        mentioned = [
+            value for value in column['values']
+            if len(value) > 1 and not value.isdigit() and re.search(r'(?<!\w)' + re.escape(value.lower()) + r'(?!\w)', text)
+        ]
+        if mentioned:
+            predicates.append({'column': name, 'op': 'in', 'value': mentioned})
+
+    for name, column in info.items():
+        if column['kind'] != NUMERIC:
+            continue
+        for pattern, op in _COMPARISONS:
+            match = re.search(
+                _column_pattern(name) + r'\s*(?:is\s+|was\s+|of\s+)?(?:' + pattern + r')\s*\$?(-?[\d,]*\.?\d+)', text
+            )
+            if match:
+                predicates.append({'column': name, 'op': op, 'value': float(match.group(1).replace(',', ''))})
+                break
+
+    date_columns = [name for name, column in info.items() if column['kind'] == DATETIME]
+    named = [name for name in date_columns if re.search(_column_pattern(name), text)]
+    targets = named or (date_columns if len(date_columns) == 1 else [])
+    for name in targets:
+        predicates.extend(_date_predicates(text, name, info[name]))
+
+    return predicates
+
+
+def predicates_to_where(predicates):
+    """
+    Translate predicates into ChromaDB where clauses on zone-map metadata
+
+    A chunk is kept when its range overlaps the predicate, or when it lists
+    one of the wanted values (or its value set is incomplete).
+
+    Returns:
+        list: Where clauses, to be combined with $and
+    """
+    clauses = []
+    for predicate in predicates:
+        name, op, value = predicate['column'], predicate['op'], predicate['value']
+
+        if op == 'in':
+            options = [{value_key(name, v): True} for v in value] + [{complete_key(name): False}]
+            clauses.append({'$or': options})
+        elif op in ('$gt', '$gte'):
+            clauses.append({max_key(name): {op: value}})
+        elif op in ('$lt', '$lte'):
+            clauses.append({min_key(name): {op: value}})
+
+    return clauses
+
+
+def matches(metadata, predicates):
+    """Evaluate predicates against one chunk's metadata (same rules as predicates_to_where)"""
+    for predicate in predicates:
+        name, op, value = predicate['column'], predicate['op'], predicate['value']
+
+        if op == 'in':
+            if metadata.get(complete_key(name)) is not False and not any(metadata.get(value_key(name, v)) for v in value):
+                return False
+            continue
+
+        bound = metadata.get(max_key(name) if op in ('$gt', '$gte') else min_key(name))
+        if bound is None:
+            return False
+        if (op == '$gt' and not bound > value) or (op == '$gte' and not bound >= value) or \
+                (op == '$lt' and not bound < value) or (op == '$lte' and not bound <= value):
+            return False
+
+    return True
+
+
+def _date_predicates(text, name, column):
+    # Dates outside the column's range are more likely quantities than years
+    def parse(token):
+        token = token.strip().rstrip('.')
+        if re.fullmatch(r'\d{4}-\d{1,2}-\d{1,2}', token):
+            day = datetime.strptime(token, '%Y-%m-%d')
+            return day, day.replace(hour=23, minute=59, second=59)
+        parts = token.replace('.', ' ').split()
+        if len(parts) == 2:
+            year, month = int(parts[1]), MONTHS[parts[0]]
+            last = calendar.monthrange(year, month)[1]
+            return datetime(year, month, 1), datetime(year, month, last, 23, 59, 59)
+        year = int(parts[0])
+        return datetime(year, 1, 1), datetime(year, 12, 31, 23, 59, 59)
+
+    def seconds(value):
+        return int(pd.Timestamp(value).timestamp())
+
+    def plausible(start, end):
+        return seconds(end) >= column['min'] - 366 * 86400 and seconds(start) <= column['max'] + 366 * 86400
+
+    between = re.search(r'(?:between|from)\s+' + _DATE + r'\s+(?:and|to|through|until)\s+' + _DATE, text)
+    if between:
+        start, end = parse(between.group(1))[0], parse(between.group(2))[1]
+        if plausible(start, end):
+            return [{'column': name, 'op': '$lte', 'value': seconds(end)}, {'column': name, 'op': '$gte', 'value': seconds(start)}]
+
+    bounded = re.search(r'(before|until|after|since)\s+' + _DATE, text)
+    if bounded:
+        start, end = parse(bounded.group(2))
+        if plausible(start, end):
+            if bounded.group(1) in ('before', 'until'):
+                return [{'column': name, 'op': '$lt' if bounded.group(1) == 'before' else '$lte',
+                         'value': seconds(start if bounded.group(1) == 'before' else end)}]
+            return [{'column': name, 'op': '$gt' if bounded.group(1) == 'after' else '$gte',
+                     'value': seconds(end if bounded.group(1) == 'after' else start)}]
+
+    for match in re.finditer(r'(?<![\w-])' + _DATE + r'(?![\w-])', text):
+        start, end = parse(match.group(1))
+        if plausible(start, end):
+            return [{'column': name, 'op': '$lte', 'value': seconds(end)}, {'column': name, 'op': '$gte', 'value': seconds(start)}]
+
+    return []
+
+
+def _column_pattern(name):
+    # "UnitPrice", "unit_price" and "Unit Price" all match "unit price" / "unitprice"
+    words = re.findall(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+', str(name))
+    if not words:
+        return re.escape(str(name).lower())
+    return r'(?<!\w)' + r'[\s_-]?'.join(re.escape(word.lower()) for word in words) + r'(?!\w)'
+
+
+def _to_seconds(series):
+    # Nanosecond, microsecond or second resolution all map to Unix seconds
+    values = series.dt.tz_localize(None) if getattr(series.dt, 'tz', None) is not None else series
+    return values.astype('datetime64[s]').astype('int64').where(series.notna())
+
+
+def _number(value):
+    value = value.item() if hasattr(value, 'item') else value
+    return int(value) if float(value).is_integer() and abs(value) < 2 ** 53 else float(value)
@@ -0,0 +1,29 @@
+"""
+Shared test setup
+
+Services create their global instances at import time from config, so every
+local store is pointed at a temporary directory, and embeddings use the
+offline hashing backend, before anything from the backend is imported.
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATA_DIR = tempfile.mkdtemp(prefix='python-backend-tests-')
+
+for name, path in {
+    'CHROMADB_PERSIST_DIR': 'chromadb_data',
+    'KEYWORD_INDEX_DIR': 'keyword_index',
+    'DATASET_STORE_DIR': 'dataset_store',
+    'SHARED_CACHE_DIR': 'shared_cache',
+    'EMBEDDING_CACHE_PATH': 'embedding_cache/embeddings.sqlite3',
+    'JOB_STORE_PATH': 'job_store/jobs.sqlite3'
+}.items():
+    os.environ.setdefault(name, os.path.join(TEST_DATA_DIR, path))
+
+os.environ.setdefault('EMBEDDING_BACKEND', 'hashing')
+os.environ.setdefault('EMBEDDING_CACHE_ENABLED', 'False')
+
+sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,63 @@
+from services import AnswerCache
+
+QUESTION = [1.0, 0.0, 0.0]
+SIMILAR = [0.99, 0.05, 0.0]
+DIFFERENT = [0.0, 1.0, 0.0]
+
+
+def test_similar_question_in_the_same_scope_hits():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, threshold=0.97)
+    scope = cache.scope('u1', {'ds1': 1})
+    cache.put(scope, QUESTION, {'answer': 'forty two'})
+
+    answer, similarity = cache.get(scope, SIMILAR)
+
+    assert answer == {'answer': 'forty two'}
+    assert similarity >= 0.97
+    assert cache.get(scope, DIFFERENT) == (None, None)
+
+
+def test_scope_separates_users_sources_and_versions():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, threshold=0.97)
+    cache.put(cache.scope('u1', {'ds1': 1, 'conn1': None}), QUESTION, {'answer': 'a'})
+
+    assert cache.get(cache.scope('u1', {'conn1': None, 'ds1': 1}), QUESTION)[0] == {'answer': 'a'}
+    assert cache.get(cache.scope('u2', {'ds1': 1, 'conn1': None}), QUESTION)[0] is None
+    assert cache.get(cache.scope('u1', {'ds1': 2, 'conn1': None}), QUESTION)[0] is None
+    assert cache.get(cache.scope('u1', {'ds1': 1}), QUESTION)[0] is None
+
+
+def test_invalidate_drops_every_answer_using_the_source():
+    cache = AnswerCache(max_entries=10, ttl_seconds=60, threshold=0.97)
+    both = cache.scope('u1', {'ds1': 1, 'ds2': 1})
+    other = cache.scope('u1', {'ds2': 1})
+    cache.put(both, QUESTION, {'answer': 'both'})
+    cache.put(other, QUESTION, {'answer': 'other'})
+
+    cache.invalidate('ds1')
+
+    assert cache.get(both, QUESTION)[0] is None
+    assert cache.get(other, QUESTION)[0] == {'answer': 'other'}
+    assert cache.get_stats()['entries'] == 1
+
+
+def test_expired_and_evicted_entries_miss():
+    expired = AnswerCache(max_entries=10, ttl_seconds=-1, threshold=0.97)
+    scope = expired.scope('u1', {'ds1': 1})
+    expired.put(scope, QUESTION, {'answer': 'old'})
+    assert expired.get(scope, QUESTION)[0] is None
+
+    small = AnswerCache(max_entries=1, ttl_seconds=60, threshold=0.97)
+    small.put(scope, QUESTION, {'answer': 'first'})
+    small.put(scope, DIFFERENT, {'answer': 'second'})
+    assert small.get(scope, QUESTION)[0] is None
+    assert small.get(scope, DIFFERENT)[0] == {'answer': 'second'}
+    assert small.get_stats()['evictions'] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = AnswerCache(max_entries=0, ttl_seconds=60, threshold=0.97)
+    scope = cache.scope('u1', {'ds1': 1})
+    cache.put(scope, QUESTION, {'answer': 'a'})
+
+    assert cache.get(scope, QUESTION) == (None, None)
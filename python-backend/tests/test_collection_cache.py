@@ -0,0 +1,72 @@
+import pytest
+from services import ChromaDBService
+from services.chromadb_service import CollectionCache, collection_cache
+
+
+@pytest.fixture
+def chromadb():
+    return ChromaDBService()
+
+
+@pytest.fixture
+def dataset(chromadb, request):
+    dataset_id = f"cache_{request.node.name}"
+    collection = chromadb.create_collection(dataset_id)
+    yield dataset_id, collection
+    chromadb.delete_collection(dataset_id)
+
+
+def add(chromadb, collection, ids):
+    chromadb.add_documents(collection, [f"row {i}" for i in ids], [[float(i), 1.0] for i in ids], ids=[f"doc_{i}" for i in ids])
+
+
+def test_entries_expire_after_the_ttl():
+    cache = CollectionCache(ttl_seconds=0)
+    cache.put('dataset_a', object(), count=3)
+
+    assert cache.get('dataset_a') is None
+    assert cache.get_stats()['misses'] == 1
+
+
+def test_unknown_counts_stay_unknown():
+    cache = CollectionCache(ttl_seconds=60)
+    cache.put('dataset_a', object())
+    cache.adjust_count('dataset_a', 5)
+
+    assert cache.get('dataset_a')['count'] is None
+
+
+def test_lookups_after_the_first_skip_the_client(chromadb, dataset, monkeypatch):
+    dataset_id, collection = dataset
+    collection_cache.invalidate(collection.name)
+    lookups = []
+    get_collection = chromadb.client.get_collection
+    monkeypatch.setattr(chromadb.client, 'get_collection', lambda **kwargs: lookups.append(kwargs) or get_collection(**kwargs))
+
+    first = chromadb.get_collection(dataset_id)
+    second = chromadb.get_collection(dataset_id)
+
+    assert first is second
+    assert len(lookups) == 1
+
+
+def test_counts_follow_writes_from_this_process(chromadb, dataset):
+    dataset_id, collection = dataset
+    add(chromadb, collection, [0, 1])
+    assert chromadb.get_collection_count(collection) == 2
+
+    add(chromadb, collection, [2])
+    assert collection_cache.get(collection.name)['count'] == 3
+
+    chromadb.delete_documents(collection, ['doc_0'])
+    assert collection_cache.get(collection.name)['count'] is None
+    assert chromadb.get_collection_count(collection) == 2
+
+
+def test_deleted_collection_is_not_served_from_the_cache(chromadb, dataset):
+    dataset_id, _ = dataset
+    assert chromadb.get_collection(dataset_id) is not None
+
+    chromadb.delete_collection(dataset_id)
+
+    assert chromadb.get_collection(dataset_id) is None
@@ -0,0 +1,72 @@
+from services.context_builder import adaptive_cutoff, assemble_context
+from services.vertex_ai_service import estimate_tokens
+
+
+def search(distances):
+    ids = [f"c{i}" for i in range(len(distances))]
+    return {'ids': ids, 'documents': ids, 'metadatas': [{} for _ in ids], 'distances': distances}
+
+
+def chunk(start_row, rows, header='Columns: Product, Region, Units'):
+    return header + '\n\n' + '\n'.join(rows), {'start_row': start_row, 'end_row': start_row + len(rows) - 1}
+
+
+def results(*chunks):
+    return {'documents': [doc for doc, _ in chunks], 'metadatas': [metadata for _, metadata in chunks]}
+
+
+def test_cutoff_keeps_results_close_to_the_best():
+    assert adaptive_cutoff(search([0.10, 0.11, 0.30, 0.31]), ratio=1.2, max_k=8)['ids'] == ['c0', 'c1']
+    assert adaptive_cutoff(search([0.10, 0.11, 0.115]), ratio=1.2, max_k=2)['ids'] == ['c0', 'c1']
+    assert adaptive_cutoff(search([0.5, 2.0]), ratio=1.2, max_k=8)['ids'] == ['c0']
+
+
+def test_cutoff_without_distances_keeps_max_k():
+    keyword = {'ids': ['a', 'b', 'c'], 'documents': ['a', 'b', 'c'], 'metadatas': [{}, {}, {}]}
+
+    assert adaptive_cutoff(keyword, max_k=2)['ids'] == ['a', 'b']
+
+
+def test_summaries_come_first_and_everything_fits_a_large_budget():
+    rows = results(chunk(0, ['Lamp | North | 3', 'Chair | South | 5']))
+
+    context, stats = assemble_context('units by region', ['Units by Region: North 3, South 5'], rows, budget=1000)
+
+    assert context.startswith('Dataset summary (exact aggregates over all rows):\nUnits by Region')
+    assert 'Data chunk (rows 0-1):\nColumns: Product, Region, Units\n\nLamp | North | 3\nChair | South | 5' in context
+    assert stats['summariesUsed'] == 1 and stats['rowsUsed'] == 2 and stats['rowsDropped'] == 0
+
+
+def test_overlapping_chunks_do_not_repeat_rows():
+    rows = results(
+        chunk(0, ['Lamp | North | 3', 'Chair | South | 5']),
+        chunk(1, ['Chair | South | 5', 'Desk | East | 2'])
+    )
+
+    context, stats = assemble_context('units', [], rows, budget=1000)
+
+    assert context.count('Chair | South | 5') == 1
+    assert stats['duplicateRows'] == 1 and stats['rowsUsed'] == 3
+
+
+def test_budget_drops_the_least_relevant_rows_first():
+    filler = [f"Widget {i} | West | {i}" for i in range(40)]
+    wanted = 'Smart Coffee Maker | North | 12'
+    rows = results(chunk(0, filler[:20] + [wanted] + filler[20:]))
+    budget = 60
+
+    context, stats = assemble_context('units of smart coffee maker', [], rows, budget=budget)
+
+    assert wanted in context
+    assert stats['rowsDropped'] > 0
+    assert stats['rowsUsed'] + stats['rowsDropped'] == 41
+    assert estimate_tokens(context) <= budget + stats['chunksUsed']
+
+
+def test_kept_rows_stay_in_file_order_under_their_dataset():
+    doc, metadata = chunk(10, ['North | 1', 'South | 2', 'North | 3'])
+    rows = results((doc, {**metadata, 'dataset': 'sales.csv'}))
+
+    context, _ = assemble_context('north', [], rows, budget=1000)
+
+    assert context == 'Data chunk from sales.csv (rows 10-12):\nColumns: Product, Region, Units\n\nNorth | 1\nSouth | 2\nNorth | 3'
@@ -0,0 +1,171 @@
+import io
+import pandas as pd
+import pytest
+import config
+from services import DataProcessor
+
+
+@pytest.fixture
+def processor():
+    return DataProcessor()
+
+
+def read_csv(text):
+    return pd.read_csv(io.StringIO(text))
+
+
+def test_optimize_dtypes_compacts_losslessly(processor):
+    df = pd.DataFrame({
+        'id': range(1000),
+        'price': [0.5, 1.25] * 500,
+        'ratio': [0.1, 0.2] * 500,
+        'region': ['North', 'South'] * 500
+    })
+
+    optimized = processor.optimize_dtypes(df)
+
+    assert str(optimized['id'].dtype) == 'int16'
+    assert str(optimized['price'].dtype) == 'float32'
+    assert str(optimized['ratio'].dtype) == 'float64'
+    assert str(optimized['region'].dtype) == 'category'
+    assert optimized.attrs['memory']['bytes_after'] < optimized.attrs['memory']['bytes_before']
+    assert processor.render_rows(optimized) == processor.render_rows(df)
+
+
+def test_dates_render_as_they_appear_in_the_file(processor):
+    df = read_csv("iso,us,stamp\n2024-01-02,01/02/2024,2024-01-02 00:00:00\n2024-03-15,03/15/2024,2024-03-15 08:30:00\n")
+
+    optimized = processor.optimize_dtypes(df)
+
+    assert all(pd.api.types.is_datetime64_dtype(optimized[col]) for col in ('iso', 'us', 'stamp'))
+    assert processor.render_rows(optimized) == processor.render_rows(df)
+
+
+def test_ambiguous_day_month_dates_stay_text(processor):
+    df = read_csv("day_first\n01/02/2024\n05/03/2024\n12/11/2024\n")
+
+    optimized = processor.optimize_dtypes(df)
+
+    assert not pd.api.types.is_datetime64_dtype(optimized['day_first'])
+    assert processor.render_rows(optimized)[0] == 'day_first: 01/02/2024'
+
+
+def test_day_first_dates_are_parsed_when_unambiguous(processor):
+    df = read_csv("day_first\n01/02/2024\n25/03/2024\n")
+
+    optimized = processor.optimize_dtypes(df)
+
+    assert optimized['day_first'].tolist() == [pd.Timestamp('2024-02-01'), pd.Timestamp('2024-03-25')]
+    assert processor.render_rows(optimized) == processor.render_rows(df)
+
+
+def test_dates_that_do_not_round_trip_stay_text(processor):
+    df = read_csv("unpadded\n1/2/2024\n3/15/2024\n")
+
+    optimized = processor.optimize_dtypes(df)
+
+    assert not pd.api.types.is_datetime64_dtype(optimized['unpadded'])
+    assert processor.render_rows(optimized) == ['unpadded: 1/2/2024', 'unpadded: 3/15/2024']
+
+
+def test_streamed_batches_render_like_the_whole_file(processor, monkeypatch):
+    lines = ['order,day_first,region,amount']
+    for i in range(600):
+        # The first batch alone cannot tell day-first from month-first
+        day = (i % 12) + 1 if i < 200 else (i % 28) + 1
+        lines.append(f"{i},{day:02d}/{(i % 12) + 1:02d}/2024,{'NS'[i % 2]},{i / 4}")
+    text = '\n'.join(lines) + '\n'
+
+    class Response:
+        def __init__(self):
+            self.raw = io.BytesIO(text.encode())
+            self.content = text.encode()
+
+        def raise_for_status(self):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    monkeypatch.setattr('services.data_processor.requests.get', lambda url, stream=False: Response())
+    monkeypatch.setattr(config, 'OPTIMIZE_DTYPES', True)
+
+    whole = processor.read_file('http://files/orders.csv', 'orders.csv')
+    batches = [batch for _, batch in processor.read_file_batches('http://files/orders.csv', 'orders.csv', batch_size=200)]
+
+    assert [str(dtype) for dtype in batches[0].dtypes] == [str(dtype) for dtype in batches[-1].dtypes]
+    assert sum((processor.render_rows(batch) for batch in batches), []) == processor.render_rows(whole)
+
+
+def table(rows, columns):
+    return pd.DataFrame({f"col_{j}": [f"value {i}-{j}" for i in range(rows)] for j in range(columns)})
+
+
+def test_chunks_fill_between_half_and_all_of_the_token_target(processor):
+    chunks = processor.chunk_dataframe(table(2000, 4), target_tokens=400)
+
+    assert all(200 <= chunk['token_count'] <= 400 for chunk in chunks[:-1])
+    assert chunks[-1]['token_count'] <= 400
+    assert [chunk['start_row'] for chunk in chunks[1:]] == [chunk['end_row'] for chunk in chunks[:-1]]
+    assert chunks[-1]['end_row'] == 2000
+
+
+def test_wide_tables_get_fewer_rows_per_chunk(processor):
+    narrow = processor.chunk_dataframe(table(1000, 2), target_tokens=400)
+    wide = processor.chunk_dataframe(table(1000, 12), target_tokens=400)
+
+    assert len(wide) > 3 * len(narrow)
+    assert max(chunk['row_count'] for chunk in wide) < min(chunk['row_count'] for chunk in narrow[:-1])
+
+
+def test_chunk_size_limits(processor, monkeypatch):
+    monkeypatch.setattr(config, 'MAX_CHUNK_SIZE', 10)
+    monkeypatch.setattr(config, 'EMBEDDING_MAX_INPUT_TOKENS', 300)
+
+    assert max(chunk['row_count'] for chunk in processor.chunk_dataframe(table(200, 1), target_tokens=400)) == 10
+
+    monkeypatch.setattr(config, 'MAX_CHUNK_SIZE', 1000)
+    assert max(chunk['token_count'] for chunk in processor.chunk_dataframe(table(200, 4), target_tokens=4000)) <= 300
+
+
+def test_fixed_chunk_size_disables_adaptive_sizing(processor):
+    chunks = processor.chunk_dataframe(table(25, 4), chunk_size=10)
+
+    assert [(chunk['start_row'], chunk['end_row']) for chunk in chunks] == [(0, 10), (10, 20), (20, 25)]
+
+
+def test_compact_encoding_names_columns_once(processor):
+    df = pd.DataFrame({'Product': ['Lamp', 'Chair'], 'Units': [3, 5]})
+
+    verbose = processor.dataframe_to_text(df, encoding='verbose')
+    compact = processor.dataframe_to_text(df, encoding='compact')
+
+    assert verbose == 'Data rows 0 to 1:\nColumns: Product, Units\n\nProduct: Lamp | Units: 3\nProduct: Chair | Units: 5'
+    assert compact == 'Data rows 0 to 1:\nColumns: Product | Units\n\nLamp | 3\nChair | 5'
+
+
+def test_compact_encoding_drops_wide_text_columns(processor, monkeypatch):
+    monkeypatch.setattr(config, 'COMPACT_MAX_COLUMN_CHARS', 20)
+    df = pd.DataFrame({
+        'Product': ['Lamp', 'Chair'],
+        'Review': ['Bright enough for reading, though the switch is stiff', None],
+        'Units': [3, 5]
+    })
+
+    assert processor.wide_text_columns(df) == ['Review']
+
+    compact = processor.chunk_dataframe(df, encoding='compact')[0]
+    verbose = processor.chunk_dataframe(df, encoding='verbose')[0]
+
+    assert 'Omitted text columns: Review' in compact['text']
+    assert 'Bright' not in compact['text'] and 'Bright' in verbose['text']
+    assert compact['token_count'] < verbose['token_count']
+    assert compact['chunk_hash'] != verbose['chunk_hash']
+
+
+def test_unknown_encoding_is_rejected(processor):
+    with pytest.raises(ValueError):
+        processor.chunk_dataframe(table(5, 2), encoding='tabular')
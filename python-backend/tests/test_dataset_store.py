@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+from services.dataset_store import DatasetStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DatasetStore(base_dir=str(tmp_path))
+
+
+def test_saved_dataset_loads_back(store):
+    df = pd.DataFrame({'Region': ['North', 'South'], 'Units': [3, 5]})
+    store.save('sales', df, file_name='sales.csv')
+
+    assert store.load('sales').equals(df)
+    assert store.get_manifest('sales')['fileName'] == 'sales.csv'
+
+
+@pytest.mark.parametrize('dataset_id', ['', '.', '..', 'a/x', '../x', 'a\\x'])
+def test_ids_that_could_leave_or_share_a_directory_are_rejected(store, dataset_id):
+    with pytest.raises(ValueError):
+        store.save(dataset_id, pd.DataFrame({'a': [1]}))
+
+
+def test_ids_with_the_same_basename_stay_apart(store):
+    store.save('x', pd.DataFrame({'a': [1]}))
+
+    with pytest.raises(ValueError):
+        store.save('b/x', pd.DataFrame({'a': [2]}))
+    assert store.load('x')['a'].tolist() == [1]
@@ -0,0 +1,64 @@
+import os
+import duckdb
+import pandas as pd
+import pytest
+from services import dataset_store, duckdb_service
+
+
+@pytest.fixture(scope='module')
+def datasets():
+    dataset_store.save('sandbox_mine', pd.DataFrame({'region': ['North', 'South', 'North'], 'units': [3, 5, 7]}), file_name='sales.csv')
+    dataset_store.save('sandbox_regions', pd.DataFrame({'region': ['North', 'South'], 'manager': ['Ana', 'Ben']}), file_name='regions.csv')
+    dataset_store.save('sandbox_theirs', pd.DataFrame({'secret': ['s1', 's2']}), file_name='secret.csv')
+    yield
+    for dataset_id in ('sandbox_mine', 'sandbox_regions', 'sandbox_theirs'):
+        dataset_store.delete(dataset_id)
+
+
+def test_queries_registered_datasets(datasets):
+    df = duckdb_service.execute_query(['sandbox_mine'], 'SELECT region, SUM(units) AS units FROM sales GROUP BY 1 ORDER BY 1')
+
+    assert df.to_dict('records') == [{'region': 'North', 'units': 10}, {'region': 'South', 'units': 5}]
+
+
+def test_joins_ctes_and_subqueries_over_registered_tables(datasets):
+    sql = """
+        WITH totals AS (SELECT region, SUM(units) AS units FROM sales GROUP BY region)
+        SELECT r.manager, t.units FROM totals t JOIN regions r ON r.region = t.region
+        WHERE t.units > (SELECT MIN(units) FROM sales)
+        ORDER BY 1
+    """
+    df = duckdb_service.execute_query(['sandbox_mine', 'sandbox_regions'], sql)
+
+    assert df.to_dict('records') == [{'manager': 'Ana', 'units': 10}, {'manager': 'Ben', 'units': 5}]
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT * FROM read_parquet('{store}/*/*/*.parquet')",
+    "SELECT * FROM '{store}/sandbox_theirs/v1/part-0.parquet'",
+    "SELECT * FROM read_csv('/etc/passwd')",
+    "SELECT * FROM sales, read_text('/etc/hosts')",
+    "SELECT (SELECT COUNT(*) FROM glob('/*')) FROM sales",
+    "SELECT * FROM duckdb_settings()",
+    "SELECT * FROM information_schema.tables",
+    "SELECT * FROM secret",
+    "SELECT 1; SELECT 2",
+    "COPY sales TO '/tmp/out.csv'",
+    "ATTACH '/tmp/other.duckdb'",
+    "SET enable_external_access = true"
+])
+def test_rejects_access_outside_the_registered_tables(datasets, sql):
+    sql = sql.format(store=os.path.abspath(dataset_store.base_dir))
+
+    with pytest.raises(ValueError):
+        duckdb_service.execute_query(['sandbox_mine'], sql)
+
+
+def test_engine_cannot_read_files_even_without_validation(datasets):
+    store = os.path.abspath(dataset_store.base_dir)
+
+    with duckdb_service.session(['sandbox_mine']) as (cursor, _):
+        with pytest.raises(duckdb.Error):
+            cursor.sql(f"SELECT * FROM read_parquet('{store}/*/*/*.parquet')").fetchall()
+        with pytest.raises(duckdb.Error):
+            cursor.execute("SET enable_external_access = true")
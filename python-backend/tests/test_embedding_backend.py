@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from services.embedding_backend import (
+    BACKEND_KEY, DIMENSION_KEY, LEGACY_SIGNATURE, EmbeddingMismatchError, HashingEmbeddingBackend,
+    collection_signature, create_embedding_backend
+)
+
+
+class Collection:
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+
+@pytest.fixture
+def backend():
+    return HashingEmbeddingBackend(dimension=256)
+
+
+def cosine(a, b):
+    return float(np.dot(a, b))
+
+
+def test_vectors_are_normalized_and_deterministic(backend):
+    first = backend.embed(['Laptop sales in the North region', ''])
+    again = HashingEmbeddingBackend(dimension=256).embed(['Laptop sales in the North region'])
+
+    assert len(first[0]) == 256
+    assert np.linalg.norm(first[0]) == pytest.approx(1.0, abs=1e-5)
+    assert first[1] == [0.0] * 256
+    assert first[0] == again[0]
+
+
+def test_shared_words_and_word_parts_score_higher(backend):
+    query, related, plural, unrelated = backend.embed([
+        'laptop revenue by region', 'Region: North | Product: Laptop | Revenue: 1200',
+        'laptops', 'Customer complaint about a late delivery'
+    ])
+
+    assert cosine(query, related) > cosine(query, unrelated) + 0.2
+    assert cosine(backend.embed(['laptop'])[0], plural) > 0.3
+
+
+def test_feature_table_reset_keeps_vectors_stable(backend, monkeypatch):
+    before = backend.embed(['standing desk'])[0]
+    monkeypatch.setattr(HashingEmbeddingBackend, 'MAX_CACHED_FEATURES', 0)
+
+    assert backend.embed(['standing desk'])[0] == before
+
+
+def test_create_embedding_backend_rejects_unknown_names():
+    assert create_embedding_backend('hashing').name == 'hashing'
+    with pytest.raises(ValueError):
+        create_embedding_backend('word2vec')
+
+
+def test_collection_built_by_the_same_backend_passes(backend):
+    backend.check_collection(Collection({'dataset_id': 'sales', **backend.signature()}))
+
+
+@pytest.mark.parametrize('change', [{BACKEND_KEY: 'vertex'}, {DIMENSION_KEY: 768}])
+def test_collection_built_by_another_backend_is_rejected(backend, change):
+    with pytest.raises(EmbeddingMismatchError, match='reprocess the dataset'):
+        backend.check_collection(Collection({**backend.signature(), **change}))
+
+
+def test_collections_without_a_signature_were_built_by_vertex(backend):
+    assert collection_signature({'dataset_id': 'sales'}) == LEGACY_SIGNATURE
+    with pytest.raises(EmbeddingMismatchError):
+        backend.check_collection(Collection(None))
@@ -0,0 +1,83 @@
+import pytest
+from google.api_core import exceptions as google_exceptions
+import config
+from services.vertex_ai_service import VertexAIService
+
+
+class FakeBackend:
+    """Remote embedding backend that records each request"""
+    remote = True
+
+    def __init__(self, max_texts=None, failures=0):
+        self.max_texts = max_texts
+        self.failures = failures
+        self.requests = []
+
+    def embed(self, texts):
+        self.requests.append(list(texts))
+        if self.failures:
+            self.failures -= 1
+            raise google_exceptions.ServiceUnavailable('overloaded')
+        if self.max_texts and len(texts) > self.max_texts:
+            raise google_exceptions.InvalidArgument('request exceeds the token limit')
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = VertexAIService()
+    monkeypatch.setattr(config, 'EMBEDDING_RETRY_BACKOFF_SECONDS', 0)
+    return service
+
+
+def test_rejected_batch_is_split_until_it_fits(service):
+    service.embedding_backend = FakeBackend(max_texts=2)
+    texts = [f"row {i}" for i in range(7)]
+
+    assert service._embed_batch(texts) == [[float(len(text))] for text in texts]
+    accepted = [request for request in service.embedding_backend.requests if len(request) <= 2]
+    assert sum(accepted, []) == texts
+
+
+def test_rejected_single_text_is_not_retried(service):
+    service.embedding_backend = FakeBackend(max_texts=0.5)
+
+    with pytest.raises(google_exceptions.InvalidArgument):
+        service._embed_batch(['too long'])
+    assert len(service.embedding_backend.requests) == 1
+
+
+def test_batches_respect_the_text_and_token_limits(service, monkeypatch):
+    monkeypatch.setattr(config, 'EMBEDDING_BATCH_SIZE', 3)
+    monkeypatch.setattr(config, 'EMBEDDING_BATCH_TOKENS', 100)
+    numbers, digits = '1,2,3,4' * 20, '9' * 150
+    texts = [numbers, digits, 'a', 'b', 'c', 'd']
+
+    # 140 characters of digits and commas is 71 tokens at two characters per
+    # token, so the two long texts cannot share a 100-token batch
+    assert service._batch_texts(texts) == [[numbers], [digits, 'a', 'b'], ['c', 'd']]
+
+
+def test_transient_errors_are_retried(service):
+    service.embedding_backend = FakeBackend(failures=2)
+
+    assert service._embed_batch(['north', 'south']) == [[5.0], [5.0]]
+    assert len(service.embedding_backend.requests) == 3
+
+
+def test_retries_give_up_after_the_limit(service, monkeypatch):
+    monkeypatch.setattr(config, 'EMBEDDING_MAX_RETRIES', 1)
+    service.embedding_backend = FakeBackend(failures=5)
+
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        service._embed_batch(['north'])
+    assert len(service.embedding_backend.requests) == 2
+
+
+def test_remote_batches_are_reassembled_in_input_order(service, monkeypatch):
+    monkeypatch.setattr(config, 'EMBEDDING_BATCH_SIZE', 2)
+    service.embedding_backend = FakeBackend()
+    texts = ['a', 'bb', 'ccc', 'dddd', 'eeeee']
+
+    assert service._embed_texts(texts) == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert len(service.embedding_backend.requests) == 3
@@ -0,0 +1,48 @@
+import time
+import pytest
+from services.embedding_cache import EmbeddingCache
+
+VECTOR_BYTES = 4 * 4
+
+
+@pytest.fixture
+def cache(tmp_path):
+    # Room for ten 4-dimensional float32 vectors
+    return EmbeddingCache(path=str(tmp_path / 'embeddings.sqlite3'), max_bytes=10 * VECTOR_BYTES)
+
+
+def vector(i):
+    return [float(i), 0.5, -1.0, 2.0]
+
+
+def test_cached_vectors_round_trip_and_are_counted(cache):
+    cache.put_many('model-a', ['north', 'south'], [vector(1), vector(2)])
+
+    found = cache.get_many('model-a', ['south', 'east', 'north'])
+
+    assert found == {0: vector(2), 2: vector(1)}
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (2, 1, 2)
+    assert stats['bytes'] == 2 * VECTOR_BYTES
+
+
+def test_entries_are_keyed_by_model(cache):
+    cache.put_many('model-a', ['north'], [vector(1)])
+
+    assert cache.get_many('model-b', ['north']) == {}
+
+
+def test_least_recently_used_entries_are_evicted_first(cache):
+    texts = [f"text {i}" for i in range(10)]
+    cache.put_many('model-a', texts, [vector(i) for i in range(10)])
+
+    # Touch the two oldest entries so that they become the most recent
+    time.sleep(0.01)
+    cache.get_many('model-a', texts[:2])
+    cache.put_many('model-a', ['text 10'], [vector(10)])
+
+    stats = cache.get_stats()
+    assert stats['evictions'] > 0
+    assert stats['bytes'] <= 0.9 * cache.max_bytes
+    assert set(cache.get_many('model-a', texts[:2] + ['text 10'])) == {0, 1, 2}
+    assert cache.get_many('model-a', texts[2:4]) == {}
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pytest
+from routes import process
+from services.job_queue import Job
+
+
+def sales(rows):
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({
+        'OrderID': [f"O{i}" for i in rows],
+        'Region': rng.choice(['North', 'South', 'East', 'West'], len(rows)),
+        'Units': rng.integers(1, 50, len(rows)),
+        'Revenue': rng.integers(100, 10000, len(rows))
+    })
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    # Record what reaches the embedding backend
+    texts = []
+    generate = process.vertex_ai.generate_embeddings
+
+    def record(batch):
+        texts.extend(batch)
+        return generate(batch)
+
+    monkeypatch.setattr(process.vertex_ai, 'generate_embeddings', record)
+    return texts
+
+
+def sync(collection, dataset_id, df):
+    state = process._new_sync_state(process.chromadb.get_document_metadatas(collection))
+    chunks = process.data_processor.chunk_dataframe(df, target_tokens=400)
+    process._store_chunks(Job(dataset_id, {}), collection, dataset_id, chunks, state)
+
+    stale = [doc_id for doc_id in state['existing'] if doc_id not in state['current']]
+    process.chromadb.delete_documents(collection, stale)
+    state['deleted'] = len(stale)
+    return state, chunks
+
+
+@pytest.fixture
+def collection(request):
+    dataset_id = f"sync_{request.node.name}"
+    collection = process.chromadb.create_collection(
+        dataset_id, embedding=process.vertex_ai.embedding_backend.signature()
+    )
+    yield dataset_id, collection
+    process.chromadb.delete_collection(dataset_id)
+
+
+def test_unchanged_file_embeds_nothing(collection, embedded):
+    dataset_id, col = collection
+    df = sales(range(2000))
+
+    first, chunks = sync(col, dataset_id, df)
+    assert first['added'] == len(chunks) == len(embedded)
+
+    embedded.clear()
+    second, _ = sync(col, dataset_id, df)
+    assert embedded == []
+    assert second['unchanged'] == len(chunks)
+    assert second['added'] == second['updated'] == second['moved'] == second['deleted'] == 0
+
+
+def test_inserted_and_deleted_rows_only_embed_the_chunks_around_them(collection, embedded):
+    dataset_id, col = collection
+    df = sales(range(2000))
+    _, chunks = sync(col, dataset_id, df)
+
+    # One new row near the top, one row removed further down
+    edited = pd.concat([df.iloc[:5], sales([9999]), df.iloc[5:1000], df.iloc[1001:]], ignore_index=True)
+    embedded.clear()
+    state, new_chunks = sync(col, dataset_id, edited)
+
+    assert len(chunks) > 10
+    assert state['added'] <= 4
+    assert len(embedded) == state['added']
+    assert state['moved'] + state['unchanged'] >= len(new_chunks) - 4
+    assert state['deleted'] == state['added']
+    assert process.chromadb.get_collection(dataset_id).count() == len(new_chunks)
+
+
+def test_moved_chunks_get_their_new_row_numbers(collection):
+    dataset_id, col = collection
+    df = sales(range(2000))
+    sync(col, dataset_id, df)
+
+    shifted = pd.concat([sales([9999]), df], ignore_index=True)
+    state, chunks = sync(col, dataset_id, shifted)
+
+    assert state['moved'] > 0
+    stored = process.chromadb.get_document_metadatas(col)
+    assert sorted(metadata['start_row'] for metadata in stored.values()) == [chunk['start_row'] for chunk in chunks]
+
+
+def test_repeated_chunks_get_distinct_ids(collection, embedded):
+    dataset_id, col = collection
+    block = sales(range(300))
+    df = pd.concat([block, block], ignore_index=True)
+
+    state, chunks = sync(col, dataset_id, df)
+
+    hashes = [chunk['chunk_hash'] for chunk in chunks]
+    assert len(set(hashes)) < len(hashes)
+    assert len(state['current']) == len(chunks)
+    assert process.chromadb.get_collection(dataset_id).count() == len(chunks)
+
+
+def test_appended_row_that_widens_a_dtype_keeps_earlier_chunk_hashes():
+    processor = process.data_processor
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({
+        'sku': [f"S{i}" for i in range(3000)],
+        'qty': rng.integers(1, 100, 3000),
+        'price': rng.integers(1, 400, 3000) / 4
+    })
+    appended = pd.concat([df, pd.DataFrame({'sku': ['S3000'], 'qty': [300], 'price': [0.1]})], ignore_index=True)
+
+    before = processor.optimize_dtypes(df)
+    after = processor.optimize_dtypes(appended)
+    assert (str(before['qty'].dtype), str(before['price'].dtype)) == ('int8', 'float32')
+    assert (str(after['qty'].dtype), str(after['price'].dtype)) == ('int16', 'float64')
+
+    old = [chunk['chunk_hash'] for chunk in processor.chunk_dataframe(before, target_tokens=400)]
+    new = [chunk['chunk_hash'] for chunk in processor.chunk_dataframe(after, target_tokens=400)]
+
+    assert old[:-1] == new[:len(old) - 1]
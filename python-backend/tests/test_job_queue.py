@@ -0,0 +1,107 @@
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from services.job_queue import Job, JobQueue, COMPLETED, FAILED, RUNNING
+
+
+def wait_for(queue, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get_job(job_id)
+        if job.status in (COMPLETED, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'jobs.sqlite3')
+
+
+def test_duplicate_submission_while_running_returns_the_running_job(path):
+    queue = JobQueue(max_workers=1, path=path)
+    release = threading.Event()
+
+    job, created = queue.submit('ds1', {'file': 'a.csv'}, lambda job: release.wait(5))
+    duplicate, duplicate_created = queue.submit('ds1', {'file': 'b.csv'}, lambda job: None)
+    release.set()
+
+    assert created and not duplicate_created
+    assert duplicate.id == job.id
+    assert wait_for(queue, job.id).status == COMPLETED
+
+
+def test_completed_job_is_reused_only_for_the_same_params(path):
+    queue = JobQueue(max_workers=1, path=path)
+
+    job, _ = queue.submit('ds1', {'file': 'a.csv'}, lambda job: {'rows': 1})
+    assert wait_for(queue, job.id).result == {'rows': 1}
+
+    same, same_created = queue.submit('ds1', {'file': 'a.csv'}, lambda job: {'rows': 2})
+    changed, changed_created = queue.submit('ds1', {'file': 'b.csv'}, lambda job: {'rows': 3})
+
+    assert not same_created and same.id == job.id
+    assert changed_created and changed.id != job.id
+    assert wait_for(queue, changed.id).result == {'rows': 3}
+
+
+def test_failed_job_is_rerun(path):
+    queue = JobQueue(max_workers=1, path=path)
+
+    def fail(job):
+        raise RuntimeError('download failed')
+
+    job, _ = queue.submit('ds1', {'file': 'a.csv'}, fail)
+    failed = wait_for(queue, job.id)
+    assert failed.status == FAILED and failed.error == 'download failed'
+
+    retry, created = queue.submit('ds1', {'file': 'a.csv'}, lambda job: 'ok')
+    assert created and retry.id != job.id
+    assert wait_for(queue, retry.id).result == 'ok'
+
+
+def test_job_records_are_shared_between_queues_on_one_store(path):
+    # Two queues on one file stand in for two worker processes
+    first = JobQueue(max_workers=1, path=path)
+    second = JobQueue(max_workers=1, path=path)
+    release = threading.Event()
+
+    def run(job):
+        job.update_progress(rowsProcessed=10)
+        release.wait(5)
+
+    job, _ = first.submit('ds1', {'file': 'a.csv'}, run)
+    deadline = time.time() + 5
+    while second.get_job(job.id).progress.get('rowsProcessed') != 10 and time.time() < deadline:
+        time.sleep(0.02)
+
+    seen = second.get_job(job.id)
+    duplicate, created = second.submit('ds1', {'file': 'a.csv'}, lambda job: None)
+    release.set()
+
+    assert seen.status == RUNNING and seen.progress == {'rowsProcessed': 10}
+    assert not created and duplicate.id == job.id
+    assert wait_for(second, job.id).status == COMPLETED
+
+
+def test_job_of_an_exited_process_is_marked_failed(path):
+    queue = JobQueue(max_workers=1, path=path)
+
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+
+    orphan = Job('ds1', {'file': 'a.csv'})
+    orphan.pid = exited.pid
+    with queue._lock:
+        queue._write(orphan)
+        queue.conn.commit()
+
+    job = queue.get_job(orphan.id)
+    assert job.status == FAILED
+    assert job.error == 'Worker process exited before the job finished'
+
+    retry, created = queue.submit('ds1', {'file': 'a.csv'}, lambda job: None)
+    assert created and retry.id != orphan.id
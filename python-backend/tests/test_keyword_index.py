@@ -0,0 +1,92 @@
+import pytest
+from services import KeywordIndex
+from services.keyword_index import reciprocal_rank_fusion
+
+
+def results(*ids):
+    return {
+        'ids': list(ids),
+        'documents': [f"text of {doc_id}" for doc_id in ids],
+        'metadatas': [{'id': doc_id} for doc_id in ids]
+    }
+
+
+def test_rrf_favours_documents_ranked_well_in_both_lists():
+    fused = reciprocal_rank_fusion([results('a', 'b', 'c'), results('b', 'd', 'a')], top_k=4, k=60)
+
+    assert fused['ids'][:2] == ['b', 'a']
+    assert set(fused['ids']) == {'a', 'b', 'c', 'd'}
+    assert fused['scores'] == sorted(fused['scores'], reverse=True)
+    assert fused['documents'][0] == 'text of b'
+    assert fused['metadatas'][0] == {'id': 'b'}
+
+
+def test_rrf_scores_and_top_k():
+    fused = reciprocal_rank_fusion([results('a', 'b'), results('a')], top_k=1, k=1)
+
+    assert fused['ids'] == ['a']
+    assert fused['scores'] == [round(1 / 2 + 1 / 2, 6)]
+
+
+def test_query_terms_separates_quoted_text_from_candidate_terms():
+    terms, specific, candidates = KeywordIndex.query_terms('Total revenue for order T1003 and "desk lamp" in 2024')
+
+    assert '"t1003"' in terms and '"2024"' in terms and '"for"' not in terms
+    assert specific == ['"desk lamp"']
+    assert sorted(candidates) == ['"order t1003"', '"t1003"', '"total revenue"']
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = KeywordIndex(index_dir=str(tmp_path))
+    products = ['Desk Lamp', 'Office Chair', 'Standing Desk', 'Wireless Mouse']
+    documents = []
+    for i in range(200):
+        product = 'Smart Coffee Maker' if i == 120 else products[i % len(products)]
+        region = 'North' if i % 2 else 'South'
+        text = f"Order: O{i} | Quarter: Q{i % 4 + 1} | Product: {product} | Region: {region} | Total Revenue: {i * 10}"
+        documents.append((f"chunk_{i}", text, {'start_row': i}))
+    documents.append(('summary_revenue', 'Total Revenue by Region: North 100, South 90', {'type': 'summary'}))
+    index.upsert_documents('orders', documents)
+    return index
+
+
+def test_rare_phrase_is_selective_and_common_phrases_are_not(index):
+    terms, _, candidates = KeywordIndex.query_terms('total revenue for smart coffee maker')
+
+    assert candidates == ['"total revenue"', '"smart coffee maker"']
+    assert index.selective_terms('orders', candidates, terms) == ['"smart coffee maker"']
+
+
+def test_phrase_in_many_chunks_is_not_selective(index):
+    terms, _, candidates = KeywordIndex.query_terms('revenue of desk lamp orders')
+
+    assert index.selective_terms('orders', candidates, terms) == []
+
+
+def test_identifier_in_many_chunks_is_not_selective(index):
+    terms, _, candidates = KeywordIndex.query_terms('revenue in Q1 by region')
+
+    assert candidates == ['"q1"']
+    assert index.selective_terms('orders', candidates, terms) == []
+
+
+def test_rare_identifier_is_selective(index):
+    terms, _, candidates = KeywordIndex.query_terms('revenue of order O120')
+
+    assert '"o120"' in index.selective_terms('orders', candidates, terms)
+
+
+def test_search_ranks_rows_and_summaries_separately(index):
+    rows = index.search('orders', ['"smart coffee maker"'], top_k=5)
+    summaries = index.search('orders', ['"total revenue"'], top_k=5, summaries=True)
+
+    assert rows['ids'] == ['chunk_120']
+    assert summaries['ids'] == ['summary_revenue']
+
+
+def test_deleted_documents_are_not_found(index):
+    index.delete_documents('orders', ['chunk_120'])
+
+    assert index.search('orders', ['"smart coffee maker"'])['ids'] == []
+    assert index.selective_terms('orders', ['"smart coffee maker"'], ['"smart"']) == []
@@ -0,0 +1,67 @@
+import threading
+import pandas as pd
+import pytest
+from routes import process, unified
+from services.embedding_backend import HashingEmbeddingBackend
+from services.job_queue import Job
+
+
+def products(name, rows):
+    return pd.DataFrame({
+        'Product': [f"{name} model {i}" for i in range(rows)],
+        'Store': [f"Store {i % 3}" for i in range(rows)],
+        'Revenue': [100 + i for i in range(rows)]
+    })
+
+
+@pytest.fixture(scope='module')
+def datasets():
+    created = []
+    for dataset_id, df in [('multi_laptops', products('Laptop', 60)), ('multi_coffee', products('Coffee grinder', 60))]:
+        collection = process.chromadb.create_collection(dataset_id, embedding=process.vertex_ai.embedding_backend.signature())
+        chunks = process.data_processor.chunk_dataframe(df, target_tokens=200)
+        process._store_chunks(Job(dataset_id, {}), collection, dataset_id, chunks, process._new_sync_state({}))
+        created.append(dataset_id)
+
+    yield [{'id': 'multi_laptops', 'name': 'laptops.csv'}, {'id': 'multi_coffee', 'name': 'coffee.csv'}]
+
+    for dataset_id in created:
+        process.chromadb.delete_collection(dataset_id)
+
+
+def test_collections_are_searched_concurrently_and_returned_in_order(datasets, monkeypatch):
+    chromadb = unified.chromadb
+    collections = [chromadb.get_collection(dataset['id']) for dataset in datasets]
+    both_running = threading.Barrier(2, timeout=5)
+
+    # Each search waits for the other, so a sequential search would fail
+    def semantic_search(collection, query_embedding, top_k=5, where=None):
+        both_running.wait()
+        return {'ids': [collection.name]}
+
+    monkeypatch.setattr(chromadb, 'semantic_search', semantic_search)
+
+    results = chromadb.semantic_search_collections(collections, [0.0], top_k=3)
+
+    assert [result['ids'] for result in results] == [['dataset_multi_laptops'], ['dataset_multi_coffee']]
+
+
+def test_hits_from_every_dataset_are_merged_by_distance(datasets):
+    context, names = unified._retrieve_csv_context('laptop model revenue', datasets)
+
+    assert names == ['laptops.csv', 'coffee.csv']
+    assert context.startswith('Data chunk from laptops.csv')
+    assert 'Laptop model' in context
+
+
+def test_datasets_that_cannot_be_searched_are_skipped(datasets, monkeypatch):
+    missing = [{'id': 'multi_missing', 'name': 'missing.csv'}]
+    assert unified._retrieve_csv_context('coffee grinder revenue', missing) is None
+
+    context, names = unified._retrieve_csv_context('coffee grinder revenue', missing + datasets[1:])
+    assert names == ['coffee.csv']
+    assert 'Coffee grinder model' in context
+
+    # Vectors from another backend configuration are not comparable
+    monkeypatch.setattr(unified.vertex_ai, 'embedding_backend', HashingEmbeddingBackend(dimension=32))
+    assert unified._retrieve_csv_context('coffee grinder revenue', datasets) is None
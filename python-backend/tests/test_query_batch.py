@@ -0,0 +1,89 @@
+import time
+import pandas as pd
+import pytest
+from flask import Flask
+import config
+from routes import process, query
+from services.job_queue import Job
+
+
+def orders(rows):
+    regions = ['North', 'South', 'East', 'West']
+    return pd.DataFrame({
+        'OrderID': [f"O{i}" for i in range(rows)],
+        'Region': [regions[i % 4] for i in range(rows)],
+        'Units': [i % 50 for i in range(rows)]
+    })
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    dataset_id = 'batch_orders'
+    collection = process.chromadb.create_collection(dataset_id, embedding=process.vertex_ai.embedding_backend.signature())
+    chunks = process.data_processor.chunk_dataframe(orders(500), target_tokens=400)
+    process._store_chunks(Job(dataset_id, {}), collection, dataset_id, chunks, process._new_sync_state({}))
+    yield dataset_id
+    process.chromadb.delete_collection(dataset_id)
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(query.query_bp)
+    return app.test_client()
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    # Earlier questions take longer, so answers finish in reverse order
+    def generate_response(question, context=None, on_token=None):
+        if 'fail' in question:
+            raise RuntimeError('model unavailable')
+        time.sleep(0.05 * (5 - int(question.split()[-1])))
+        return f"answer to {question}"
+
+    monkeypatch.setattr(query.vertex_ai, 'generate_response', generate_response)
+
+
+def test_results_come_back_in_question_order(client, dataset, answers):
+    questions = [f"revenue in the north region {i}" for i in range(5)]
+
+    response = client.post('/api/query/batch', json={'datasetId': dataset, 'questions': questions, 'userId': 'order'})
+    body = response.get_json()
+
+    assert response.status_code == 200
+    assert [result['question'] for result in body['results']] == questions
+    assert [result['response'] for result in body['results']] == [f"answer to {question}" for question in questions]
+    assert all(result['cached'] is False for result in body['results'])
+
+
+def test_a_failed_question_does_not_fail_the_batch(client, dataset, answers):
+    questions = ['units sold 1', 'please fail 2', 'units by region 3']
+
+    body = client.post('/api/query/batch', json={'datasetId': dataset, 'questions': questions, 'userId': 'fail'}).get_json()
+
+    assert body['success'] is True
+    assert [result['success'] for result in body['results']] == [True, False, True]
+    assert body['results'][1]['error'] == 'model unavailable'
+
+
+def test_repeated_questions_are_served_from_the_answer_cache(client, dataset, answers):
+    payload = {'datasetId': dataset, 'questions': ['units sold in the east 1', 'units sold in the west 2'], 'userId': 'repeat'}
+    client.post('/api/query/batch', json=payload)
+
+    body = client.post('/api/query/batch', json=payload).get_json()
+
+    assert [result['cached'] for result in body['results']] == [True, True]
+
+
+@pytest.mark.parametrize('payload, status', [
+    ({'datasetId': 'batch_orders', 'questions': []}, 400),
+    ({'datasetId': 'batch_orders', 'questions': ['ok', '  ']}, 400),
+    ({'datasetId': 'batch_orders', 'questions': ['q'] * (config.QUERY_BATCH_MAX_QUESTIONS + 1)}, 400),
+    ({'datasetId': 'missing', 'questions': ['units sold']}, 404)
+])
+def test_invalid_batches_are_rejected(client, dataset, payload, status):
+    response = client.post('/api/query/batch', json=payload)
+
+    assert response.status_code == status
+    assert response.get_json()['success'] is False
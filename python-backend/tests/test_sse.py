@@ -0,0 +1,122 @@
+import json
+import threading
+from datetime import date
+import pytest
+from flask import Flask
+from routes.sse import format_event, stream_events
+
+
+def parse(body):
+    """Split an event stream into (event, data) pairs"""
+    events = []
+    for block in body.split('\n\n'):
+        if not block:
+            continue
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@pytest.fixture
+def client_for():
+    def make(producer):
+        app = Flask(__name__)
+        app.add_url_rule('/stream', 'stream', lambda: stream_events(producer))
+        return app.test_client()
+    return make
+
+
+def test_event_framing():
+    frame = format_event('token', {'text': 'line one\nline two', 'day': date(2024, 1, 2)})
+
+    assert frame == 'event: token\ndata: {"text": "line one\\nline two", "day": "2024-01-02"}\n\n'
+    assert parse(frame) == [('token', {'text': 'line one\nline two', 'day': '2024-01-02'})]
+
+
+def test_stream_sends_events_in_order(client_for):
+    def produce(emit):
+        emit('progress', {'stage': 'retrieval'})
+        emit('token', {'text': 'Hello'})
+        emit('done', {'success': True})
+
+    response = client_for(produce).get('/stream')
+
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert response.headers['X-Accel-Buffering'] == 'no'
+    assert parse(response.get_data(as_text=True)) == [
+        ('progress', {'stage': 'retrieval'}),
+        ('token', {'text': 'Hello'}),
+        ('done', {'success': True})
+    ]
+
+
+def test_events_are_sent_before_the_producer_finishes(client_for):
+    release = threading.Event()
+
+    def produce(emit):
+        emit('progress', {'stage': 'routing'})
+        release.wait(5)
+        emit('done', {'success': True})
+
+    response = client_for(produce).get('/stream', buffered=False)
+    chunks = iter(response.response)
+
+    first = next(chunks)
+    first = first.decode() if isinstance(first, bytes) else first
+    assert parse(first) == [('progress', {'stage': 'routing'})]
+
+    release.set()
+    rest = ''.join(chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in chunks)
+    assert parse(rest) == [('done', {'success': True})]
+
+
+def test_producer_failure_ends_the_stream_with_an_error(client_for):
+    def produce(emit):
+        emit('token', {'text': 'partial'})
+        raise RuntimeError('model unavailable')
+
+    response = client_for(produce).get('/stream')
+
+    assert parse(response.get_data(as_text=True)) == [
+        ('token', {'text': 'partial'}),
+        ('error', {'success': False, 'error': 'model unavailable'})
+    ]
+
+
+def test_replaced_answer_is_preceded_by_a_reset():
+    from routes.unified import _recording, _restream_if_changed
+
+    events = []
+    emit = lambda event, data: events.append((event, data))
+    on_token = lambda text: emit('token', {'text': text})
+
+    streamed = []
+    forward = _recording(on_token, streamed)
+    forward('The answer ')
+    forward('is 4')
+    _restream_if_changed(emit, on_token, streamed, 'The answer is 4', 'csv')
+    assert [event for event, _ in events] == ['token', 'token']
+
+    _restream_if_changed(emit, on_token, streamed, 'Query returned 3 rows.', 'csv')
+    assert events[2:] == [('reset', {'source': 'csv'}), ('token', {'text': 'Query returned 3 rows.'})]
+    assert _recording(None, []) is None
+
+
+def test_single_surviving_source_still_streams_its_answer(monkeypatch):
+    from routes import unified
+
+    decision = {'sources': ['csv', 'sql'], 'csv_targets': ['sales.csv'], 'sql_targets': ['crm'], 'generate_report': False}
+    monkeypatch.setattr(unified.orchestrator, 'detect_sources', lambda question, sources: decision)
+    monkeypatch.setattr(unified, '_query_csv_sources', lambda *args, **kwargs: None)
+    monkeypatch.setattr(
+        unified, '_query_sql_sources',
+        lambda *args, **kwargs: {'data': [{'total': 4}], 'analysis': 'CRM shows 4 open deals.'}
+    )
+
+    events = []
+    sources = {'csvFiles': [], 'sqlDatabases': [{'id': 'crm'}]}
+    result = unified._answer_unified('u1', 'how many open deals?', sources, emit=lambda event, data: events.append((event, data)))
+
+    assert result['answer'] == 'CRM shows 4 open deals.'
+    assert [data for event, data in events if event == 'token'] == [{'text': 'CRM shows 4 open deals.'}]
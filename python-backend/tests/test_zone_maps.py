@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+from services.profile_sketch import TableSketch
+from services.zone_maps import build_zone_maps, column_info, extract_predicates, matches, predicates_to_where
+
+
+def seconds(text):
+    return int(pd.Timestamp(text).timestamp())
+
+
+@pytest.fixture
+def orders():
+    return pd.DataFrame({
+        'OrderDate': pd.to_datetime(['2024-01-10', '2024-01-20', '2024-03-05', '2024-03-25', '2024-06-01', '2024-06-30']),
+        'Region': ['North', 'North', 'South', 'North', 'East', 'East'],
+        'UnitPrice': [10.0, 20.0, 150.0, 90.0, 300.0, 5.0]
+    })
+
+
+@pytest.fixture
+def zone_maps(orders):
+    return build_zone_maps(orders, [(0, 2), (2, 4), (4, 6)])
+
+
+@pytest.fixture
+def info(orders):
+    return column_info([TableSketch.from_dataframe(orders)])
+
+
+def test_zone_maps_record_ranges_and_values(zone_maps):
+    first, second, third = zone_maps
+
+    assert first['min:UnitPrice'] == 10 and first['max:UnitPrice'] == 20
+    assert second['min:OrderDate'] == seconds('2024-03-05')
+    assert second['max:OrderDate'] == seconds('2024-03-25')
+    assert first['set:Region'] is True and first['has:Region=North'] is True
+    assert 'has:Region=South' not in first
+    assert third['has:Region=East'] is True
+
+
+def test_column_info_describes_ranges_and_categories(info):
+    assert info['UnitPrice'] == {'kind': 'numeric', 'min': 5, 'max': 300}
+    assert info['OrderDate']['min'] == seconds('2024-01-10')
+    assert info['Region']['values'] == ['East', 'North', 'South']
+
+
+def test_category_predicate(info, zone_maps):
+    predicates = extract_predicates('How many orders came from the south region?', info)
+
+    assert predicates == [{'column': 'Region', 'op': 'in', 'value': ['South']}]
+    assert [matches(zone_map, predicates) for zone_map in zone_maps] == [False, True, False]
+
+
+def test_numeric_bound_next_to_column_name(info, zone_maps):
+    predicates = extract_predicates('orders with unit price over 100', info)
+
+    assert predicates == [{'column': 'UnitPrice', 'op': '$gt', 'value': 100.0}]
+    assert [matches(zone_map, predicates) for zone_map in zone_maps] == [False, True, True]
+    assert predicates_to_where(predicates) == [{'max:UnitPrice': {'$gt': 100.0}}]
+
+
+def test_month_predicate_on_the_only_date_column(info, zone_maps):
+    predicates = extract_predicates('What sold in March 2024?', info)
+
+    assert predicates == [
+        {'column': 'OrderDate', 'op': '$lte', 'value': seconds('2024-03-31 23:59:59')},
+        {'column': 'OrderDate', 'op': '$gte', 'value': seconds('2024-03-01')}
+    ]
+    assert [matches(zone_map, predicates) for zone_map in zone_maps] == [False, True, False]
+
+
+def test_date_bounds_and_ranges(info, zone_maps):
+    after = extract_predicates('orders after March 2024', info)
+    between = extract_predicates('orders between 2024-01-15 and 2024-03-10', info)
+
+    assert [matches(zone_map, after) for zone_map in zone_maps] == [False, False, True]
+    assert [matches(zone_map, between) for zone_map in zone_maps] == [True, True, False]
+
+
+def test_numbers_outside_the_date_range_are_not_years(info):
+    assert extract_predicates('show the top 1000 orders', info) == []
+
+
+def test_incomplete_value_sets_are_kept(zone_maps):
+    zone_map = dict(zone_maps[0], **{'set:Region': False})
+    predicates = [{'column': 'Region', 'op': 'in', 'value': ['South']}]
+
+    assert matches(zone_map, predicates)
+    assert predicates_to_where(predicates) == [{'$or': [{'has:Region=South': True}, {'set:Region': False}]}]
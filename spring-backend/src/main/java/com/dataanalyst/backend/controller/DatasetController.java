@@ -85,29 +85,26 @@ public class DatasetController {
             // Save to Firestore
             firebaseService.createDataset(dataset);
 
-            // Send to Python service for processing (async)
-            new Thread(() -> {
-                try {
-                    logger.info("Sending dataset to Python service for processing: {}", datasetId);
-                    Map<String, Object> processResult = aiService.processDataset(
-                            datasetId,
-                            storageUrl,
-                            file.getOriginalFilename());
-
-                    // Update dataset with processing results
-                    if (processResult != null && (Boolean) processResult.get("success")) {
-                        int rowCount = (Integer) processResult.getOrDefault("rowCount", 0);
-                        int columnCount = (Integer) processResult.getOrDefault("columnCount", 0);
-
-                        firebaseService.updateDatasetProcessingStatus(datasetId, true, rowCount, columnCount);
-                        logger.info("Dataset processed successfully: {}", datasetId);
-                    } else {
-                        logger.error("Dataset processing failed: {}", processResult);
-                    }
-                } catch (Exception e) {
-                    logger.error("Error processing dataset: {}", e.getMessage(), e);
-                }
-            }).start();
+            // Send to Python service for processing; the upload returns immediately and the
+            // dataset is marked processed when the job completes
+            logger.info("Sending dataset to Python service for processing: {}", datasetId);
+            aiService.processDataset(datasetId, storageUrl, file.getOriginalFilename())
+                    .thenAcceptAsync(processResult -> {
+                        try {
+                            // Update dataset with processing results
+                            if (processResult != null && Boolean.TRUE.equals(processResult.get("success"))) {
+                                int rowCount = ((Number) processResult.getOrDefault("rowCount", 0)).intValue();
+                                int columnCount = ((Number) processResult.getOrDefault("columnCount", 0)).intValue();
+
+                                firebaseService.updateDatasetProcessingStatus(datasetId, true, rowCount, columnCount);
+                                logger.info("Dataset processed successfully: {}", datasetId);
+                            } else {
+                                logger.error("Dataset processing failed: {}", processResult);
+                            }
+                        } catch (Exception e) {
+                            logger.error("Error processing dataset: {}", e.getMessage(), e);
+                        }
+                    });
 
             UploadResponse response = UploadResponse.builder()
                     .success(true)
@@ -4,21 +4,29 @@ import org.slf4j.Logger;
 import org.slf4j.LoggerFactory;
 import org.springframework.stereotype.Service;
 import org.springframework.web.reactive.function.client.WebClient;
+import reactor.core.publisher.Mono;
 
+import java.time.Duration;
 import java.util.HashMap;
 import java.util.Map;
+import java.util.concurrent.CompletableFuture;
+import java.util.concurrent.TimeoutException;
 
 @Service
 public class AIService {
 
     private static final Logger logger = LoggerFactory.getLogger(AIService.class);
+    private static final long PROCESS_POLL_INTERVAL_MS = 2000;
+    private static final long PROCESS_TIMEOUT_MS = 60 * 60 * 1000;
     private final WebClient pythonServiceWebClient;
 
     public AIService(WebClient pythonServiceWebClient) {
         this.pythonServiceWebClient = pythonServiceWebClient;
     }
 
-    public Map<String, Object> processDataset(String datasetId, String fileUrl, String fileName) {
+    // Completes with the job result (or an error map) once the Python job finishes;
+    // the status is polled on timers, so no thread is held while processing runs
+    public CompletableFuture<Map<String, Object>> processDataset(String datasetId, String fileUrl, String fileName) {
         logger.info("Sending dataset to Python service for processing: {}", datasetId);
 
         Map<String, Object> request = new HashMap<>();
@@ -26,24 +34,64 @@ public class AIService {
         request.put("fileUrl", fileUrl);
         request.put("fileName", fileName);
 
-        try {
-            @SuppressWarnings("unchecked")
-            Map<String, Object> response = (Map<String, Object>) pythonServiceWebClient.post()
-                    .uri("/api/process")
-                    .bodyValue(request)
-                    .retrieve()
-                    .bodyToMono(Map.class)
-                    .block();
+        return pythonServiceWebClient.post()
+                .uri("/api/process")
+                .bodyValue(request)
+                .retrieve()
+                .bodyToMono(Map.class)
+                .flatMap(response -> {
+                    @SuppressWarnings("unchecked")
+                    Map<String, Object> submitted = (Map<String, Object>) response;
+                    logger.info("Dataset processing job submitted: {}", submitted);
+
+                    if (!Boolean.TRUE.equals(submitted.get("success"))) {
+                        return Mono.just(submitted);
+                    }
+
+                    // Processing runs in the background on the Python side; poll until it finishes
+                    return pollProcessingJob((String) submitted.get("jobId"))
+                            .timeout(Duration.ofMillis(PROCESS_TIMEOUT_MS));
+                })
+                .onErrorResume(e -> {
+                    logger.error("Error processing dataset: {}", e.getMessage(), e);
+                    Map<String, Object> errorResponse = new HashMap<>();
+                    errorResponse.put("success", false);
+                    errorResponse.put("error", e instanceof TimeoutException
+                            ? "Timed out waiting for processing of dataset " + datasetId
+                            : e.getMessage());
+                    return Mono.just(errorResponse);
+                })
+                .toFuture();
+    }
 
-            logger.info("Dataset processing response received: {}", response);
-            return response;
-        } catch (Exception e) {
-            logger.error("Error processing dataset: {}", e.getMessage(), e);
-            Map<String, Object> errorResponse = new HashMap<>();
-            errorResponse.put("success", false);
-            errorResponse.put("error", e.getMessage());
-            return errorResponse;
-        }
+    @SuppressWarnings("unchecked")
+    private Mono<Map<String, Object>> pollProcessingJob(String jobId) {
+        return pythonServiceWebClient.get()
+                .uri("/api/process/{jobId}", jobId)
+                .retrieve()
+                .bodyToMono(Map.class)
+                .flatMap(response -> {
+                    Map<String, Object> status = (Map<String, Object>) response;
+                    String jobStatus = (String) status.get("status");
+
+                    if ("completed".equals(jobStatus)) {
+                        Map<String, Object> result = new HashMap<>((Map<String, Object>) status.get("result"));
+                        result.put("success", true);
+                        logger.info("Dataset processing job {} completed: {}", jobId, result);
+                        return Mono.just(result);
+                    }
+
+                    if ("failed".equals(jobStatus)) {
+                        Map<String, Object> errorResponse = new HashMap<>();
+                        errorResponse.put("success", false);
+                        errorResponse.put("error", status.get("error"));
+                        return Mono.just(errorResponse);
+                    }
+
+                    logger.debug("Dataset processing job {} at stage {}", jobId, status.get("stage"));
+                    return Mono.delay(Duration.ofMillis(PROCESS_POLL_INTERVAL_MS))
+                            .then(Mono.defer(() -> pollProcessingJob(jobId)));
+                });
     }
 
     public Map<String, Object> queryDataset(String datasetId, String query, String userId) {